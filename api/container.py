@@ -1,13 +1,17 @@
 import os
 import re
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from fastapi.templating import Jinja2Templates
 
+from api.pool import ExecutionPool
 from core.agents.manager import AgentManager
+from core.events import RedisEventChannel
 from core.handlers.base import BaseHandler, FileHandler, FileType
 from core.handlers.dataframe import CsvToDataframe
+from core.models import ModelRegistry
+from core.sandbox import SandboxPool
 from core.tools.base import BaseToolSet
 from core.tools.cpu import ExitConversation, RequestsGet
 from core.tools.editor import CodeEditor
@@ -26,6 +30,7 @@ toolsets: List[BaseToolSet] = [
     ExitConversation(),
 ]
 handlers: Dict[FileType, BaseHandler] = {FileType.DATAFRAME: CsvToDataframe()}
+models: Optional[ModelRegistry] = None
 
 if settings["USE_GPU"]:
     import torch
@@ -39,17 +44,39 @@ if settings["USE_GPU"]:
     )
 
     if torch.cuda.is_available():
+        # the models are loaded on the first call of their tool
+        models = ModelRegistry.from_settings(settings, device="cuda")
         toolsets.extend(
             [
-                Text2Image("cuda"),
-                ImageEditing("cuda"),
-                InstructPix2Pix("cuda"),
-                VisualQuestionAnswering("cuda"),
+                Text2Image("cuda", models),
+                ImageEditing("cuda", models),
+                InstructPix2Pix("cuda", models),
+                VisualQuestionAnswering("cuda", models),
             ]
         )
-        handlers[FileType.IMAGE] = ImageCaptioning("cuda")
+        handlers[FileType.IMAGE] = ImageCaptioning("cuda", models)
 
-agent_manager = AgentManager.create(toolsets=toolsets)
+event_channel = RedisEventChannel.from_settings(settings)
+
+sandboxes = None
+if settings["SANDBOX_ENABLED"]:
+    # uploads land in the playground, they are linked into every sandbox
+    uploads = BASE_DIR / settings["PLAYGROUND_DIR"] / "file"
+    uploads.mkdir(exist_ok=True)
+
+    def end_session(session: str) -> None:
+        for toolset in toolsets:
+            toolset.end_session(session)
+
+    sandboxes = SandboxPool.from_settings(
+        settings, shared=[uploads], on_reclaim=end_session
+    )
+
+agent_manager = AgentManager.create(toolsets=toolsets, sandboxes=sandboxes)
+if settings["WARMUP"]:
+    agent_manager.get_builder()
+
+execution_pool = ExecutionPool.from_settings(settings)
 
 file_handler = FileHandler(handlers=handlers, path=BASE_DIR)
 
@@ -1,16 +1,29 @@
+import json
 import re
 from multiprocessing import Process
 from tempfile import NamedTemporaryFile
-from typing import List, TypedDict
+from typing import AsyncIterator, List, Optional, TypedDict
 
 import uvicorn
-from fastapi import FastAPI, Request, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Request, UploadFile
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from api.container import agent_manager, file_handler, reload_dirs, templates, uploader
-from api.worker import get_task_result, start_worker, task_execute
+from api.container import (
+    agent_manager,
+    event_channel,
+    execution_pool,
+    file_handler,
+    models,
+    reload_dirs,
+    templates,
+    uploader,
+)
+from api.pool import PoolFullException
+from api.worker import get_task_result, session_router, start_worker, task_execute
+from core.events import ExecutionEvent
 from env import settings
 
 app = FastAPI()
@@ -29,6 +42,18 @@ class ExecuteResponse(TypedDict):
     files: List[str]
 
 
+def create_response(output: str, files: Optional[List[str]] = None) -> ExecuteResponse:
+    # the files are resolved by the agent, in the sandbox of the session
+    if files is None:
+        files = re.findall(r"\[file://\S*\]", output)
+        files = [file[1:-1].split("file://")[1] for file in files]
+
+    return {
+        "answer": output,
+        "files": [uploader.upload(file) for file in files],
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -51,29 +76,30 @@ async def create_upload_file(files: List[UploadFile]):
     return {"urls": urls}
 
 
-@app.post("/api/execute")
-async def execute(request: ExecuteRequest) -> ExecuteResponse:
+def execute_sync(request: ExecuteRequest) -> ExecuteResponse:
     query = request.prompt
     files = request.files
     session = request.session
 
-    executor = agent_manager.create_executor(session)
-
     promptedQuery = "\n".join([file_handler.handle(file) for file in files])
     promptedQuery += query
 
     try:
-        res = executor({"input": promptedQuery})
+        res = agent_manager.execute(session, promptedQuery)
     except Exception as e:
         return {"answer": str(e), "files": []}
 
-    files = re.findall(r"\[file://\S*\]", res["output"])
-    files = [file[1:-1].split("file://")[1] for file in files]
+    return create_response(res["output"], res["files"])
 
-    return {
-        "answer": res["output"],
-        "files": [uploader.upload(file) for file in files],
-    }
+
+@app.post("/api/execute")
+async def execute(request: ExecuteRequest) -> ExecuteResponse:
+    try:
+        return await execution_pool.run(execute_sync, request)
+    except PoolFullException as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        )
 
 
 @app.post("/api/execute/async")
@@ -95,13 +121,9 @@ async def execute_async(execution_id: str):
 
     result = {}
     if execution.status == "SUCCESS" and execution.result:
-        output = execution.result.get("output", "")
-        files = re.findall(r"\[file://\S*\]", output)
-        files = [file[1:-1].split("file://")[1] for file in files]
-        result = {
-            "answer": output,
-            "files": [uploader.upload(file) for file in files],
-        }
+        result = create_response(
+            execution.result.get("output", ""), execution.result.get("files")
+        )
 
     return {
         "status": execution.status,
@@ -110,6 +132,102 @@ async def execute_async(execution_id: str):
     }
 
 
+@app.get("/api/metrics")
+async def metrics():
+    metrics = {
+        "execution_pool": {
+            "in_flight": execution_pool.in_flight,
+            "capacity": execution_pool.capacity,
+        },
+        "session_router": session_router.get_metrics(),
+        **agent_manager.get_metrics(),
+    }
+    if models:
+        metrics["models"] = models.get_metrics()
+    return metrics
+
+
+def get_finished_event(execution_id: str) -> Optional[ExecutionEvent]:
+    execution = get_task_result(execution_id)
+    if not execution.ready():
+        return None
+    if execution.successful():
+        return {"index": 0, "type": "SUCCESS", "data": execution.result or {}}
+    return {"index": 0, "type": "FAILURE", "data": {"error": str(execution.result)}}
+
+
+def present_event(event: ExecutionEvent) -> ExecutionEvent:
+    if event["type"] != "SUCCESS":
+        return event
+    info = event["data"]
+    return {
+        **event,
+        "data": {
+            "info": info,
+            "result": create_response(info.get("output", ""), info.get("files")),
+        },
+    }
+
+
+@app.get("/api/execute/async/{execution_id}/events")
+async def execute_async_events(execution_id: str, after: int = 0):
+    events = await run_in_threadpool(event_channel.read, execution_id, after)
+    return {"events": [present_event(event) for event in events]}
+
+
+def format_event(event: ExecutionEvent) -> str:
+    message = f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    if event["index"]:
+        # lets a reconnecting EventSource resume with Last-Event-ID
+        message = f"id: {event['index']}\n{message}"
+    return message
+
+
+async def stream_execution(execution_id: str, after: int = 0) -> AsyncIterator[str]:
+    async with event_channel.subscribe(execution_id, keepalive=10) as events:
+        # subscribed first, so nothing published from here on can be missed,
+        # and whatever was published before is replayed from the log.
+        finished = None
+        replayed = await run_in_threadpool(event_channel.read, execution_id, after)
+        for event in replayed:
+            if event["type"] in ["SUCCESS", "FAILURE"]:
+                finished = event
+                break
+            after = event["index"]
+            yield format_event(event)
+
+        if finished is None:
+            finished = await run_in_threadpool(get_finished_event, execution_id)
+        if finished is None:
+            async for event in events:
+                if event is None:
+                    finished = await run_in_threadpool(get_finished_event, execution_id)
+                    if finished:
+                        break
+                    yield ": keepalive\n\n"
+                elif event["index"] and event["index"] <= after:
+                    continue  # already replayed
+                elif event["type"] in ["SUCCESS", "FAILURE"]:
+                    finished = event
+                    break
+                else:
+                    yield format_event(event)
+
+    # uploading the files of the result is blocking too
+    yield format_event(await run_in_threadpool(present_event, finished))
+
+
+@app.get("/api/execute/async/{execution_id}/stream")
+async def execute_async_stream(
+    execution_id: str, last_event_id: int = Header(0), after: int = 0
+):
+    return StreamingResponse(
+        stream_execution(execution_id, max(after, last_event_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def serve():
     p = Process(target=start_worker, args=[])
     p.start()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from env import DotEnv
+
+T = TypeVar("T")
+
+
+class PoolFullException(Exception):
+    def __init__(self, capacity: int, *args) -> None:
+        super().__init__(
+            f"too many executions in progress ({capacity} running or queued), "
+            "try again later",
+            *args,
+        )
+
+
+class ExecutionPool:
+    """Runs blocking agent executions off the event loop.
+
+    At most `max_workers` executions run at once and at most `max_queue` more
+    wait for a worker. Anything beyond that is rejected immediately instead of
+    piling up behind the running ones.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers: int = max_workers
+        self.max_queue: int = max_queue
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="execution"
+        )
+        self.slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            self.capacity
+        )
+        self.lock: threading.Lock = threading.Lock()
+        self.pending: int = 0
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "ExecutionPool":
+        return ExecutionPool(
+            max_workers=settings["EXECUTION_POOL_SIZE"],
+            max_queue=settings["EXECUTION_QUEUE_SIZE"],
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        with self.lock:
+            return self.pending
+
+    def admit(self) -> None:
+        if not self.slots.acquire(blocking=False):
+            raise PoolFullException(self.capacity)
+        with self.lock:
+            self.pending += 1
+
+    def release(self, *_) -> None:
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        self.admit()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(self.release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,122 @@
+import bisect
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from env import DotEnv
+from logger import logger
+
+
+def hash_key(key: str) -> int:
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Consistent hash ring over queue names.
+
+    Every queue is placed on the ring `replicas` times, and a key belongs to
+    the first queue clockwise from its hash. Adding or removing a queue only
+    moves the keys that land on it, about 1/n of them.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        self.replicas: int = replicas
+        self.hashes: List[int] = []
+        self.owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> Set[str]:
+        return set(self.owners.values())
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            h = hash_key(f"{node}#{i}")
+            if h in self.owners:
+                continue
+            bisect.insort(self.hashes, h)
+            self.owners[h] = node
+
+    def remove(self, node: str) -> None:
+        for i in range(self.replicas):
+            h = hash_key(f"{node}#{i}")
+            if self.owners.get(h) != node:
+                continue
+            del self.owners[h]
+            del self.hashes[bisect.bisect_left(self.hashes, h)]
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.hashes:
+            return None
+        index = bisect.bisect(self.hashes, hash_key(key)) % len(self.hashes)
+        return self.owners[self.hashes[index]]
+
+
+class SessionRouter:
+    """Sends every task of a session to the same worker queue.
+
+    The ring only holds queues that some worker is consuming right now. They
+    are looked up with `inspect` at most every `refresh_interval` seconds, in
+    the background so that routing never waits for the workers to answer.
+    """
+
+    def __init__(
+        self,
+        queues: List[str],
+        inspect: Callable[[], Optional[Set[str]]],
+        refresh_interval: float = 30,
+    ):
+        self.queues: List[str] = queues
+        self.inspect: Callable[[], Optional[Set[str]]] = inspect
+        self.refresh_interval: float = refresh_interval
+        self.ring: HashRing = HashRing(queues)
+        self.refreshed_at: float = 0
+        self.refreshing: bool = False
+        self.lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def from_settings(
+        settings: DotEnv, inspect: Callable[[], Optional[Set[str]]]
+    ) -> "SessionRouter":
+        return SessionRouter(
+            queues=settings["WORKER_QUEUES"],
+            inspect=inspect,
+            refresh_interval=settings["SESSION_AFFINITY_REFRESH"],
+        )
+
+    def refresh(self) -> None:
+        try:
+            active = self.inspect()
+        except Exception as e:
+            logger.warning(f"Failed to inspect worker queues: {e}")
+            active = None
+
+        with self.lock:
+            self.refreshing = False
+            self.refreshed_at = time.monotonic()
+            if active is None:
+                return
+            # with no worker up, keep routing to all of them until one comes back
+            live = {queue for queue in self.queues if queue in active} or set(
+                self.queues
+            )
+            for queue in self.ring.nodes - live:
+                logger.info(f"Worker queue {queue} left, rebalancing its sessions")
+                self.ring.remove(queue)
+            for queue in live - self.ring.nodes:
+                logger.info(f"Worker queue {queue} joined")
+                self.ring.add(queue)
+
+    def route(self, session: str) -> str:
+        with self.lock:
+            stale = time.monotonic() - self.refreshed_at > self.refresh_interval
+            if stale and not self.refreshing:
+                self.refreshing = True
+                threading.Thread(target=self.refresh, daemon=True).start()
+            return self.ring.get(session)
+
+    def get_metrics(self) -> Dict[str, List[str]]:
+        with self.lock:
+            return {"queues": sorted(self.ring.nodes)}
@@ -1,7 +1,11 @@
+from typing import Optional, Set
+
 from celery import Celery
 from celery.result import AsyncResult
 
-from api.container import agent_manager
+from api.container import agent_manager, event_channel
+from api.router import SessionRouter
+from core.agents.callback import ExecutionTracingCallbackHandler
 from env import settings
 
 celery_app = Celery(__name__)
@@ -16,16 +20,37 @@ celery_app.conf.update(
 )
 
 
+def get_active_queues() -> Optional[Set[str]]:
+    replies = celery_app.control.inspect(timeout=1).active_queues()
+    if replies is None:
+        return None
+    return {queue["name"] for queues in replies.values() for queue in queues}
+
+
+session_router = SessionRouter.from_settings(settings, inspect=get_active_queues)
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    if name != "task_execute" or not settings["SESSION_AFFINITY"]:
+        return None
+    session = kwargs.get("session", args[0] if args else None)
+    return {"queue": session_router.route(session)}
+
+
+celery_app.conf.task_routes = (route_task,)
+
+
 @celery_app.task(name="task_execute", bind=True)
 def task_execute(self, session: str, prompt: str):
-    executor = agent_manager.create_executor(session, self)
-    response = executor({"input": prompt})
-    result = {"output": response["output"]}
-
-    previous = AsyncResult(self.request.id)
-    if previous and previous.info:
-        result.update(previous.info)
+    tracer = ExecutionTracingCallbackHandler(self, event_channel)
+    try:
+        response = agent_manager.execute(session, prompt, tracer)
+    except Exception as e:
+        event_channel.publish(self.request.id, "FAILURE", {"error": str(e)})
+        raise
+    result = {"output": response["output"], "files": response["files"], **tracer.info}
 
+    event_channel.publish(self.request.id, "SUCCESS", result)
     return result
 
 
@@ -38,5 +63,7 @@ def start_worker():
         [
             "worker",
             "--loglevel=INFO",
+            # the default queue keeps serving tasks sent without affinity
+            f"--queues={settings['WORKER_QUEUE']},celery",
         ]
     )
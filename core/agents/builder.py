@@ -16,11 +16,17 @@ class AgentBuilder:
         self.llm: BaseChatModel = None
         self.parser: BaseOutputParser = None
         self.global_tools: list = None
+        self.agent: ConversationalChatAgent = None
         self.toolsets = toolsets
 
-    def build_llm(self, callback_manager: BaseCallbackManager = None):
+    def build_llm(
+        self, callback_manager: BaseCallbackManager = None, streaming: bool = False
+    ):
         self.llm = ChatOpenAI(
-            temperature=0, callback_manager=callback_manager, verbose=True
+            temperature=0,
+            callback_manager=callback_manager,
+            streaming=streaming,
+            verbose=True,
         )
         self.llm.check_access()
 
@@ -43,6 +49,12 @@ class AgentBuilder:
             *ToolsFactory.create_global_tools(self.toolsets),
         ]
 
+    def get_llm(self):
+        if self.llm is None:
+            raise ValueError("LLM is not initialized yet")
+
+        return self.llm
+
     def get_parser(self):
         if self.parser is None:
             raise ValueError("Parser is not initialized yet")
@@ -55,7 +67,7 @@ class AgentBuilder:
 
         return self.global_tools
 
-    def get_agent(self):
+    def build_agent(self):
         if self.llm is None:
             raise ValueError("LLM must be initialized before agent")
 
@@ -65,7 +77,7 @@ class AgentBuilder:
         if self.global_tools is None:
             raise ValueError("Global tools must be initialized before agent")
 
-        return ConversationalChatAgent.from_llm_and_tools(
+        self.agent = ConversationalChatAgent.from_llm_and_tools(
             llm=self.llm,
             tools=[
                 *self.global_tools,
@@ -78,3 +90,9 @@ class AgentBuilder:
             output_parser=self.parser,
             max_iterations=30,
         )
+
+    def get_agent(self):
+        if self.agent is None:
+            raise ValueError("Agent is not initialized yet")
+
+        return self.agent
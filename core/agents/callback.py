@@ -5,6 +5,7 @@ from langchain.schema import AgentAction, AgentFinish, LLMResult
 from celery import Task
 
 from ansi import ANSI, Color, Style, dim_multiline
+from core.events import AbstractEventChannel
 from logger import logger
 
 
@@ -40,7 +41,9 @@ class EVALCallbackHandler(BaseCallbackHandler):
         )
 
     def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        logger.info(ANSI(f"on_llm_new_token {token}").to(Color.green(), Style.italic()))
+        logger.debug(
+            ANSI(f"on_llm_new_token {token}").to(Color.green(), Style.italic())
+        )
 
     def on_llm_error(
         self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any
@@ -111,13 +114,22 @@ class EVALCallbackHandler(BaseCallbackHandler):
 
 
 class ExecutionTracingCallbackHandler(BaseCallbackHandler):
-    def __init__(self, execution: Task):
+    def __init__(self, execution: Task, channel: Optional[AbstractEventChannel] = None):
         self.execution = execution
+        self.channel = channel
         self.index = 0
+        # the latest step, kept here instead of being read back from the backend
+        self.info: Dict[str, Any] = {}
 
     def set_parser(self, parser) -> None:
         self.parser = parser
 
+    def publish(self, state: str, event: Dict[str, Any]) -> None:
+        # pollers get the whole step, subscribers only what changed
+        self.execution.update_state(state=state, meta=self.info)
+        if self.channel:
+            self.channel.publish(self.execution.request.id, state, event)
+
     def on_llm_start(
         self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
     ) -> None:
@@ -128,10 +140,17 @@ class ExecutionTracingCallbackHandler(BaseCallbackHandler):
         parsed = self.parser.parse_all(text)
         self.index += 1
         parsed["index"] = self.index
-        self.execution.update_state(state="LLM_END", meta=parsed)
+        self.info = parsed
+        self.publish("LLM_END", parsed)
 
     def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        pass
+        if self.channel:
+            self.channel.publish(
+                self.execution.request.id,
+                "LLM_NEW_TOKEN",
+                {"index": self.index + 1, "token": token},
+                persist=False,
+            )
 
     def on_llm_error(
         self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any
@@ -149,7 +168,8 @@ class ExecutionTracingCallbackHandler(BaseCallbackHandler):
     def on_chain_error(
         self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any
     ) -> None:
-        self.execution.update_state(state="CHAIN_ERROR", meta={"error": str(error)})
+        self.info = {**self.info, "error": str(error)}
+        self.publish("CHAIN_ERROR", {"index": self.index, "error": str(error)})
 
     def on_tool_start(
         self,
@@ -169,18 +189,14 @@ class ExecutionTracingCallbackHandler(BaseCallbackHandler):
         llm_prefix: Optional[str] = None,
         **kwargs: Any,
     ) -> None:
-        previous = self.execution.AsyncResult(self.execution.request.id)
-        self.execution.update_state(
-            state="TOOL_END", meta={**previous.info, "observation": output}
-        )
+        self.info = {**self.info, "observation": output}
+        self.publish("TOOL_END", {"index": self.index, "observation": output})
 
     def on_tool_error(
         self, error: Union[Exception, KeyboardInterrupt], **kwargs: Any
     ) -> None:
-        previous = self.execution.AsyncResult(self.execution.request.id)
-        self.execution.update_state(
-            state="TOOL_ERROR", meta={**previous.info, "error": str(error)}
-        )
+        self.info = {**self.info, "error": str(error)}
+        self.publish("TOOL_ERROR", {"index": self.index, "error": str(error)})
 
     def on_text(
         self,
@@ -1,8 +1,11 @@
 """OpenAI chat wrapper."""
 from __future__ import annotations
 
+import hashlib
 import logging
 import sys
+import threading
+import time
 from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 import openai
@@ -120,6 +123,56 @@ class ModelNotFoundException(Exception):
         )
 
 
+class AccessCheckCache:
+    """Remembers whether an api key can access a model.
+
+    Successful checks are trusted for `ttl` seconds and missing models for
+    `negative_ttl` seconds. Anything else (e.g. a network error) isn't cached.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float):
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.entries: Dict[
+            Tuple[str, str], Tuple[float, Optional[ModelNotFoundException]]
+        ] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def get_key(model_name: str, api_key: Optional[str]) -> Tuple[str, str]:
+        return model_name, hashlib.sha256((api_key or "").encode()).hexdigest()
+
+    def check(
+        self, model_name: str, api_key: Optional[str], retrieve: Callable[[], None]
+    ) -> None:
+        key = self.get_key(model_name, api_key)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            if entry[1] is not None:
+                raise entry[1]
+            return
+
+        try:
+            retrieve()
+        except ModelNotFoundException as e:
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.negative_ttl, e)
+            raise
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+access_check_cache = AccessCheckCache(
+    ttl=settings["MODEL_ACCESS_CHECK_TTL"],
+    negative_ttl=settings["MODEL_ACCESS_CHECK_NEGATIVE_TTL"],
+)
+
+
 class ChatOpenAI(BaseChatModel, BaseModel):
     """Wrapper around OpenAI Chat large language models.
 
@@ -156,14 +209,17 @@ class ChatOpenAI(BaseChatModel, BaseModel):
 
         extra = Extra.ignore
 
-    def check_access(self) -> None:
-        """Check that the user has access to the model."""
-
+    def retrieve_model(self) -> None:
         try:
             openai.Engine.retrieve(self.model_name)
         except openai.error.InvalidRequestError:
             raise ModelNotFoundException(self.model_name)
 
+    def check_access(self) -> None:
+        """Check that the user has access to the model."""
+
+        access_check_cache.check(self.model_name, openai.api_key, self.retrieve_model)
+
     @root_validator(pre=True)
     def build_extra(cls, values: Dict[str, Any]) -> Dict[str, Any]:
         """Build extra kwargs from additional params that were passed in."""
@@ -1,65 +1,127 @@
-from typing import Dict, Optional
-from celery import Task
+import re
+import threading
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 
 from langchain.agents.agent import AgentExecutor
 from langchain.callbacks.base import CallbackManager
 from langchain.callbacks import set_handler
-from langchain.chains.conversation.memory import ConversationBufferMemory
+from langchain.chains import LLMChain
 from langchain.memory.chat_memory import BaseChatMemory
 
+from core.sandbox import SandboxPool, resolve
+from core.session import (
+    AbstractSessionStore,
+    InMemorySessionStore,
+    RedisSessionStore,
+)
 from core.tools.base import BaseToolSet
 from core.tools.factory import ToolsFactory
+from env import settings
 
 from .builder import AgentBuilder
 from .callback import EVALCallbackHandler, ExecutionTracingCallbackHandler
+from .memory import TokenBudgetMemory, token_saving_metrics
 
 
 set_handler(EVALCallbackHandler())
 
 
+def get_memory_size(memory: BaseChatMemory) -> int:
+    summary = getattr(memory, "moving_summary_buffer", "")
+    return len(summary) + sum(
+        len(message.content) for message in memory.chat_memory.messages
+    )
+
+
+def get_output_files(output: str) -> List[str]:
+    """Paths of the files the output refers to as [file://path], resolved in
+    the sandbox of the session, which the response outlives."""
+    return [str(resolve(file)) for file in re.findall(r"\[file://(\S*)\]", output)]
+
+
 class AgentManager:
     def __init__(
         self,
         toolsets: list[BaseToolSet] = [],
+        memories: Optional[AbstractSessionStore[BaseChatMemory]] = None,
+        sandboxes: Optional[SandboxPool] = None,
     ):
         self.toolsets: list[BaseToolSet] = toolsets
-        self.memories: Dict[str, BaseChatMemory] = {}
-        self.executors: Dict[str, AgentExecutor] = {}
+        self.memories: AbstractSessionStore[
+            BaseChatMemory
+        ] = memories or InMemorySessionStore(sizeof=get_memory_size)
+        self.sandboxes: Optional[SandboxPool] = sandboxes
+        self.builder: Optional[AgentBuilder] = None
+        self.lock: threading.Lock = threading.Lock()
 
     def create_memory(self) -> BaseChatMemory:
-        return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        # summarizing is not a step of the agent, keep it out of the callbacks
+        llm = self.get_builder().get_llm().copy(update={"verbose": False})
+        return TokenBudgetMemory(
+            llm=llm,
+            memory_key="chat_history",
+            return_messages=True,
+            max_token_limit=settings["MEMORY_MAX_TOKENS"],
+        )
 
     def get_or_create_memory(self, session: str) -> BaseChatMemory:
-        if not (session in self.memories):
-            self.memories[session] = self.create_memory()
-        return self.memories[session]
+        memory = self.memories.get(session)
+        if memory is None:
+            memory = self.create_memory()
+        return memory
+
+    def get_builder(self) -> AgentBuilder:
+        # the llm, the tools and the prompt are the same for every request,
+        # so they are built once and shallow-copied per request instead.
+        if self.builder is None:
+            with self.lock:
+                if self.builder is None:
+                    builder = AgentBuilder(self.toolsets)
+                    builder.build_parser()
+                    builder.build_llm()
+                    builder.build_global_tools()
+                    builder.build_agent()
+                    self.builder = builder
+        return self.builder
 
     def create_executor(
-        self, session: str, execution: Optional[Task] = None
+        self, session: str, tracer: Optional[ExecutionTracingCallbackHandler] = None
     ) -> AgentExecutor:
-        builder = AgentBuilder(self.toolsets)
-        builder.build_parser()
+        builder = self.get_builder()
+        builder.get_llm().check_access()  # cached, only expires after a while
 
         callbacks = []
         eval_callback = EVALCallbackHandler()
         eval_callback.set_parser(builder.get_parser())
         callbacks.append(eval_callback)
-        if execution:
-            execution_callback = ExecutionTracingCallbackHandler(execution)
-            execution_callback.set_parser(builder.get_parser())
-            callbacks.append(execution_callback)
+        if tracer:
+            tracer.set_parser(builder.get_parser())
+            callbacks.append(tracer)
 
         callback_manager = CallbackManager(callbacks)
 
-        builder.build_llm(callback_manager)
-        builder.build_global_tools()
+        # tokens are only worth streaming when someone can subscribe to them
+        llm = builder.get_llm().copy(
+            update={
+                "callback_manager": callback_manager,
+                "streaming": tracer is not None and tracer.channel is not None,
+            }
+        )
+        agent = builder.get_agent()
+        agent = agent.copy(
+            update={"llm_chain": LLMChain(llm=llm, prompt=agent.llm_chain.prompt)}
+        )
 
         memory: BaseChatMemory = self.get_or_create_memory(session)
         tools = [
-            *builder.get_global_tools(),
+            *[
+                tool.copy(update={"callback_manager": callback_manager})
+                for tool in builder.get_global_tools()
+            ],
             *ToolsFactory.create_per_session_tools(
                 self.toolsets,
-                get_session=lambda: (session, self.executors[session]),
+                get_session=lambda: (session, executor),
             ),
         ]
 
@@ -67,17 +129,56 @@ class AgentManager:
             tool.callback_manager = callback_manager
 
         executor = AgentExecutor.from_agent_and_tools(
-            agent=builder.get_agent(),
+            agent=agent,
             tools=tools,
             memory=memory,
             callback_manager=callback_manager,
             verbose=True,
         )
-        self.executors[session] = executor
         return executor
 
+    def execute(
+        self,
+        session: str,
+        prompt: str,
+        tracer: Optional[ExecutionTracingCallbackHandler] = None,
+    ) -> Dict[str, Any]:
+        executor = self.create_executor(session, tracer)
+        sandbox = self.sandboxes.enter(session) if self.sandboxes else nullcontext()
+        with sandbox:
+            response = executor({"input": prompt})
+            response["files"] = get_output_files(response["output"])
+        if executor.memory is None:  # the conversation was exited
+            self.memories.delete(session)
+        else:
+            self.memories.set(session, executor.memory)
+        return response
+
+    def get_metrics(self) -> Dict[str, Dict[str, int]]:
+        metrics = {
+            "memories": self.memories.get_metrics(),
+            "memory_tokens": token_saving_metrics.to_dict(),
+        }
+        if self.sandboxes:
+            metrics["sandboxes"] = self.sandboxes.get_metrics()
+        return metrics
+
     @staticmethod
-    def create(toolsets: list[BaseToolSet]) -> "AgentManager":
-        return AgentManager(
+    def create(
+        toolsets: list[BaseToolSet], sandboxes: Optional[SandboxPool] = None
+    ) -> "AgentManager":
+        manager = AgentManager(
             toolsets=toolsets,
+            memories=InMemorySessionStore(
+                max_size=settings["SESSION_STORE_MAX_SIZE"],
+                ttl=settings["SESSION_STORE_TTL"],
+                max_bytes=settings["SESSION_STORE_MAX_BYTES"],
+                sizeof=get_memory_size,
+            ),
+            sandboxes=sandboxes,
         )
+        if settings["SESSION_STORE"] == "redis":
+            manager.memories = RedisSessionStore.from_settings(
+                settings, create_memory=manager.create_memory
+            )
+        return manager
@@ -0,0 +1,142 @@
+import threading
+from typing import Any, Dict, List
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.summary import SummarizerMixin
+from langchain.schema import BaseMessage, get_buffer_string
+
+from logger import logger
+
+
+class TokenSavingMetrics:
+    def __init__(self):
+        self.lock: threading.Lock = threading.Lock()
+        self.loads: int = 0
+        self.summarized: int = 0
+        self.tokens_saved: int = 0
+
+    def record_load(self, tokens_saved: int) -> None:
+        with self.lock:
+            self.loads += 1
+            self.tokens_saved += tokens_saved
+
+    def record_summary(self) -> None:
+        with self.lock:
+            self.summarized += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "loads": self.loads,
+                "summarized": self.summarized,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+token_saving_metrics = TokenSavingMetrics()
+
+
+class TokenBudgetMemory(BaseChatMemory, SummarizerMixin):
+    """Chat history that fits in `max_token_limit` tokens.
+
+    Recent messages are kept verbatim. When they no longer fit next to the
+    summary, the oldest ones are folded into the summary, which is sent in
+    front of the remaining messages.
+    """
+
+    max_token_limit: int = 2000
+    memory_key: str = "chat_history"
+    moving_summary_buffer: str = ""
+    summary_tokens: int = 0
+    # token count of each message in chat_memory, in the same order
+    message_tokens: List[int] = []
+    buffer_tokens: int = 0
+    # tokens and number of all the messages folded into the summary so far
+    folded_tokens: int = 0
+    folded_messages: int = 0
+
+    @property
+    def buffer(self) -> List[BaseMessage]:
+        return self.chat_memory.messages
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.folded_tokens - self.summary_tokens)
+
+    def count_tokens(self, message: BaseMessage) -> int:
+        return self.llm.get_num_tokens(
+            get_buffer_string(
+                [message], human_prefix=self.human_prefix, ai_prefix=self.ai_prefix
+            )
+        )
+
+    def count_new_messages(self) -> None:
+        for message in self.buffer[len(self.message_tokens) :]:
+            tokens = self.count_tokens(message)
+            self.message_tokens.append(tokens)
+            self.buffer_tokens += tokens
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        buffer = self.buffer
+        if self.moving_summary_buffer != "":
+            buffer = [
+                self.summary_message_cls(content=self.moving_summary_buffer),
+                *buffer,
+            ]
+
+        token_saving_metrics.record_load(self.tokens_saved)
+        logger.debug(
+            "Memory: %d tokens in history, %d saved by summary",
+            self.buffer_tokens + self.summary_tokens,
+            self.tokens_saved,
+        )
+
+        if self.return_messages:
+            return {self.memory_key: buffer}
+        return {
+            self.memory_key: get_buffer_string(
+                buffer, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix
+            )
+        }
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self.prune()
+
+    def prune(self) -> None:
+        self.count_new_messages()
+        while self.buffer and (
+            self.buffer_tokens + self.summary_tokens > self.max_token_limit
+        ):
+            # a single pass over the cached counts finds where to cut
+            budget = self.max_token_limit - self.summary_tokens
+            cut, remaining = 0, self.buffer_tokens
+            while cut < len(self.message_tokens) and remaining > budget:
+                remaining -= self.message_tokens[cut]
+                cut += 1
+
+            pruned = self.buffer[:cut]
+            del self.buffer[:cut]
+            del self.message_tokens[:cut]
+            self.folded_tokens += self.buffer_tokens - remaining
+            self.folded_messages += cut
+            self.buffer_tokens = remaining
+
+            self.moving_summary_buffer = self.predict_new_summary(
+                pruned, self.moving_summary_buffer
+            )
+            self.summary_tokens = self.llm.get_num_tokens(self.moving_summary_buffer)
+            token_saving_metrics.record_summary()
+
+    def clear(self) -> None:
+        super().clear()
+        self.moving_summary_buffer = ""
+        self.summary_tokens = 0
+        self.message_tokens = []
+        self.buffer_tokens = 0
+        self.folded_tokens = 0
+        self.folded_messages = 0
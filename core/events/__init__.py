@@ -0,0 +1,3 @@
+from .base import AbstractEventChannel, ExecutionEvent
+from .redis import RedisEventChannel
+from .memory import InMemoryEventChannel
@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod, abstractstaticmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, TypedDict
+
+from env import DotEnv
+
+
+class ExecutionEvent(TypedDict):
+    # position in the log of the execution, starting at 1. 0 if not logged.
+    index: int
+    type: str
+    data: Dict[str, Any]
+
+
+class AbstractEventChannel(ABC):
+    @abstractmethod
+    def publish(
+        self, execution_id: str, type: str, data: Dict[str, Any], persist: bool = True
+    ) -> int:
+        """Sends an event to the subscribers of the execution.
+
+        Unless `persist` is False, the event is also appended to the log of the
+        execution, so that it outlives the subscribers that missed it. Returns
+        the index of the event in the log.
+        """
+        pass
+
+    @abstractmethod
+    def read(self, execution_id: str, after: int = 0) -> List[ExecutionEvent]:
+        """Returns the logged events of the execution with an index above
+        `after`, oldest first."""
+        pass
+
+    @abstractmethod
+    @asynccontextmanager
+    async def subscribe(
+        self, execution_id: str, keepalive: float
+    ) -> AsyncIterator[AsyncIterator[Optional[ExecutionEvent]]]:
+        """Yields an iterator of events published after subscribing.
+
+        The iterator yields None whenever nothing was published for `keepalive`
+        seconds, so that callers can check on the execution in the meantime.
+        """
+        yield
+
+    @abstractstaticmethod
+    def from_settings(settings: DotEnv) -> "AbstractEventChannel":
+        pass
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from env import DotEnv
+
+from .base import AbstractEventChannel, ExecutionEvent
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[ExecutionEvent]"]
+
+
+class InMemoryEventChannel(AbstractEventChannel):
+    """Keeps the logs in this process, for running without redis.
+
+    Events can be published from any thread, but only subscribers of the same
+    process receive them, so the worker has to run in-process as well.
+    """
+
+    def __init__(self):
+        self.logs: Dict[str, List[ExecutionEvent]] = {}
+        self.subscribers: Dict[str, List[Subscriber]] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "InMemoryEventChannel":
+        return InMemoryEventChannel()
+
+    def publish(
+        self, execution_id: str, type: str, data: Dict[str, Any], persist: bool = True
+    ) -> int:
+        event: ExecutionEvent = {"index": 0, "type": type, "data": data}
+        with self.lock:
+            if persist:
+                log = self.logs.setdefault(execution_id, [])
+                event["index"] = len(log) + 1
+                log.append(event)
+            subscribers = list(self.subscribers.get(execution_id, []))
+
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        return event["index"]
+
+    def read(self, execution_id: str, after: int = 0) -> List[ExecutionEvent]:
+        with self.lock:
+            return self.logs.get(execution_id, [])[after:]
+
+    @asynccontextmanager
+    async def subscribe(
+        self, execution_id: str, keepalive: float
+    ) -> AsyncIterator[AsyncIterator[Optional[ExecutionEvent]]]:
+        subscriber: Subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self.lock:
+            self.subscribers.setdefault(execution_id, []).append(subscriber)
+        try:
+            yield self.listen(subscriber[1], keepalive)
+        finally:
+            with self.lock:
+                self.subscribers[execution_id].remove(subscriber)
+                if not self.subscribers[execution_id]:
+                    del self.subscribers[execution_id]
+
+    async def listen(
+        self, queue: "asyncio.Queue[ExecutionEvent]", keepalive: float
+    ) -> AsyncIterator[Optional[ExecutionEvent]]:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield None
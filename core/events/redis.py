@@ -0,0 +1,92 @@
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import redis
+import redis.asyncio
+from redis.asyncio.client import PubSub
+from redis.commands.core import Script
+
+from env import DotEnv
+
+from .base import AbstractEventChannel, ExecutionEvent
+
+
+class RedisEventChannel(AbstractEventChannel):
+    prefix = "eval:execution"
+    # logs the event and publishes it with its index in one round trip, so
+    # that readers never see it logged before it is published
+    APPEND = """
+local index = redis.call("RPUSH", KEYS[1], ARGV[1])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+redis.call("PUBLISH", KEYS[2], '{"index": ' .. index .. ', ' .. ARGV[3])
+return index
+"""
+
+    def __init__(self, url: str, ttl: int = 60 * 60 * 24):
+        self.url: str = url
+        self.client: redis.Redis = redis.Redis.from_url(url)
+        # as long as celery keeps the results around
+        self.ttl: int = ttl
+        self.append: Script = self.client.register_script(self.APPEND)
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "RedisEventChannel":
+        return RedisEventChannel(settings["CELERY_BROKER_URL"])
+
+    def get_channel(self, execution_id: str) -> str:
+        return f"{self.prefix}:{execution_id}:events"
+
+    def get_log(self, execution_id: str) -> str:
+        return f"{self.prefix}:{execution_id}:log"
+
+    def publish(
+        self, execution_id: str, type: str, data: Dict[str, Any], persist: bool = True
+    ) -> int:
+        if not persist:
+            event: ExecutionEvent = {"index": 0, "type": type, "data": data}
+            self.client.publish(self.get_channel(execution_id), json.dumps(event))
+            return 0
+        # the position in the list is the index, so it is not stored
+        return self.append(
+            keys=[self.get_log(execution_id), self.get_channel(execution_id)],
+            args=[
+                json.dumps([type, data]),
+                self.ttl,
+                # the event without its opening brace, to go after the index
+                json.dumps({"type": type, "data": data})[1:],
+            ],
+            client=self.client,
+        )
+
+    def read(self, execution_id: str, after: int = 0) -> List[ExecutionEvent]:
+        entries = self.client.lrange(self.get_log(execution_id), after, -1)
+        events: List[ExecutionEvent] = []
+        for index, entry in enumerate(entries, start=after + 1):
+            type, data = json.loads(entry)
+            events.append({"index": index, "type": type, "data": data})
+        return events
+
+    @asynccontextmanager
+    async def subscribe(
+        self, execution_id: str, keepalive: float
+    ) -> AsyncIterator[AsyncIterator[Optional[ExecutionEvent]]]:
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.get_channel(execution_id))
+        try:
+            yield self.listen(pubsub, keepalive)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+            await client.close()
+
+    async def listen(
+        self, pubsub: PubSub, keepalive: float
+    ) -> AsyncIterator[Optional[ExecutionEvent]]:
+        while True:
+            message = await pubsub.get_message(timeout=keepalive)
+            if message is None:
+                yield None
+            elif message["type"] == "message":
+                yield json.loads(message["data"])
@@ -1,23 +1,31 @@
+from typing import Optional
+
 import torch
 from PIL import Image
 from transformers import BlipForConditionalGeneration, BlipProcessor
 
+from core.models import ModelRegistry
 from core.prompts.file import IMAGE_PROMPT
 
 from .base import BaseHandler
 
 
 class ImageCaptioning(BaseHandler):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing ImageCaptioning to %s" % device)
         self.device = device
         self.torch_dtype = torch.float16 if "cuda" in device else torch.float32
-        self.processor = BlipProcessor.from_pretrained(
+        self.models = models or ModelRegistry(device)
+        self.models.register("ImageCaptioning", self.load)
+
+    def load(self):
+        processor = BlipProcessor.from_pretrained(
             "Salesforce/blip-image-captioning-base"
         )
-        self.model = BlipForConditionalGeneration.from_pretrained(
+        model = BlipForConditionalGeneration.from_pretrained(
             "Salesforce/blip-image-captioning-base", torch_dtype=self.torch_dtype
-        ).to(self.device)
+        )
+        return processor, model
 
     def handle(self, filename: str):
         img = Image.open(filename)
@@ -29,11 +37,12 @@ class ImageCaptioning(BaseHandler):
         img.save(filename, "PNG")
         print(f"Resize image form {width}x{height} to {width_new}x{height_new}")
 
-        inputs = self.processor(Image.open(filename), return_tensors="pt").to(
-            self.device, self.torch_dtype
-        )
-        out = self.model.generate(**inputs)
-        description = self.processor.decode(out[0], skip_special_tokens=True)
+        with self.models.use("ImageCaptioning") as (processor, model):
+            inputs = processor(Image.open(filename), return_tensors="pt").to(
+                self.device, self.torch_dtype
+            )
+            out = model.generate(**inputs)
+            description = processor.decode(out[0], skip_special_tokens=True)
         print(
             f"\nProcessed ImageCaptioning, Input Image: {filename}, Output Text: {description}"
         )
@@ -0,0 +1 @@
+from .registry import ModelRegistry, move, sizeof
@@ -0,0 +1,284 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from env import DotEnv
+from logger import logger
+
+
+def sizeof(model: Any) -> int:
+    """Bytes of the weights of a model, a pipeline or a tuple of them."""
+    if isinstance(model, (tuple, list)):
+        return sum(sizeof(m) for m in model)
+    components = getattr(model, "components", None)
+    if isinstance(components, dict):  # a diffusers pipeline
+        return sum(sizeof(c) for c in components.values())
+    if hasattr(model, "parameters") and hasattr(model, "buffers"):  # a torch module
+        tensors = {id(t): t for t in [*model.parameters(), *model.buffers()]}
+        return sum(t.numel() * t.element_size() for t in tensors.values())
+    return getattr(model, "nbytes", 0)
+
+
+def move(model: Any, device: str) -> None:
+    """Moves the weights of a model, a pipeline or a tuple of them, in place.
+    What has no weights, like processors, stays as it is."""
+    if isinstance(model, (tuple, list)):
+        for m in model:
+            move(m, device)
+    elif callable(getattr(model, "to", None)):
+        model.to(device)
+
+
+def free_memory() -> None:
+    gc.collect()
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def get_device_budget(device: str, share: float = 0.75) -> int:
+    """Bytes the models may take on a gpu when no budget is set, leaving the
+    rest to the activations of inference. 0, no limit, on the cpu."""
+    try:
+        import torch
+    except ImportError:
+        return 0
+    if not device.startswith("cuda") or not torch.cuda.is_available():
+        return 0
+    index = int(device.partition(":")[2] or 0)
+    return int(torch.cuda.get_device_properties(index).total_memory * share)
+
+
+class ModelEntry:
+    def __init__(self, name: str, load: Callable[[], Any]):
+        self.name: str = name
+        self.load: Callable[[], Any] = load
+        # held while the model is loaded or restored, so that it is only once
+        self.lock: threading.Lock = threading.Lock()
+        self.model: Any = None
+        self.size: int = 0
+        self.users: int = 0
+        self.last_used: float = 0
+
+        self.loads: int = 0
+        self.load_seconds: float = 0
+        self.restores: int = 0
+        self.restore_seconds: float = 0
+        self.offloads: int = 0
+        self.offload_seconds: float = 0
+        self.evictions: int = 0
+
+
+class ModelRegistry:
+    """Loads models on their first use and keeps the recently used ones.
+
+    Models are registered with a function loading them on the cpu, and are
+    moved to `device` when they are used. Those on the device take at most
+    `max_bytes`, 0 for no limit. Beyond that, the least recently used ones
+    that aren't in use are offloaded to the cpu, where they take at most
+    `max_offloaded_bytes`, and are dropped beyond that or when offloading is
+    disabled with 0. A dropped model is loaded again from disk, from the
+    cache of the model hub, the next time it is used.
+    """
+
+    def __init__(self, device: str, max_bytes: int = 0, max_offloaded_bytes: int = 0):
+        self.device: str = device
+        self.max_bytes: int = max_bytes
+        # on the cpu already, there is nowhere to offload to
+        self.max_offloaded_bytes: int = 0 if device == "cpu" else max_offloaded_bytes
+
+        self.models: Dict[str, ModelEntry] = {}
+        # least recently used first
+        self.resident: OrderedDict[str, ModelEntry] = OrderedDict()
+        self.offloaded: OrderedDict[str, ModelEntry] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+        # one model is moved to the device at a time, to keep the budget
+        self.moving: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def from_settings(settings: DotEnv, device: str) -> "ModelRegistry":
+        max_mb = settings["GPU_MODELS_MAX_MB"]
+        return ModelRegistry(
+            device,
+            max_bytes=max_mb * 2**20 if max_mb >= 0 else get_device_budget(device),
+            max_offloaded_bytes=settings["GPU_MODELS_OFFLOAD_MB"] * 2**20,
+        )
+
+    def register(self, name: str, load: Callable[[], Any]) -> None:
+        with self.lock:
+            if name in self.models:
+                raise Exception(f"A model is already registered as {name}.")
+            self.models[name] = ModelEntry(name, load)
+
+    def use_resident(self, entry: ModelEntry) -> bool:
+        with self.lock:
+            if entry.name not in self.resident:
+                return False
+            self.resident.move_to_end(entry.name)
+            entry.users += 1
+            self.hits += 1
+            return True
+
+    def acquire(self, name: str) -> Any:
+        if name not in self.models:
+            raise Exception(f"No model is registered as {name}.")
+        entry = self.models[name]
+        if self.use_resident(entry):
+            return entry.model
+
+        with entry.lock:
+            if self.use_resident(entry):  # loaded while waiting
+                return entry.model
+            with self.lock:
+                self.misses += 1
+                offloaded = self.offloaded.pop(name, None) is not None
+
+            start = time.monotonic()
+            if not offloaded:
+                # from disk to the cpu, which can take minutes, while other
+                # models are used and moved
+                entry.model = entry.load()
+                entry.size = sizeof(entry.model)
+            with self.moving:
+                self.make_room(entry)
+                move(entry.model, self.device)
+                with self.lock:  # counted in the budget from now on
+                    self.resident[name] = entry
+                    entry.users += 1
+            took = time.monotonic() - start
+
+            with self.lock:
+                if offloaded:
+                    entry.restores += 1
+                    entry.restore_seconds += took
+                else:
+                    entry.loads += 1
+                    entry.load_seconds += took
+            logger.info(
+                "%s %s to %s in %.2fs",
+                "Restored" if offloaded else "Loaded",
+                name,
+                self.device,
+                took,
+            )
+            return entry.model
+
+    def make_room(self, entry: ModelEntry) -> None:
+        """Offloads or drops the least recently used models on the device until
+        the entry fits in the budget with them.
+
+        The models evicted are locked until they are offloaded or dropped, and
+        those locked already, being restored, are left alone.
+        """
+        if not self.max_bytes:
+            return
+        with self.lock:
+            used = sum(e.size for e in self.resident.values())
+            idle = [e for e in self.resident.values() if e.users == 0]
+            evicted = []
+            for victim in idle:
+                if used + entry.size <= self.max_bytes:
+                    break
+                if not victim.lock.acquire(blocking=False):
+                    continue
+                used -= victim.size
+                evicted.append(self.resident.pop(victim.name))
+        if used + entry.size > self.max_bytes:
+            logger.warning(
+                "%s doesn't fit in the memory left by the models in use, "
+                "loading it anyway",
+                entry.name,
+            )
+
+        for victim in evicted:
+            try:
+                if victim.size <= self.max_offloaded_bytes:
+                    start = time.monotonic()
+                    move(victim.model, "cpu")
+                    took = time.monotonic() - start
+                    with self.lock:
+                        victim.offloads += 1
+                        victim.offload_seconds += took
+                        self.offloaded[victim.name] = victim
+                    logger.info("Offloaded %s to cpu in %.2fs", victim.name, took)
+                else:
+                    self.drop(victim)
+            finally:
+                victim.lock.release()
+
+        with self.lock:
+            offloaded = sum(e.size for e in self.offloaded.values())
+            dropped = []
+            for victim in list(self.offloaded.values()):
+                if offloaded <= self.max_offloaded_bytes:
+                    break
+                if not victim.lock.acquire(blocking=False):
+                    continue
+                offloaded -= victim.size
+                dropped.append(self.offloaded.pop(victim.name))
+        for victim in dropped:
+            try:
+                self.drop(victim)
+            finally:
+                victim.lock.release()
+        if evicted:
+            free_memory()
+
+    def drop(self, entry: ModelEntry) -> None:
+        with self.lock:
+            entry.model = None
+            entry.evictions += 1
+        logger.info("Dropped %s, it will be loaded again when used", entry.name)
+
+    def release(self, name: str) -> None:
+        entry = self.models[name]
+        with self.lock:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Gives the model on the device, kept there until the block exits."""
+        model = self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(name)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            models = {}
+            for name, entry in self.models.items():
+                if name in self.resident:
+                    state = self.device
+                elif name in self.offloaded:
+                    state = "cpu"
+                else:
+                    state = "unloaded"
+                models[name] = {
+                    "state": state,
+                    "bytes": entry.size,
+                    "loads": entry.loads,
+                    "load_ms": round(entry.load_seconds * 1000),
+                    "restores": entry.restores,
+                    "restore_ms": round(entry.restore_seconds * 1000),
+                    "offloads": entry.offloads,
+                    "offload_ms": round(entry.offload_seconds * 1000),
+                    "evictions": entry.evictions,
+                }
+            return {
+                "resident_bytes": sum(e.size for e in self.resident.values()),
+                "offloaded_bytes": sum(e.size for e in self.offloaded.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "models": models,
+            }
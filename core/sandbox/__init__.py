@@ -0,0 +1,2 @@
+from .base import Sandbox, current_sandbox, get_env, get_root, is_accessible, resolve
+from .pool import SandboxPool
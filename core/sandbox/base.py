@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class Sandbox:
+    """A working directory of its own for a session.
+
+    It starts as a copy of `template`, copied on write where the filesystem
+    supports reflinks, with the `shared` directories linked into it and
+    optionally a virtualenv on top of the system packages.
+    """
+
+    def __init__(self, root: Path, shared: List[Path] = []):
+        self.id: str = root.name
+        self.root: Path = root
+        self.shared: List[Path] = shared
+        self.users: int = 0
+        self.last_used: float = time.monotonic()
+
+    @staticmethod
+    def create(
+        path: Path,
+        template: Optional[Path] = None,
+        shared: List[Path] = [],
+        venv: bool = False,
+    ) -> "Sandbox":
+        sandbox = Sandbox(path.resolve() / uuid.uuid4().hex[:12], shared=shared)
+        sandbox.root.mkdir(parents=True)
+        if template:
+            sandbox.copy(template)
+        for directory in shared:
+            link = sandbox.root / directory.name
+            if not link.exists():
+                link.symlink_to(directory, target_is_directory=True)
+        if venv:
+            subprocess.run(
+                [sys.executable, "-m", "venv", "--system-site-packages", ".venv"],
+                cwd=sandbox.root,
+                check=True,
+                capture_output=True,
+            )
+        return sandbox
+
+    def copy(self, template: Path) -> None:
+        if shutil.which("cp"):
+            subprocess.run(
+                ["cp", "-a", "--reflink=auto", f"{template}/.", str(self.root)],
+                check=True,
+                capture_output=True,
+            )
+        else:
+            shutil.copytree(template, self.root, symlinks=True, dirs_exist_ok=True)
+
+    def get_env(self) -> Dict[str, str]:
+        venv = self.root / ".venv"
+        if not venv.exists():
+            return {}
+        return {
+            "VIRTUAL_ENV": str(venv),
+            "PATH": f"{venv / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        }
+
+    def destroy(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+current_sandbox: ContextVar[Optional[Sandbox]] = ContextVar(
+    "current_sandbox", default=None
+)
+
+
+def get_root() -> Path:
+    """Directory the tools of the current session work in, the process
+    working directory unless the session has a sandbox."""
+    sandbox = current_sandbox.get()
+    return sandbox.root if sandbox else Path()
+
+
+def get_env() -> Dict[str, str]:
+    """Environment variables to set for the commands of the current session."""
+    sandbox = current_sandbox.get()
+    return sandbox.get_env() if sandbox else {}
+
+
+def resolve(filepath: str) -> Path:
+    return get_root() / filepath
+
+
+def is_accessible(filepath: str) -> bool:
+    sandbox = current_sandbox.get()
+    roots = [sandbox.root, *sandbox.shared] if sandbox else [Path()]
+    path = resolve(filepath).resolve()
+    return any(path.is_relative_to(root.resolve()) for root in roots)
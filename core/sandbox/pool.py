@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from core.sandbox.base import Sandbox, current_sandbox
+from env import DotEnv
+from logger import logger
+
+
+class SandboxPool:
+    """Hands out a sandbox per session from `size` prepared ahead of time.
+
+    A thread refills the pool as sandboxes are taken, so that a new session
+    only has to pop one. Sandboxes are reclaimed, that is deleted, once their
+    session has not used them for `idle_ttl` seconds, or when more than
+    `max_sandboxes` are assigned, starting with the least recently used.
+    `on_reclaim` is called with the session of a sandbox before it is deleted.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        size: int = 4,
+        template: Optional[Path] = None,
+        shared: List[Path] = [],
+        venv: bool = False,
+        idle_ttl: float = 3600,
+        max_sandboxes: int = 64,
+        on_reclaim: Callable[[str], None] = lambda session: None,
+    ):
+        self.path: Path = path
+        self.size: int = size
+        self.template: Optional[Path] = template
+        self.shared: List[Path] = shared
+        self.venv: bool = venv
+        self.idle_ttl: float = idle_ttl
+        self.max_sandboxes: int = max_sandboxes
+        self.on_reclaim: Callable[[str], None] = on_reclaim
+
+        self.ready: Deque[Sandbox] = deque()
+        self.assigned: OrderedDict[str, Sandbox] = OrderedDict()
+        self.reclaimed: List[Sandbox] = []
+        self.ended: List[str] = []  # sessions of the reclaimed sandboxes
+        self.lock: threading.Lock = threading.Lock()
+        self.wakeup: threading.Event = threading.Event()
+        self.closed: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self.refiller: threading.Thread = threading.Thread(
+            target=self.refill, daemon=True
+        )
+        self.refiller.start()
+
+    @staticmethod
+    def from_settings(
+        settings: DotEnv,
+        shared: List[Path] = [],
+        on_reclaim: Callable[[str], None] = lambda session: None,
+    ) -> "SandboxPool":
+        template = settings["SANDBOX_TEMPLATE"]
+        return SandboxPool(
+            path=Path(settings["SANDBOX_DIR"]),
+            size=settings["SANDBOX_POOL_SIZE"],
+            template=Path(template).resolve() if template else None,
+            shared=shared,
+            venv=settings["SANDBOX_VENV"],
+            idle_ttl=settings["SANDBOX_IDLE_TTL"],
+            max_sandboxes=settings["SANDBOX_MAX"],
+            on_reclaim=on_reclaim,
+        )
+
+    def create(self) -> Sandbox:
+        return Sandbox.create(
+            self.path, template=self.template, shared=self.shared, venv=self.venv
+        )
+
+    def refill(self) -> None:
+        while not self.closed:
+            with self.lock:
+                self.reclaim()
+                reclaimed, self.reclaimed = self.reclaimed, []
+                ended, self.ended = self.ended, []
+            for session in ended:
+                try:
+                    self.on_reclaim(session)
+                except Exception as e:
+                    logger.warning(f"Failed to end the session {session}: {e}")
+            for sandbox in reclaimed:
+                sandbox.destroy()
+
+            while not self.closed and len(self.ready) < self.size:
+                try:
+                    sandbox = self.create()
+                except Exception as e:
+                    logger.warning(f"Failed to prepare a sandbox: {e}")
+                    break
+                self.ready.append(sandbox)
+
+            self.wakeup.wait(min(self.idle_ttl, 60))
+            self.wakeup.clear()
+
+    def reclaim(self) -> None:
+        now = time.monotonic()
+        for session, sandbox in list(self.assigned.items()):
+            if sandbox.users == 0 and now - sandbox.last_used > self.idle_ttl:
+                self.reclaimed.append(self.assigned.pop(session))
+                self.ended.append(session)
+        idle = [s for s, sandbox in self.assigned.items() if sandbox.users == 0]
+        for session in idle[: max(0, len(self.assigned) - self.max_sandboxes)]:
+            self.reclaimed.append(self.assigned.pop(session))
+            self.ended.append(session)
+
+    def acquire(self, session: str) -> Sandbox:
+        with self.lock:
+            sandbox = self.assigned.get(session)
+            if sandbox is None and self.ready:
+                sandbox = self.ready.popleft()
+                self.hits += 1
+                self.assigned[session] = sandbox
+            if sandbox is not None:
+                self.assigned.move_to_end(session)
+                sandbox.users += 1
+                self.wakeup.set()
+                return sandbox
+
+        # the pool ran dry, prepare one right away
+        sandbox = self.create()
+        with self.lock:
+            self.misses += 1
+            if session in self.assigned:  # raced with another request
+                self.reclaimed.append(sandbox)
+                sandbox = self.assigned[session]
+            self.assigned[session] = sandbox
+            self.assigned.move_to_end(session)
+            sandbox.users += 1
+        self.wakeup.set()
+        return sandbox
+
+    def release(self, sandbox: Sandbox) -> None:
+        with self.lock:
+            sandbox.users -= 1
+            sandbox.last_used = time.monotonic()
+
+    @contextmanager
+    def enter(self, session: str) -> Iterator[Sandbox]:
+        """Runs the tools called within in the sandbox of the session."""
+        sandbox = self.acquire(session)
+        token = current_sandbox.set(sandbox)
+        try:
+            yield sandbox
+        finally:
+            current_sandbox.reset(token)
+            self.release(sandbox)
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "ready": len(self.ready),
+                "assigned": len(self.assigned),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self) -> None:
+        self.closed = True
+        self.wakeup.set()
+        self.refiller.join()
+        with self.lock:
+            sandboxes = [*self.ready, *self.assigned.values(), *self.reclaimed]
+            ended = [*self.assigned, *self.ended]
+            self.ready.clear()
+            self.assigned.clear()
+            self.reclaimed = []
+            self.ended = []
+        for session in ended:
+            self.on_reclaim(session)
+        for sandbox in sandboxes:
+            sandbox.destroy()
@@ -0,0 +1,3 @@
+from .base import AbstractSessionStore, SessionStoreMetrics
+from .memory import InMemorySessionStore
+from .redis import RedisSessionStore
@@ -0,0 +1,30 @@
+from abc import ABC, abstractmethod
+from typing import Generic, Optional, TypedDict, TypeVar
+
+T = TypeVar("T")
+
+
+class SessionStoreMetrics(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class AbstractSessionStore(ABC, Generic[T]):
+    @abstractmethod
+    def get(self, session: str) -> Optional[T]:
+        pass
+
+    @abstractmethod
+    def set(self, session: str, value: T) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, session: str) -> None:
+        pass
+
+    @abstractmethod
+    def get_metrics(self) -> SessionStoreMetrics:
+        pass
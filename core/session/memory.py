@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .base import AbstractSessionStore, SessionStoreMetrics, T
+
+
+class InMemorySessionStore(AbstractSessionStore[T]):
+    """Keeps sessions in process, least recently used first.
+
+    A session is evicted when it has not been used for `ttl` seconds, or when
+    the store holds more than `max_size` sessions or more than `max_bytes` as
+    measured by `sizeof`. Zero disables a limit.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        ttl: float = 0,
+        max_bytes: int = 0,
+        sizeof: Callable[[T], int] = lambda _: 0,
+    ):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.max_bytes: int = max_bytes
+        self.sizeof: Callable[[T], int] = sizeof
+        # session -> (value, last access, size)
+        self.entries: OrderedDict[str, Tuple[T, float, int]] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, session: str) -> Optional[T]:
+        with self.lock:
+            self.evict_expired()
+            if session not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value, _, _ = self.entries[session]
+            self.put(session, value)
+            return value
+
+    def set(self, session: str, value: T) -> None:
+        with self.lock:
+            self.evict_expired()
+            self.put(session, value)
+            self.evict_overflow()
+
+    def delete(self, session: str) -> None:
+        with self.lock:
+            self.remove(session)
+
+    def get_metrics(self) -> SessionStoreMetrics:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+    def put(self, session: str, value: T) -> None:
+        self.remove(session)
+        size = self.sizeof(value)
+        self.entries[session] = (value, time.monotonic(), size)
+        self.bytes += size
+
+    def remove(self, session: str) -> bool:
+        entry = self.entries.pop(session, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        return True
+
+    def evict(self) -> None:
+        session = next(iter(self.entries))
+        self.remove(session)
+        self.evictions += 1
+
+    def evict_expired(self) -> None:
+        if not self.ttl:
+            return
+        deadline = time.monotonic() - self.ttl
+        # entries are ordered by last access, so the expired ones come first
+        while self.entries and next(iter(self.entries.values()))[1] < deadline:
+            self.evict()
+
+    def evict_overflow(self) -> None:
+        while self.max_size and len(self.entries) > self.max_size:
+            self.evict()
+        while self.max_bytes and self.bytes > self.max_bytes and self.entries:
+            self.evict()
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema import (
+    AIMessage,
+    BaseMessage,
+    ChatMessage,
+    HumanMessage,
+    SystemMessage,
+)
+
+from env import DotEnv
+
+from .base import AbstractSessionStore, SessionStoreMetrics
+
+# memory attributes other than the messages that survive a round trip,
+# if the memory has them.
+STATE_FIELDS = [
+    "moving_summary_buffer",
+    "summary_tokens",
+    "folded_tokens",
+    "folded_messages",
+]
+
+
+def dump_message(message: BaseMessage) -> str:
+    if isinstance(message, HumanMessage):
+        item = ["h", message.content]
+    elif isinstance(message, AIMessage):
+        item = ["a", message.content]
+    elif isinstance(message, SystemMessage):
+        item = ["s", message.content]
+    elif isinstance(message, ChatMessage):
+        item = ["c", message.content, message.role]
+    else:
+        raise ValueError(f"Got unknown type {message}")
+    return json.dumps(item, separators=(",", ":"))
+
+
+def load_message(data: bytes) -> BaseMessage:
+    item = json.loads(data)
+    if item[0] == "h":
+        return HumanMessage(content=item[1])
+    elif item[0] == "a":
+        return AIMessage(content=item[1])
+    elif item[0] == "s":
+        return SystemMessage(content=item[1])
+    return ChatMessage(content=item[1], role=item[2])
+
+
+def count_messages(memory: BaseChatMemory) -> int:
+    """Number of messages ever saved, including the ones folded away."""
+    return getattr(memory, "folded_messages", 0) + len(memory.chat_memory.messages)
+
+
+class RedisSessionStore(AbstractSessionStore[BaseChatMemory]):
+    """Keeps conversation memories in redis so that any worker can serve any
+    session.
+
+    Every session is a hash of its state and metadata, plus a list of its
+    messages. Both are read in one round trip, and written back in one
+    transaction that only succeeds if nobody else saved the session since it
+    was read. If somebody did, only the new messages are appended to theirs.
+    """
+
+    prefix = "eval:session"
+
+    def __init__(
+        self, url: str, create_memory: Callable[[], BaseChatMemory], ttl: int = 0
+    ):
+        self.client: redis.Redis = redis.Redis.from_url(url)
+        self.create_memory: Callable[[], BaseChatMemory] = create_memory
+        self.ttl: int = ttl
+        # session -> (version, message count) as of the last get
+        self.loaded: Dict[str, Tuple[int, int]] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def from_settings(
+        settings: DotEnv, create_memory: Callable[[], BaseChatMemory]
+    ) -> "RedisSessionStore":
+        return RedisSessionStore(
+            settings["CELERY_BROKER_URL"],
+            create_memory=create_memory,
+            ttl=settings["SESSION_STORE_TTL"],
+        )
+
+    def get_keys(self, session: str) -> Tuple[str, str]:
+        return f"{self.prefix}:{session}", f"{self.prefix}:{session}:messages"
+
+    def get(self, session: str) -> Optional[BaseChatMemory]:
+        state_key, messages_key = self.get_keys(session)
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(state_key)
+            pipe.lrange(messages_key, 0, -1)
+            if self.ttl:
+                pipe.expire(state_key, self.ttl)
+                pipe.expire(messages_key, self.ttl)
+            state, messages, *_ = pipe.execute()
+
+        with self.lock:
+            if not state:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        memory = self.create_memory()
+        for field, value in json.loads(state[b"state"]).items():
+            setattr(memory, field, value)
+        memory.chat_memory.messages = [load_message(message) for message in messages]
+
+        with self.lock:
+            self.loaded[session] = (int(state[b"version"]), count_messages(memory))
+        return memory
+
+    def set(self, session: str, value: BaseChatMemory) -> None:
+        with self.lock:
+            version, count = self.loaded.pop(session, (0, 0))
+        messages = value.chat_memory.messages
+        added = messages[max(0, len(messages) - (count_messages(value) - count)) :]
+        state = {
+            field: getattr(value, field)
+            for field in STATE_FIELDS
+            if hasattr(value, field)
+        }
+
+        state_key, messages_key = self.get_keys(session)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(state_key)
+                    current = int(pipe.hget(state_key, "version") or 0)
+                    pipe.multi()
+                    if current == version:
+                        pipe.delete(messages_key)
+                        if messages:
+                            pipe.rpush(messages_key, *map(dump_message, messages))
+                        pipe.hset(state_key, "state", json.dumps(state))
+                    elif added:
+                        # keep the other writer's summary, just add our turn
+                        pipe.rpush(messages_key, *map(dump_message, added))
+                    pipe.hset(
+                        state_key,
+                        mapping={"version": current + 1, "updated_at": time.time()},
+                    )
+                    if self.ttl:
+                        pipe.expire(state_key, self.ttl)
+                        pipe.expire(messages_key, self.ttl)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+
+    def delete(self, session: str) -> None:
+        with self.lock:
+            self.loaded.pop(session, None)
+        self.client.delete(*self.get_keys(session))
+
+    def get_metrics(self) -> SessionStoreMetrics:
+        # expiry and memory accounting are left to redis
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": 0,
+                "entries": 0,
+                "bytes": 0,
+            }
@@ -64,3 +64,6 @@ class BaseToolSet:
             getattr(cls, m) for m in dir(cls) if hasattr(getattr(cls, m), "is_tool")
         ]
         return [ToolWrapper(m.name, m.description, m.scope, m) for m in methods]
+
+    def end_session(self, session: str) -> None:
+        """Releases what the tools keep for a session once it has ended."""
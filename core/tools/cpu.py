@@ -98,7 +98,9 @@ class ExitConversation(BaseToolSet):
     def exit(self, message: str, get_session: SessionGetter) -> str:
         """Run the tool."""
         _, executor = get_session()
-        del executor
+        executor.memory.clear()
+        # nor saved after this run, the manager drops it from the store
+        executor.memory = None
 
         logger.debug(f"\nProcessed ExitConversation.")
 
@@ -4,6 +4,7 @@ from core.tools.base import BaseToolSet, tool
 from env import settings
 from logger import logger
 
+from .edit import CodeModifier
 from .patch import CodePatcher
 from .read import CodeReader
 from .write import CodeWriter
@@ -23,8 +24,9 @@ class CodeEditor(BaseToolSet):
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.READ, Input Commands: {inputs} "
-            f"Output Answer: {output}"
+            "\nProcessed CodeEditor.READ, Input Commands: %s Output Answer: %s",
+            inputs,
+            output,
         )
         return output
 
@@ -43,8 +45,9 @@ class CodeEditor(BaseToolSet):
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.SUMMARY, Input Commands: {inputs} "
-            f"Output Answer: {output}"
+            "\nProcessed CodeEditor.SUMMARY, Input Commands: %s Output Answer: %s",
+            inputs,
+            output,
         )
         return output
 
@@ -59,14 +62,15 @@ class CodeEditor(BaseToolSet):
     )
     def append(self, inputs: str) -> str:
         try:
-            code = CodeWriter.append(inputs)
-            output = "Last 3 line was:\n" + "\n".join(code.split("\n")[-3:])
+            written, tail = CodeWriter.append(inputs)
+            output = f"Appended {written} bytes. Last 3 line was:\n{tail}"
         except Exception as e:
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.APPEND, Input: {inputs} "
-            f"Output Answer: {output}"
+            "\nProcessed CodeEditor.APPEND, Input: %s Output Answer: %s",
+            inputs,
+            output,
         )
         return output
 
@@ -83,13 +87,41 @@ class CodeEditor(BaseToolSet):
     )
     def write(self, inputs: str) -> str:
         try:
-            code = CodeWriter.write(inputs.lstrip())
-            output = "Last 3 line was:\n" + "\n".join(code.split("\n")[-3:])
+            written, tail = CodeWriter.write(inputs)
+            output = f"Wrote {written} bytes. Last 3 line was:\n{tail}"
         except Exception as e:
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.WRITE, Input: {inputs} " f"Output Answer: {output}"
+            "\nProcessed CodeEditor.WRITE, Input: %s Output Answer: %s",
+            inputs,
+            output,
+        )
+        return output
+
+    @tool(
+        name="CodeEditor.EDIT",
+        description="Edit part of an existing file, without writing it whole. "
+        "Input is either a unified diff, like:\n"
+        "--- a/test.py\n+++ b/test.py\n@@ -1,2 +1,2 @@\n"
+        " import requests\n-print('hello world')\n+print('hi corca')\n"
+        "or the filename followed by search/replace blocks, like:\n"
+        "test.py\n<<<<<<< SEARCH\nprint('hello world')\n=======\n"
+        "print('hi corca')\n>>>>>>> REPLACE\n"
+        "Include a few unchanged lines around the change so it can be found. "
+        "An empty SEARCH appends to the file, creating it if needed. "
+        "The output will be the changed lines with their line numbers.",
+    )
+    def edit(self, inputs: str) -> str:
+        try:
+            output = CodeModifier.edit(inputs)
+        except Exception as e:
+            output = str(e)
+
+        logger.debug(
+            "\nProcessed CodeEditor.EDIT, Input: %s Output Answer: %s",
+            inputs,
+            output,
         )
         return output
 
@@ -118,8 +150,9 @@ class CodeEditor(BaseToolSet):
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.PATCH, Input Patch: {patches} "
-            f"Output Answer: {output}"
+            "\nProcessed CodeEditor.PATCH, Input Patch: %s Output Answer: %s",
+            patches,
+            output,
         )
         return output
 
@@ -139,7 +172,8 @@ class CodeEditor(BaseToolSet):
             output = str(e)
 
         logger.debug(
-            f"\nProcessed CodeEditor.DELETE, Input filename: {inputs} "
-            f"Output Answer: {output}"
+            "\nProcessed CodeEditor.DELETE, Input filename: %s Output Answer: %s",
+            inputs,
+            output,
         )
         return output
@@ -0,0 +1,235 @@
+import bisect
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from env import DotEnv, settings
+
+# a file modified this recently could be modified again without its mtime
+# changing, so its index isn't trusted until it has been still for this long.
+RACY_NS = 2 * 10**9
+
+
+def clip(data: bytes, max_bytes: int) -> bytes:
+    """Cuts `data` down to `max_bytes`, after the last whole line if any."""
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+    data = data[:max_bytes]
+    end = data.rfind(b"\n")
+    return data[: end + 1] if end >= 0 else data
+
+
+def decode(data: bytes) -> str:
+    return data.decode(errors="ignore").replace("\r\n", "\n")
+
+
+class CachedFile:
+    """Where each line of a file starts, to read ranges of lines without
+    reading the whole file."""
+
+    def __init__(self, path: str, key: Tuple[int, int, int]):
+        self.path: str = path
+        self.key: Tuple[int, int, int] = key
+        self.racy: bool = time.time_ns() - key[0] < RACY_NS
+        # offsets[i] is where line i starts, offsets[-1] is the size
+        self.offsets: array = array("q", [0])
+        self.tree: Optional[Any] = None  # CodeTree of the file, once built
+
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                offset += len(line)
+                self.offsets.append(offset)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def locate(self, line: int) -> int:
+        return self.offsets[line]
+
+    def read_bytes(self, begin: int, end: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            return f.read(end - begin)
+
+    def read(self, start: int, stop: int, max_bytes: int = 0) -> Tuple[str, int]:
+        """Reads lines[start:stop], as readlines() would have them, up to
+        `max_bytes`. Returns them with the number of whole lines read."""
+        lines = range(len(self))[start:stop]
+        if not lines:
+            return "", 0
+        begin, end = self.locate(lines[0]), self.locate(lines[-1] + 1)
+        if max_bytes and end - begin > max_bytes:
+            data = clip(self.read_bytes(begin, begin + max_bytes + 1), max_bytes)
+            return decode(data), data.count(b"\n")
+        return decode(self.read_bytes(begin, end)), len(lines)
+
+    def readlines(self) -> List[str]:
+        return io.StringIO(self.read(0, len(self))[0]).readlines()
+
+    def read_line(self, index: int, max_bytes: int = 0) -> Tuple[str, int]:
+        """Reads lines[index], as readlines() would have it."""
+        index = range(len(self))[index]  # raises IndexError like a list
+        return self.read(index, index + 1, max_bytes)
+
+
+class LargeFile(CachedFile):
+    """A file too large to keep the offset of every line of.
+
+    Only the number of lines before every `CHUNK` bytes is kept, counted on
+    the first read and saved next to the file for the next time. Reading a
+    line looks up its chunk and finds the line in there, so reads take as
+    long as the lines they return, whatever the size of the file.
+    """
+
+    CHUNK = 2**20
+
+    def __init__(self, path: str, key: Tuple[int, int, int]):
+        self.path: str = path
+        self.key: Tuple[int, int, int] = key
+        self.racy: bool = time.time_ns() - key[0] < RACY_NS
+        self.tree: Optional[Any] = None
+        self.size: int = key[1]
+        # counts[j] is the number of lines before chunk j, counts[-1] all of them
+        self.counts: Optional[array] = None
+        self.lines: int = 0
+
+    @property
+    def index_path(self) -> str:
+        directory, name = os.path.split(self.path)
+        return os.path.join(directory, f".{name}.lines")
+
+    def load_index(self) -> bool:
+        header = array("q")
+        try:
+            with open(self.index_path, "rb") as f:
+                header.fromfile(f, 5)
+                if tuple(header[:3]) != self.key or header[3] != self.CHUNK:
+                    return False
+                counts = array("q")
+                counts.frombytes(f.read())
+        except (OSError, EOFError, ValueError):
+            return False  # missing, or cut short, counted again
+        if len(counts) != -(-self.size // self.CHUNK) + 1:
+            return False
+        self.counts, self.lines = counts, header[4]
+        return True
+
+    def save_index(self) -> None:
+        """Saves the index at once, so that it is never read half written."""
+        directory, name = os.path.split(self.index_path)
+        try:
+            fd, temp = tempfile.mkstemp(dir=directory, prefix=f"{name}.")
+        except OSError:
+            return  # the directory may be read only, count again next time
+        try:
+            with os.fdopen(fd, "wb") as f:
+                array("q", [*self.key, self.CHUNK, self.lines]).tofile(f)
+                self.counts.tofile(f)
+            os.replace(temp, self.index_path)
+        except OSError:
+            os.unlink(temp)
+
+    def build_index(self) -> None:
+        counts = array("q", [0])
+        if self.size == 0:  # can't be mapped
+            self.counts, self.lines = counts, 0
+            return
+        with open(self.path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            for begin in range(0, self.size, self.CHUNK):
+                counts.append(counts[-1] + mm[begin : begin + self.CHUNK].count(b"\n"))
+            unterminated = self.size > 0 and mm[self.size - 1] != ord("\n")
+        self.counts = counts
+        self.lines = counts[-1] + unterminated
+        if not self.racy:
+            self.save_index()
+
+    def __len__(self) -> int:
+        if self.counts is None and not self.load_index():
+            self.build_index()
+        return self.lines
+
+    def locate(self, line: int) -> int:
+        if line == 0:
+            return 0
+        if line > self.counts[-1]:
+            return self.size
+        # the line starts after the line-th newline, in the last chunk with
+        # fewer newlines before it
+        chunk = bisect.bisect_left(self.counts, line) - 1
+        begin = chunk * self.CHUNK
+        data = self.read_bytes(begin, begin + self.CHUNK)
+        rest = data.split(b"\n", line - self.counts[chunk])[-1]
+        return begin + len(data) - len(rest)
+
+    def read_bytes(self, begin: int, end: int) -> bytes:
+        with open(self.path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            return mm[begin:end]
+
+    def readlines(self) -> List[str]:
+        raise Exception(
+            f"{self.path} is too large to read whole, read ranges of lines instead."
+        )
+
+
+class FileCache:
+    """Line indexes of recently read files, least recently used first out.
+
+    Entries are keyed by the absolute path, so sessions working in sandboxes
+    of their own don't share them, and hold the (mtime_ns, size, inode) of the
+    file when it was indexed. A file changed since is indexed again, and the
+    editor drops the entries of the files it writes right away. Files of
+    `large_file_bytes` and more only get a sparse index, see `LargeFile`.
+    """
+
+    def __init__(self, max_files: int = 128, large_file_bytes: int = 0):
+        self.max_files: int = max_files
+        self.large_file_bytes: int = large_file_bytes
+        self.files: OrderedDict[str, CachedFile] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "FileCache":
+        return FileCache(large_file_bytes=settings["EDITOR_LARGE_FILE_MB"] * 2**20)
+
+    def get(self, path: str) -> CachedFile:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            cached = self.files.get(path)
+            if cached is not None and cached.key == key and not cached.racy:
+                self.files.move_to_end(path)
+                self.hits += 1
+                return cached
+
+        if self.large_file_bytes and stat.st_size >= self.large_file_bytes:
+            cached = LargeFile(path, key)
+        else:
+            cached = CachedFile(path, key)
+        with self.lock:
+            self.misses += 1
+            self.files[path] = cached
+            self.files.move_to_end(path)
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+        return cached
+
+    def invalidate(self, path: str) -> None:
+        with self.lock:
+            self.files.pop(os.path.abspath(path), None)
+
+
+file_cache = FileCache.from_settings(settings)
@@ -0,0 +1,322 @@
+"""
+edit protocol, either a unified diff:
+
+--- a/test.py
++++ b/test.py
+@@ -4,2 +4,3 @@
+     url = f"https://www.google.com/search?q={keyword}+news"
+-    response = requests.get(url)
++    html = requests.get(url).text
++    soup = BeautifulSoup(html, "html.parser")
+
+or search/replace blocks, each under the file they edit:
+
+test.py
+<<<<<<< SEARCH
+    response = requests.get(url)
+=======
+    html = requests.get(url).text
+    soup = BeautifulSoup(html, "html.parser")
+>>>>>>> REPLACE
+
+The lines to replace don't have to match exactly. When they don't, they are
+looked up again ignoring whitespace, and then by similarity.
+"""
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from core.sandbox import resolve
+
+from .patch import write_atomically
+from .verify import verify
+
+# how similar lines looked up by similarity have to be to the ones given
+FUZZY_THRESHOLD = 0.8
+# lines of context shown around a change, and lines of a change shown at most
+CONTEXT_LINES = 2
+MAX_SHOWN_LINES = 30
+
+
+class Hunk:
+    def __init__(self, old: List[str], new: List[str], hint: Optional[int] = None):
+        self.old: List[str] = old  # without line endings
+        self.new: List[str] = new
+        self.hint: Optional[int] = hint  # index of the first old line, if known
+
+
+def strip_newline(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def get_indent(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+class EditCommand:
+    def __init__(self, filepath: str, hunks: List[Hunk], create: bool = False):
+        self.filepath: str = str(resolve(filepath))
+        self.hunks: List[Hunk] = hunks
+        self.create: bool = create
+        self.lines: List[str] = []
+        # [start, end) of the changed lines, in the edited file
+        self.regions: List[Tuple[int, int]] = []
+        self.notes: List[str] = []
+
+    def find(self, lines: List[str], hunk: Hunk) -> Tuple[int, str]:
+        """Returns where the old lines of the hunk start, and the indentation
+        they lack there."""
+        size = len(hunk.old)
+        stripped = [strip_newline(line) for line in lines]
+        windows = range(len(lines) - size + 1)
+
+        def closest(candidates: List[int]) -> int:
+            if len(candidates) == 1:
+                return candidates[0]
+            if hunk.hint is None:
+                raise Exception(
+                    f"The lines to replace appear {len(candidates)} times in "
+                    f"{self.filepath}, add lines around them to tell which."
+                )
+            return min(candidates, key=lambda i: abs(i - hunk.hint))
+
+        exact = [i for i in windows if stripped[i : i + size] == hunk.old]
+        if exact:
+            return closest(exact), ""
+
+        old = [line.strip() for line in hunk.old]
+        loose = [
+            i
+            for i in windows
+            if [line.strip() for line in stripped[i : i + size]] == old
+        ]
+        if loose:
+            start = closest(loose)
+            self.notes.append(f"matched ignoring whitespace at line {start + 1}")
+            return start, self.get_missing_indent(stripped[start : start + size], hunk)
+
+        text = "\n".join(old)
+        best, best_ratio = None, FUZZY_THRESHOLD
+        for i in windows:
+            window = "\n".join(line.strip() for line in stripped[i : i + size])
+            matcher = SequenceMatcher(None, window, text, autojunk=False)
+            if matcher.real_quick_ratio() < best_ratio:
+                continue
+            if matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio or (
+                ratio == best_ratio
+                and best is not None
+                and hunk.hint is not None
+                and abs(i - hunk.hint) < abs(best - hunk.hint)
+            ):
+                best, best_ratio = i, ratio
+        if best is None:
+            raise Exception(
+                f"Can't find the lines to replace in {self.filepath}:\n"
+                + "\n".join(hunk.old[:10])
+            )
+        self.notes.append(
+            f"matched {best_ratio:.0%} similar lines at line {best + 1}, "
+            "check the result"
+        )
+        return best, self.get_missing_indent(stripped[best : best + size], hunk)
+
+    def get_missing_indent(self, found: List[str], hunk: Hunk) -> str:
+        """Indentation the file has on top of the lines given, if they all
+        lack the same."""
+        missing = set()
+        for line, old in zip(found, hunk.old):
+            if not line.strip():
+                continue
+            indent, old_indent = get_indent(line), get_indent(old)
+            if not indent.endswith(old_indent):
+                return ""
+            missing.add(indent[: len(indent) - len(old_indent)])
+        return missing.pop() if len(missing) == 1 else ""
+
+    def apply(self, hunk: Hunk) -> None:
+        if not hunk.old:  # nothing to look for, insert at the hint or the end
+            start, indent = (len(self.lines) if hunk.hint is None else hunk.hint), ""
+        else:
+            start, indent = self.find(self.lines, hunk)
+        end = start + len(hunk.old)
+
+        # the lines left as they were keep the file's version of them, which
+        # differs where they were matched loosely
+        found, new = self.lines[start:end], []
+        matcher = SequenceMatcher(None, hunk.old, hunk.new, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                new += [strip_newline(line) + "\n" for line in found[i1:i2]]
+            else:
+                new += [
+                    (indent + line if line.strip() else line) + "\n"
+                    for line in hunk.new[j1:j2]
+                ]
+        unterminated = bool(self.lines) and not self.lines[-1].endswith("\n")
+        if unterminated and start == len(self.lines):
+            self.lines[-1] += "\n"  # to add lines after it
+        elif unterminated and end == len(self.lines) and new:
+            new[-1] = strip_newline(new[-1])  # keep the last line as it was
+        self.lines[start:end] = new
+
+        delta = len(new) - (end - start)
+        self.regions = [
+            (s + delta, e + delta) if s >= end else (s, e) for s, e in self.regions
+        ]
+        self.regions.append((start, start + len(new)))
+        if hunk.hint is not None:
+            for later in self.hunks:
+                if later.hint is not None and later.hint >= end:
+                    later.hint += delta
+
+    @verify
+    def prepare(self) -> str:
+        if os.path.exists(self.filepath):
+            with open(self.filepath, "r") as f:
+                self.lines = f.readlines()
+        elif not self.create and any(hunk.old for hunk in self.hunks):
+            raise Exception(f"{self.filepath} doesn't exist.")
+
+        for hunk in list(self.hunks):
+            self.apply(hunk)
+        return self.filepath
+
+    def commit(self) -> None:
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_atomically(self.filepath, self.lines)
+
+    def describe(self) -> str:
+        """Shows the changed lines of the file, with a few lines around."""
+        output = [f"{self.filepath}: {len(self.hunks)} change(s) applied"]
+        output += [f"({note})" for note in self.notes]
+        for start, end in sorted(self.regions):
+            first = max(0, start - CONTEXT_LINES)
+            last = min(len(self.lines), end + CONTEXT_LINES)
+            numbers = list(range(first, last))
+            if len(numbers) > MAX_SHOWN_LINES:
+                half = MAX_SHOWN_LINES // 2
+                numbers = numbers[:half] + [-1] + numbers[-half:]
+            if end > start:
+                output.append(f"@@ lines {start + 1}-{end} @@")
+            else:
+                output.append(f"@@ lines removed before line {start + 1} @@")
+            for i in numbers:
+                if i < 0:
+                    output.append("...")
+                    continue
+                output.append(f"{i + 1}: {strip_newline(self.lines[i])}")
+        return "\n".join(output)
+
+    @staticmethod
+    def parse_diff(command: str) -> List["EditCommand"]:
+        files: Dict[str, EditCommand] = {}
+        lines = command.splitlines()
+        filepath, create = None, False
+        if lines and not lines[0].startswith(("---", "diff ", "@@")):
+            filepath = lines.pop(0).strip()  # <filename>\n<diff> like WRITE
+
+        hunk: Optional[Hunk] = None
+        for i, line in enumerate(lines):
+            following = lines[i + 1] if i + 1 < len(lines) else ""
+            # and not a removed line starting with "--"
+            if line.startswith("--- ") and following.startswith("+++ "):
+                create = line[4:].split("\t")[0].strip() == "/dev/null"
+                hunk = None
+            elif line.startswith("+++ ") and lines[i - 1].startswith("--- "):
+                filepath = line[4:].split("\t")[0].strip()
+                if filepath == "/dev/null":
+                    raise Exception("Deleting files isn't supported by this tool.")
+                if re.match(r"^[ab]/", filepath):
+                    filepath = filepath[2:]
+                hunk = None
+            elif line.startswith("@@"):
+                if filepath is None:
+                    raise Exception("The diff doesn't say which file it is for.")
+                match = re.match(r"^@@ -(\d+)(?:,(\d+))?", line)
+                hint = None
+                if match and match.group(2) == "0":  # inserted after line N
+                    hint = int(match.group(1))
+                elif match:
+                    hint = max(0, int(match.group(1)) - 1)
+                hunk = Hunk([], [], hint)
+                if filepath not in files:
+                    files[filepath] = EditCommand(filepath, [], create=create)
+                files[filepath].hunks.append(hunk)
+            elif hunk is None or line.startswith(("diff ", "index ", "\\", "```")):
+                continue
+            elif line.startswith("-"):
+                hunk.old.append(line[1:])
+            elif line.startswith("+"):
+                hunk.new.append(line[1:])
+            else:  # context, often without its leading space when blank
+                hunk.old.append(line[1:] if line.startswith(" ") else line)
+                hunk.new.append(line[1:] if line.startswith(" ") else line)
+
+        for edit in files.values():
+            # trailing blank context is often made up, don't look for it
+            for hunk in edit.hunks:
+                while hunk.old and hunk.new and not hunk.old[-1] and not hunk.new[-1]:
+                    hunk.old.pop()
+                    hunk.new.pop()
+            if edit.create:
+                for hunk in edit.hunks:
+                    hunk.hint = None
+        return list(files.values())
+
+    @staticmethod
+    def parse_blocks(command: str) -> List["EditCommand"]:
+        files: Dict[str, EditCommand] = {}
+        filepath: Optional[str] = None
+        hunk: Optional[Hunk] = None
+        state = None
+        for line in command.splitlines():
+            if line.startswith("<<<<<<<"):
+                if filepath is None:
+                    raise Exception("Put the filename on the line before SEARCH.")
+                hunk, state = Hunk([], []), "search"
+            elif line.startswith("=======") and state == "search":
+                state = "replace"
+            elif line.startswith(">>>>>>>") and state == "replace":
+                if filepath not in files:
+                    files[filepath] = EditCommand(filepath, [], create=True)
+                files[filepath].hunks.append(hunk)
+                hunk, state = None, None
+            elif state == "search":
+                hunk.old.append(line)
+            elif state == "replace":
+                hunk.new.append(line)
+            elif line.strip() and not line.startswith("```"):
+                filepath = line.strip()
+        if state is not None:
+            raise Exception("A SEARCH block isn't closed with >>>>>>> REPLACE.")
+        return list(files.values())
+
+    @staticmethod
+    def from_str(command: str) -> List["EditCommand"]:
+        if re.search(r"^<<<<<<<", command, re.MULTILINE):
+            edits = EditCommand.parse_blocks(command)
+        else:
+            edits = EditCommand.parse_diff(command)
+        if not edits:
+            raise Exception("Found no changes, give a unified diff or SEARCH blocks.")
+        return edits
+
+
+class CodeModifier:
+    @staticmethod
+    def edit(command: str) -> str:
+        """Edits every file, or none of them if an edit fails."""
+        edits = EditCommand.from_str(command)
+        for edit in edits:
+            result = edit.prepare()
+            if result != edit.filepath:  # refused by verify
+                raise Exception(result)
+        for edit in edits:
+            edit.commit()
+        return "\n".join(edit.describe() for edit in edits)
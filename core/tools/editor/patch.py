@@ -56,13 +56,54 @@ test.py|7,5|9,13|news_titles = []
 test.py|11,16|11,16|_titles
 """
 
+import contextvars
 import os
 import re
-from typing import Tuple
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+from core.sandbox import resolve
+
+from .cache import file_cache
 from .verify import verify
 
 
+# os.umask can only be read by setting it, which isn't safe once threads run
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def stage_file(filepath: str, lines: List[str]) -> str:
+    """Writes the lines to a temporary file next to the file, with its mode,
+    ready to replace it."""
+    directory, name = os.path.split(os.path.abspath(filepath))
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.writelines(lines)
+        if os.path.exists(filepath):
+            os.chmod(temp, os.stat(filepath).st_mode)
+        else:  # as open() would have created it, not private like mkstemp
+            os.chmod(temp, 0o666 & ~UMASK)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return temp
+
+
+def write_atomically(filepath: str, lines: List[str]) -> None:
+    """Replaces the file with the lines at once, so that it is never seen
+    half written."""
+    temp = stage_file(filepath, lines)
+    try:
+        os.replace(temp, filepath)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    file_cache.invalidate(filepath)
+
+
 class Position:
     separator = ","
 
@@ -73,6 +114,12 @@ class Position:
     def __str__(self):
         return f"(Ln {self.line}, Col {self.col})"
 
+    def to_tuple(self) -> Tuple[int, int]:
+        return (self.line, self.col)
+
+    def to_str(self) -> str:
+        return f"{self.line + 1}{Position.separator}{self.col + 1}"
+
     @staticmethod
     def from_str(pos: str) -> "Position":
         line, col = pos.split(Position.separator)
@@ -83,39 +130,27 @@ class PatchCommand:
     separator = "|"
 
     def __init__(self, filepath: str, start: Position, end: Position, content: str):
-        self.filepath: str = filepath
+        self.filepath: str = str(resolve(filepath))
         self.start: Position = start
         self.end: Position = end
         self.content: str = content
 
-    def read_lines(self) -> list[str]:
-        with open(self.filepath, "r") as f:
-            lines = f.readlines()
-        return lines
-
-    def write_lines(self, lines: list[str]) -> int:
-        with open(self.filepath, "w") as f:
-            f.writelines(lines)
-        return sum([len(line) for line in lines])
-
-    @verify
-    def execute(self) -> Tuple[int, int]:
-        lines = self.read_lines()
-        before = sum([len(line) for line in lines])
-
+    def apply(self, lines: List[str]) -> None:
+        if not 0 <= self.start.line <= self.end.line < len(lines):
+            raise Exception(
+                f"Can't patch {self.start.to_str()} to {self.end.to_str()} "
+                f"of {self.filepath}, "
+                f"it has {len(lines)} lines."
+            )
         lines[self.start.line] = (
             lines[self.start.line][: self.start.col]
             + self.content
             + lines[self.end.line][self.end.col :]
         )
-        lines = lines[: self.start.line + 1] + lines[self.end.line + 1 :]
+        del lines[self.start.line + 1 : self.end.line + 1]
 
-        after = self.write_lines(lines)
-
-        written = len(self.content)
-        deleted = before - after + written
-
-        return written, deleted
+    def execute(self) -> Tuple[int, int]:
+        return CodePatcher.apply([FilePatch(self.filepath, [self])])
 
     @staticmethod
     def from_str(command: str) -> "PatchCommand":
@@ -138,12 +173,107 @@ class PatchCommand:
         )
 
 
+class FilePatch:
+    """The hunks of a patch that go to the same file.
+
+    They are all applied to the file read once, from the last to the first so
+    that the positions of the ones left stay valid. The result is staged next
+    to the file, then replaces it at once, or is discarded if any hunk of the
+    patch, or of another file patched with it, fails.
+    """
+
+    def __init__(self, filepath: str, commands: List[PatchCommand]):
+        self.filepath: str = filepath
+        # stable, so hunks at the same position apply in the order given
+        self.commands: List[PatchCommand] = sorted(
+            commands, key=lambda c: c.start.to_tuple(), reverse=True
+        )
+        self.lines: List[str] = []
+        self.staged: Optional[str] = None
+
+    def check_overlaps(self) -> None:
+        for later, earlier in zip(self.commands, self.commands[1:]):
+            if earlier.end.to_tuple() > later.start.to_tuple():
+                raise Exception(
+                    f"Patches {earlier.start.to_str()} to {earlier.end.to_str()} and "
+                    f"{later.start.to_str()} to {later.end.to_str()} "
+                    f"of {self.filepath} overlap."
+                )
+
+    @verify
+    def prepare(self) -> Tuple[int, int]:
+        self.check_overlaps()
+        with open(self.filepath, "r") as f:
+            self.lines = f.readlines()
+        before = sum([len(line) for line in self.lines])
+
+        for command in self.commands:
+            command.apply(self.lines)
+
+        after = sum([len(line) for line in self.lines])
+        written = sum([len(command.content) for command in self.commands])
+        return written, before - after + written
+
+    def stage(self) -> None:
+        self.staged = stage_file(self.filepath, self.lines)
+
+    def discard(self) -> None:
+        if self.staged is not None:
+            os.unlink(self.staged)
+            self.staged = None
+
+    def commit(self) -> None:
+        os.replace(self.staged, self.filepath)
+        self.staged = None
+        file_cache.invalidate(self.filepath)
+
+
 class CodePatcher:
     separator = "\n---~~~+++===+++~~~---\n"
 
     @staticmethod
-    def sort_commands(commands: list[PatchCommand]) -> list[PatchCommand]:
-        return sorted(commands, key=lambda c: c.start.line, reverse=True)
+    def group_commands(commands: List[PatchCommand]) -> List[FilePatch]:
+        files: Dict[str, List[PatchCommand]] = {}
+        for command in commands:
+            files.setdefault(command.filepath, []).append(command)
+        return [FilePatch(filepath, hunks) for filepath, hunks in files.items()]
+
+    @staticmethod
+    def run(func, patches: List[FilePatch]) -> list:
+        if len(patches) == 1:
+            return [func(patches[0])]
+        with ThreadPoolExecutor(max_workers=min(len(patches), 8)) as executor:
+            # in the context of the caller, so they work in its sandbox
+            futures = [
+                executor.submit(contextvars.copy_context().run, func, patch)
+                for patch in patches
+            ]
+            return [future.result() for future in futures]
+
+    @staticmethod
+    def apply(patches: List[FilePatch]) -> Tuple[int, int]:
+        """Patches every file, or none of them if a patch fails or a patched
+        file can't be written.
+
+        Every file is patched and written next to itself before any is
+        replaced. Only a failure of the renames that follow, which the checks
+        before them leave unlikely, can leave some files replaced.
+        """
+        results = CodePatcher.run(FilePatch.prepare, patches)
+        for result in results:
+            if isinstance(result, str):  # refused by verify
+                raise Exception(result)
+        try:
+            CodePatcher.run(FilePatch.stage, patches)
+            for patch in patches:
+                patch.commit()
+        finally:
+            for patch in patches:
+                patch.discard()
+        return (
+            sum([written for written, _ in results]),
+            sum([deleted for _, deleted in results]),
+        )
 
     @staticmethod
     def patch(bulk_command: str) -> Tuple[int, int]:
@@ -152,15 +282,7 @@ class CodePatcher:
             for command in bulk_command.split(CodePatcher.separator)
             if command != ""
         ]
-        commands = CodePatcher.sort_commands(commands)
-
-        written, deleted = 0, 0
-        for command in commands:
-            if command:
-                w, d = command.execute()
-                written += w
-                deleted += d
-        return written, deleted
+        return CodePatcher.apply(CodePatcher.group_commands(commands))
 
 
 if __name__ == "__main__":
@@ -3,8 +3,13 @@ read protocol:
 
 <filepath>|<start line>-<end line>
 """
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+from core.sandbox import resolve
+from core.tools.terminal.output import BYTES_PER_TOKEN
+from env import settings
+
+from .cache import file_cache
 from .verify import verify
 
 
@@ -28,26 +33,27 @@ class Line:
         if self.__depth > depth:
             return []
 
-        lines: List[Line] = [self]
-        for child in self.__children:
-            lines += child.find_by_lte_depth(depth)
+        # children are one level deeper than their parent
+        lines: List[Line] = []
+        stack: List[Line] = [self]
+        while stack:
+            line = stack.pop()
+            lines.append(line)
+            if line.__depth < depth:
+                stack.extend(reversed(line.__children))
         return lines
 
     def find_by_content(self, content: str) -> List["Line"]:
-        if content in self.__content:
-            return [self]
-
         lines: List[Line] = []
-        for child in self.__children:
-            lines += child.find_by_content(content)
+        stack: List[Line] = [self]
+        while stack:
+            line = stack.pop()
+            if content in line.__content:
+                lines.append(line)
+                continue
+            stack.extend(reversed(line.__children))
         return lines
 
-    def find_last_lines(self) -> List["Line"]:
-        if len(self.__children) == 0:
-            return [self]
-        else:
-            return [self, *self.__children[-1].find_last_lines()]
-
     def print(self, depth: int = 0) -> None:
         print(f"{'  ' * depth}{self}", end="")
         for child in self.__children:
@@ -58,26 +64,38 @@ class Line:
 
 
 class CodeTree:
+    """Lines of code nested by indentation.
+
+    The lines are appended in order, so a new line can only go under one of
+    the lines on the path from the root to the last line appended. That path
+    is kept as a stack, with the indentation of each line on it.
+    """
+
     def __init__(self):
         self.root: Line = Line("\n", -1, -1)
+        self.__last_lines: List[Tuple[Line, int]] = [
+            (self.root, self.__get_leading_spaces(self.root.get_content()))
+        ]
 
     def append(self, content: str, line_number: int) -> None:
-        last_lines: List[Line] = self.root.find_last_lines()
         new_leading_spaces: int = self.__get_leading_spaces(content)
 
-        previous_line: Line = self.root
-        previous_leading_spaces: int = -1
-        for line in last_lines:
-            leading_spaces = self.__get_leading_spaces(line.get_content())
-            if (
-                previous_leading_spaces < new_leading_spaces
-                and new_leading_spaces <= leading_spaces
+        # the root counts as indented by one, its "\n" being whitespace, and
+        # takes any line indented as much. Below it, indentation grows along
+        # the path.
+        if new_leading_spaces <= self.__last_lines[0][1]:
+            del self.__last_lines[1:]
+        else:
+            while (
+                len(self.__last_lines) > 1
+                and self.__last_lines[-1][1] >= new_leading_spaces
             ):
-                break
-            previous_line, previous_leading_spaces = line, leading_spaces
+                self.__last_lines.pop()
 
-        new_line_depth: int = previous_line.get_depth() + 1
-        previous_line.append_child(Line(content, line_number, new_line_depth))
+        previous_line: Line = self.__last_lines[-1][0]
+        new_line = Line(content, line_number, previous_line.get_depth() + 1)
+        previous_line.append_child(new_line)
+        self.__last_lines.append((new_line, new_leading_spaces))
 
     def find_from_root(self, depth: int) -> List[Line]:
         return self.root.find_by_lte_depth(depth)
@@ -102,46 +120,70 @@ class CodeTree:
 class ReadCommand:
     separator = "|"
 
-    def __init__(self, filepath: str, start: int, end: int):
-        self.filepath: str = filepath
+    def __init__(self, filepath: str, start: int, end: int, max_bytes: int = 0):
+        self.filepath: str = str(resolve(filepath))
         self.start: int = start
         self.end: int = end
+        self.max_bytes: int = max_bytes
 
     @verify
     def execute(self) -> str:
-        with open(self.filepath, "r") as f:
-            code = f.readlines()
-
+        cached = file_cache.get(self.filepath)
         if self.start == self.end:
-            code = code[self.start - 1]
+            first = range(len(cached))[self.start - 1]
+            lines = 1
+            code, read = cached.read_line(self.start - 1, self.max_bytes)
         else:
-            code = "".join(code[self.start - 1 : self.end])
+            selected = range(len(cached))[self.start - 1 : self.end]
+            first, lines = (selected[0] if selected else 0), len(selected)
+            code, read = cached.read(self.start - 1, self.end, self.max_bytes)
+
+        if read == 0 and lines > 0:
+            code += (
+                f"\n... line {first + 1} is longer than {self.max_bytes} bytes, "
+                "only its beginning is shown ...\n"
+            )
+        elif read < lines:
+            code += (
+                f"\n... {read} of {lines} lines shown, up to {self.max_bytes} bytes. "
+                f"Read on from line {first + read + 1} ...\n"
+            )
         return code
 
     @staticmethod
     def from_str(command: str) -> "ReadCommand":
         filepath, line = command.split(ReadCommand.separator)
         start, end = line.split("-")
-        return ReadCommand(filepath, int(start), int(end))
+        budgets = [
+            settings["EDITOR_READ_MAX_BYTES"],
+            settings["EDITOR_READ_MAX_TOKENS"] * BYTES_PER_TOKEN,
+        ]
+        return ReadCommand(
+            filepath,
+            int(start),
+            int(end),
+            max_bytes=min([budget for budget in budgets if budget > 0], default=0),
+        )
 
 
 class SummaryCommand:
     separator = "|"
 
     def __init__(self, filepath: str, depth: int, parent_content: Optional[str] = None):
-        self.filepath: str = filepath
+        self.filepath: str = str(resolve(filepath))
         self.depth: int = depth
         self.parent_content: Optional[str] = parent_content
 
     @verify
     def execute(self) -> str:
-        with open(self.filepath, "r") as f:
-            code = f.readlines()
-
-        code_tree = CodeTree()
-        for i, line in enumerate(code):
-            if line.strip() != "":
-                code_tree.append(line, i + 1)
+        cached = file_cache.get(self.filepath)
+        code_tree: CodeTree = cached.tree
+        if code_tree is None:
+            code_tree = CodeTree()
+            for i, line in enumerate(cached.readlines()):
+                if line.strip() != "":
+                    code_tree.append(line, i + 1)
+            cached.tree = code_tree
 
         if self.parent_content is None:
             lines = code_tree.find_from_root(self.depth)
@@ -1,4 +1,4 @@
-from pathlib import Path
+from core.sandbox import is_accessible
 
 
 def verify(func):
@@ -7,7 +7,7 @@ def verify(func):
             filepath = args[0].filepath
         except AttributeError:
             raise Exception("This tool doesn't have filepath. Please check your code.")
-        if not str(Path(filepath).resolve()).startswith(str(Path().resolve())):
+        if not is_accessible(filepath):
             return "You can't access file outside of playground."
         return func(*args, **kwargs)
 
@@ -5,15 +5,25 @@ write protocol:
 <content>
 """
 import os
+import re
+from typing import Tuple
 
+from core.sandbox import resolve
+
+from .cache import file_cache
 from .verify import verify
 
 
+# characters encoded and written at a time, so that a large content is never
+# copied whole again
+CHUNK_SIZE = 2**16
+
+
 class WriteCommand:
     separator = "\n"
 
-    def __init__(self, filepath: str, content: int):
-        self.filepath: str = filepath
+    def __init__(self, filepath: str, content: str):
+        self.filepath: str = str(resolve(filepath))
         self.content: str = content
         self.mode: str = "w"
 
@@ -22,25 +32,56 @@ class WriteCommand:
         return self
 
     @verify
-    def execute(self) -> str:
+    def execute(self) -> int:
+        """Writes the content and returns the number of bytes written."""
         dir_path = os.path.dirname(self.filepath)
         if dir_path:
             os.makedirs(dir_path, exist_ok=True)
-        with open(self.filepath, self.mode) as f:
-            f.write(self.content)
-        return self.content
+        written = 0
+        with open(self.filepath, self.mode + "b") as f:
+            for i in range(0, len(self.content), CHUNK_SIZE):
+                written += f.write(self.content[i : i + CHUNK_SIZE].encode())
+        file_cache.invalidate(self.filepath)
+        return written
+
+    def tail(self, lines: int = 3) -> str:
+        """Reads the last lines of the file, from its end."""
+        with open(self.filepath, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            size = 256
+            while True:
+                begin = max(0, end - size)
+                f.seek(begin)
+                data = f.read(end - begin)
+                if data.count(b"\n") >= lines or begin == 0:
+                    break
+                size *= 4
+        return "\n".join(data.decode(errors="ignore").split("\n")[-lines:])
 
     @staticmethod
     def from_str(command: str) -> "WriteCommand":
-        filepath = command.split(WriteCommand.separator)[0]
-        return WriteCommand(filepath, command[len(filepath) + 1 :])
+        # only the content is copied, once, however large it is
+        start = re.match(r"\s*", command).end()
+        end = command.find(WriteCommand.separator, start)
+        if end < 0:
+            return WriteCommand(command[start:], "")
+        return WriteCommand(command[start:end], command[end + 1 :])
 
 
 class CodeWriter:
     @staticmethod
-    def write(command: str) -> str:
-        return WriteCommand.from_str(command).with_mode("w").execute()
+    def execute(command: str, mode: str) -> Tuple[int, str]:
+        """Returns the number of bytes written and the last lines of the file."""
+        write_command = WriteCommand.from_str(command).with_mode(mode)
+        written = write_command.execute()
+        if isinstance(written, str):  # refused by verify
+            raise Exception(written)
+        return written, write_command.tail()
+
+    @staticmethod
+    def write(command: str) -> Tuple[int, str]:
+        return CodeWriter.execute(command, "w")
 
     @staticmethod
-    def append(command: str) -> str:
-        return WriteCommand.from_str(command).with_mode("a").execute()
+    def append(command: str) -> Tuple[int, str]:
+        return CodeWriter.execute(command, "a")
@@ -1,5 +1,6 @@
 import os
 import uuid
+from typing import Optional
 
 import numpy as np
 import torch
@@ -17,60 +18,66 @@ from transformers import (
     CLIPSegProcessor,
 )
 
+from core.models import ModelRegistry
+from core.sandbox import resolve
 from logger import logger
-from utils import get_new_image_name
+from utils import dilate_square, get_new_image_name
 
 from .base import BaseToolSet, tool
 
 
 class MaskFormer(BaseToolSet):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing MaskFormer to %s" % device)
         self.device = device
-        self.processor = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined")
-        self.model = CLIPSegForImageSegmentation.from_pretrained(
+        self.models = models or ModelRegistry(device)
+        self.models.register("MaskFormer", self.load)
+
+    def load(self):
+        processor = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined")
+        model = CLIPSegForImageSegmentation.from_pretrained(
             "CIDAS/clipseg-rd64-refined"
-        ).to(device)
+        )
+        return processor, model
 
     def inference(self, image_path, text):
         threshold = 0.5
         min_area = 0.02
         padding = 20
-        original_image = Image.open(image_path)
+        original_image = Image.open(resolve(image_path))
         image = original_image.resize((512, 512))
-        inputs = self.processor(
-            text=text, images=image, padding="max_length", return_tensors="pt"
-        ).to(self.device)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
+        with self.models.use("MaskFormer") as (processor, model):
+            inputs = processor(
+                text=text, images=image, padding="max_length", return_tensors="pt"
+            ).to(self.device)
+            with torch.no_grad():
+                outputs = model(**inputs)
         mask = torch.sigmoid(outputs[0]).squeeze().cpu().numpy() > threshold
         area_ratio = len(np.argwhere(mask)) / (mask.shape[0] * mask.shape[1])
         if area_ratio < min_area:
             return None
-        true_indices = np.argwhere(mask)
-        mask_array = np.zeros_like(mask, dtype=bool)
-        for idx in true_indices:
-            padded_slice = tuple(
-                slice(max(0, i - padding), i + padding + 1) for i in idx
-            )
-            mask_array[padded_slice] = True
+        mask_array = dilate_square(mask, padding)
         visual_mask = (mask_array * 255).astype(np.uint8)
         image_mask = Image.fromarray(visual_mask)
         return image_mask.resize(original_image.size)
 
 
 class ImageEditing(BaseToolSet):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing ImageEditing to %s" % device)
         self.device = device
-        self.mask_former = MaskFormer(device=self.device)
+        self.models = models or ModelRegistry(device)
+        self.mask_former = MaskFormer(device=self.device, models=self.models)
         self.revision = "fp16" if "cuda" in device else None
         self.torch_dtype = torch.float16 if "cuda" in device else torch.float32
-        self.inpaint = StableDiffusionInpaintPipeline.from_pretrained(
+        self.models.register("ImageEditing", self.load)
+
+    def load(self):
+        return StableDiffusionInpaintPipeline.from_pretrained(
             "runwayml/stable-diffusion-inpainting",
             revision=self.revision,
             torch_dtype=self.torch_dtype,
-        ).to(device)
+        )
 
     @tool(
         name="Remove Something From The Photo",
@@ -92,19 +99,20 @@ class ImageEditing(BaseToolSet):
     )
     def inference_replace(self, inputs):
         image_path, to_be_replaced_txt, replace_with_txt = inputs.split(",")
-        original_image = Image.open(image_path)
+        original_image = Image.open(resolve(image_path))
         original_size = original_image.size
         mask_image = self.mask_former.inference(image_path, to_be_replaced_txt)
-        updated_image = self.inpaint(
-            prompt=replace_with_txt,
-            image=original_image.resize((512, 512)),
-            mask_image=mask_image.resize((512, 512)),
-        ).images[0]
+        with self.models.use("ImageEditing") as inpaint:
+            updated_image = inpaint(
+                prompt=replace_with_txt,
+                image=original_image.resize((512, 512)),
+                mask_image=mask_image.resize((512, 512)),
+            ).images[0]
         updated_image_path = get_new_image_name(
             image_path, func_name="replace-something"
         )
         updated_image = updated_image.resize(original_size)
-        updated_image.save(updated_image_path)
+        updated_image.save(resolve(updated_image_path))
 
         logger.debug(
             f"\nProcessed ImageEditing, Input Image: {image_path}, Replace {to_be_replaced_txt} to {replace_with_txt}, "
@@ -115,18 +123,23 @@ class ImageEditing(BaseToolSet):
 
 
 class InstructPix2Pix(BaseToolSet):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing InstructPix2Pix to %s" % device)
         self.device = device
         self.torch_dtype = torch.float16 if "cuda" in device else torch.float32
-        self.pipe = StableDiffusionInstructPix2PixPipeline.from_pretrained(
+        self.models = models or ModelRegistry(device)
+        self.models.register("InstructPix2Pix", self.load)
+
+    def load(self):
+        pipe = StableDiffusionInstructPix2PixPipeline.from_pretrained(
             "timbrooks/instruct-pix2pix",
             safety_checker=None,
             torch_dtype=self.torch_dtype,
-        ).to(device)
-        self.pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(
-            self.pipe.scheduler.config
         )
+        pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(
+            pipe.scheduler.config
+        )
+        return pipe
 
     @tool(
         name="Instruct Image Using Text",
@@ -139,12 +152,16 @@ class InstructPix2Pix(BaseToolSet):
         """Change style of image."""
         logger.debug("===> Starting InstructPix2Pix Inference")
         image_path, text = inputs.split(",")[0], ",".join(inputs.split(",")[1:])
-        original_image = Image.open(image_path)
-        image = self.pipe(
-            text, image=original_image, num_inference_steps=40, image_guidance_scale=1.2
-        ).images[0]
+        original_image = Image.open(resolve(image_path))
+        with self.models.use("InstructPix2Pix") as pipe:
+            image = pipe(
+                text,
+                image=original_image,
+                num_inference_steps=40,
+                image_guidance_scale=1.2,
+            ).images[0]
         updated_image_path = get_new_image_name(image_path, func_name="pix2pix")
-        image.save(updated_image_path)
+        image.save(resolve(updated_image_path))
 
         logger.debug(
             f"\nProcessed InstructPix2Pix, Input Image: {image_path}, Instruct Text: {text}, "
@@ -155,20 +172,23 @@ class InstructPix2Pix(BaseToolSet):
 
 
 class Text2Image(BaseToolSet):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing Text2Image to %s" % device)
         self.device = device
         self.torch_dtype = torch.float16 if "cuda" in device else torch.float32
-        self.pipe = StableDiffusionPipeline.from_pretrained(
-            "runwayml/stable-diffusion-v1-5", torch_dtype=self.torch_dtype
-        )
-        self.pipe.to(device)
+        self.models = models or ModelRegistry(device)
+        self.models.register("Text2Image", self.load)
         self.a_prompt = "best quality, extremely detailed"
         self.n_prompt = (
             "longbody, lowres, bad anatomy, bad hands, missing fingers, extra digit, "
             "fewer digits, cropped, worst quality, low quality"
         )
 
+    def load(self):
+        return StableDiffusionPipeline.from_pretrained(
+            "runwayml/stable-diffusion-v1-5", torch_dtype=self.torch_dtype
+        )
+
     @tool(
         name="Generate Image From User Input Text",
         description="useful when you want to generate an image from a user input text and save it to a file. "
@@ -178,8 +198,11 @@ class Text2Image(BaseToolSet):
     def inference(self, text):
         image_filename = os.path.join("image", str(uuid.uuid4())[0:8] + ".png")
         prompt = text + ", " + self.a_prompt
-        image = self.pipe(prompt, negative_prompt=self.n_prompt).images[0]
-        image.save(image_filename)
+        with self.models.use("Text2Image") as pipe:
+            image = pipe(prompt, negative_prompt=self.n_prompt).images[0]
+        # in the sandbox of the session, where the agent looks for it
+        resolve(image_filename).parent.mkdir(parents=True, exist_ok=True)
+        image.save(resolve(image_filename))
 
         logger.debug(
             f"\nProcessed Text2Image, Input Text: {text}, Output Image: {image_filename}"
@@ -189,14 +212,19 @@ class Text2Image(BaseToolSet):
 
 
 class VisualQuestionAnswering(BaseToolSet):
-    def __init__(self, device):
+    def __init__(self, device, models: Optional[ModelRegistry] = None):
         print("Initializing VisualQuestionAnswering to %s" % device)
         self.torch_dtype = torch.float16 if "cuda" in device else torch.float32
         self.device = device
-        self.processor = BlipProcessor.from_pretrained("Salesforce/blip-vqa-base")
-        self.model = BlipForQuestionAnswering.from_pretrained(
+        self.models = models or ModelRegistry(device)
+        self.models.register("VisualQuestionAnswering", self.load)
+
+    def load(self):
+        processor = BlipProcessor.from_pretrained("Salesforce/blip-vqa-base")
+        model = BlipForQuestionAnswering.from_pretrained(
             "Salesforce/blip-vqa-base", torch_dtype=self.torch_dtype
-        ).to(self.device)
+        )
+        return processor, model
 
     @tool(
         name="Answer Question About The Image",
@@ -206,12 +234,13 @@ class VisualQuestionAnswering(BaseToolSet):
     )
     def inference(self, inputs):
         image_path, question = inputs.split(",")
-        raw_image = Image.open(image_path).convert("RGB")
-        inputs = self.processor(raw_image, question, return_tensors="pt").to(
-            self.device, self.torch_dtype
-        )
-        out = self.model.generate(**inputs)
-        answer = self.processor.decode(out[0], skip_special_tokens=True)
+        raw_image = Image.open(resolve(image_path)).convert("RGB")
+        with self.models.use("VisualQuestionAnswering") as (processor, model):
+            inputs = processor(raw_image, question, return_tensors="pt").to(
+                self.device, self.torch_dtype
+            )
+            out = model.generate(**inputs)
+            answer = processor.decode(out[0], skip_special_tokens=True)
 
         logger.debug(
             f"\nProcessed VisualQuestionAnswering, Input Image: {image_path}, Input Question: {question}, "
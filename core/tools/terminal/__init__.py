@@ -1,20 +1,33 @@
+import functools
 import os
+import re
 import subprocess
 import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Optional
 
 from ansi import ANSI, Color, Style
+from core.sandbox import get_env, get_root
 from core.tools.base import BaseToolSet, SessionGetter, ToolScope, tool
+from core.tools.terminal.jobs import JobManager
+from core.tools.terminal.limits import FairScheduler, ResourceLimits, format_usage
+from core.tools.terminal.output import OutputBuffer
+from core.tools.terminal.shell import ShellPool
 from core.tools.terminal.stdout import StdoutTracer
-from core.tools.terminal.syscall import SyscallTracer
 from env import settings
 from logger import logger
 
 
 class Terminal(BaseToolSet):
     def __init__(self):
-        self.sessions: Dict[str, List[SyscallTracer]] = {}
+        self.limits: ResourceLimits = ResourceLimits.from_settings(settings)
+        self.scheduler: FairScheduler = FairScheduler(
+            settings["TERMINAL_MAX_CONCURRENT"]
+        )
+        self.shells: Optional[ShellPool] = None
+        if settings["TERMINAL_PERSISTENT_SHELL"]:
+            self.shells = ShellPool.from_settings(settings, limits=self.limits)
+        self.jobs: JobManager = JobManager.from_settings(settings)
 
     @tool(
         name="Terminal",
@@ -26,33 +39,173 @@ class Terminal(BaseToolSet):
     )
     def execute(self, commands: str, get_session: SessionGetter) -> str:
         session, _ = get_session()
+        # in the root of the session, so that CodeEditor.READ can page through it
+        spill_path = (
+            get_root()
+            / ".terminal"
+            / "{}-{}.log".format(
+                re.sub(r"[^\w-]", "_", session) or "output", time.time_ns()
+            )
+        )
+
+        on_output = lambda p, o: logger.info(
+            ANSI(p).to(Style.dim()) + " " + o.strip("\n")
+        )
 
+        self.scheduler.acquire(session)
         try:
-            process = subprocess.Popen(
-                commands,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
             logger.info(ANSI("Realtime Terminal Output").to(Color.magenta()) + ": ")
+            output = OutputBuffer.from_settings(settings, spill_path=spill_path)
+            if self.shells:
+                shell = self.shells.acquire(session)
+                try:
+                    exitcode, output = shell.run(
+                        commands,
+                        on_output=on_output,
+                        output=output,
+                        input_wait=settings["TERMINAL_INPUT_WAIT"],
+                        wall_timeout=self.limits.wall_seconds,
+                    )
+                finally:
+                    self.shells.release(session, shell)
+                usage = shell.usage
+                usage["max_rss_bytes"] = self.limits.get_peak_memory(session)
+            else:
+                process = self.limits.spawn(
+                    session,
+                    ["/bin/sh", "-c", commands],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd=get_root(),
+                    env={**os.environ, **get_env()},
+                )
+                tracer = StdoutTracer(
+                    process,
+                    on_output=on_output,
+                    output=output,
+                    wall_timeout=self.limits.wall_seconds,
+                )
+                exitcode, output = tracer.wait_until_stop_or_exit()
+                usage = tracer.usage
+            if usage:
+                report = format_usage(exitcode, usage)
+                logger.info(ANSI("Resource Usage").to(Color.magenta()) + ": " + report)
+                output += "\n" + report
+        except Exception as e:
+            output = str(e)
+        finally:
+            self.scheduler.release()
+
+        logger.debug(
+            f"\nProcessed Terminal, Input Commands: {commands} "
+            f"Output Answer: {output}"
+        )
+        return output
 
-            output = ""
-            tracer = StdoutTracer(
-                process,
-                on_output=lambda p, o: logger.info(
-                    ANSI(p).to(Style.dim()) + " " + o.strip("\n")
-                ),
+    @tool(
+        name="Terminal.START",
+        description="Starts a long running command in the background, "
+        "such as a server, a training or an installation, and returns right away. "
+        "Input must be one valid command. "
+        "Output will be the id of the job, to check on it with Terminal.STATUS "
+        "and Terminal.TAIL, or stop it with Terminal.KILL.",
+        scope=ToolScope.SESSION,
+    )
+    def start(self, commands: str, get_session: SessionGetter) -> str:
+        session, _ = get_session()
+        try:
+            cwd = self.shells.get_cwd(session) if self.shells else None
+            job = self.jobs.start(
+                session,
+                commands,
+                cwd=cwd,
+                spawn=functools.partial(self.limits.spawn, session),
+                env=get_env(),
             )
-            exitcode, output = tracer.wait_until_stop_or_exit()
+            output = f"started job {job.id}, its output is in {job.spool_path}"
         except Exception as e:
             output = str(e)
 
         logger.debug(
-            f"\nProcessed Terminal, Input Commands: {commands} "
+            f"\nProcessed Terminal.START, Input Commands: {commands} "
             f"Output Answer: {output}"
         )
         return output
 
+    @tool(
+        name="Terminal.STATUS",
+        description="Tells whether a background job is still running. "
+        "Input should be the job id. ex. 1a2b3c4d "
+        "Output will be its state, exit code and size of output.",
+        scope=ToolScope.SESSION,
+    )
+    def status(self, job_id: str, get_session: SessionGetter) -> str:
+        session, _ = get_session()
+        try:
+            output = self.jobs.get(session, job_id).get_status()
+        except Exception as e:
+            output = str(e)
+
+        logger.debug(
+            f"\nProcessed Terminal.STATUS, Input: {job_id} Output Answer: {output}"
+        )
+        return output
+
+    @tool(
+        name="Terminal.TAIL",
+        description="Reads the output of a background job. "
+        "Input should be the job id and the offset to read from, "
+        "which is 0 at first and then the offset given by the previous output. "
+        "ex. 1a2b3c4d|0 "
+        "Output will be the new output and the offset to continue from. "
+        "Once the output of a finished job has been read to the end, the job is gone.",
+        scope=ToolScope.SESSION,
+    )
+    def tail(self, inputs: str, get_session: SessionGetter) -> str:
+        session, _ = get_session()
+        try:
+            job_id, _, offset = inputs.partition("|")
+            job = self.jobs.get(session, job_id)
+            running = job.is_running()
+            budget = OutputBuffer.from_settings(settings, spill_path=None).max_bytes
+            text, offset = job.tail(int(offset.strip() or 0), budget)
+            state = "running" if running else f"exited with {job.process.returncode}"
+            output = f"{text}\n[job {job.id} {state} | next offset {offset}]"
+        except Exception as e:
+            output = str(e)
+
+        logger.debug(
+            f"\nProcessed Terminal.TAIL, Input: {inputs} Output Answer: {output}"
+        )
+        return output
+
+    @tool(
+        name="Terminal.KILL",
+        description="Stops a background job and whatever it started. "
+        "Input should be the job id. ex. 1a2b3c4d "
+        "Output will be its final status.",
+        scope=ToolScope.SESSION,
+    )
+    def kill(self, job_id: str, get_session: SessionGetter) -> str:
+        session, _ = get_session()
+        try:
+            job = self.jobs.get(session, job_id)
+            job.kill()
+            output = job.get_status()
+        except Exception as e:
+            output = str(e)
+
+        logger.debug(
+            f"\nProcessed Terminal.KILL, Input: {job_id} Output Answer: {output}"
+        )
+        return output
+
+    def end_session(self, session: str) -> None:
+        if self.shells:
+            self.shells.close_session(session)
+        self.jobs.kill_all(session)
+        self.limits.remove(session)
+
 
 if __name__ == "__main__":
     import time
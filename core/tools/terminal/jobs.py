@@ -0,0 +1,179 @@
+import codecs
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.sandbox import get_root
+from env import DotEnv
+
+
+class JobNotFoundException(Exception):
+    def __init__(self, job_id: str, *args) -> None:
+        super().__init__(f"there is no job {job_id} in this session", *args)
+
+
+class TooManyJobsException(Exception):
+    def __init__(self, max_jobs: int, *args) -> None:
+        super().__init__(
+            f"this session already runs {max_jobs} jobs, "
+            "wait for one of them or kill it first",
+            *args,
+        )
+
+
+class Job:
+    def __init__(
+        self,
+        session: str,
+        commands: str,
+        spool_path: Path,
+        cwd: Optional[str] = None,
+        spawn: Callable[..., subprocess.Popen] = subprocess.Popen,
+        env: Dict[str, str] = {},
+    ):
+        self.id: str = uuid.uuid4().hex[:8]
+        self.session: str = session
+        self.commands: str = commands
+        self.spool_path: Path = spool_path / f"{self.id}.log"
+        self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spool_path, "wb") as spool:
+            self.process: subprocess.Popen = spawn(
+                ["/bin/sh", "-c", commands],
+                stdin=subprocess.DEVNULL,
+                stdout=spool,
+                stderr=subprocess.STDOUT,
+                cwd=cwd,
+                env={**os.environ, **env},
+                start_new_session=True,
+            )
+        self.started: float = time.monotonic()
+        self.finished: Optional[float] = None
+        self.collected: bool = False  # its output was read to the end
+
+    def is_running(self) -> bool:
+        if self.process.poll() is None:
+            return True
+        if self.finished is None:
+            self.finished = time.monotonic()
+        return False
+
+    def get_status(self) -> str:
+        running = self.is_running()
+        elapsed = (self.finished or time.monotonic()) - self.started
+        size = self.spool_path.stat().st_size if self.spool_path.exists() else 0
+        state = "running" if running else f"exited with {self.process.returncode}"
+        return (
+            f"job {self.id} {state} after {elapsed:.1f}s, "
+            f"{size} bytes of output in {self.spool_path}"
+        )
+
+    def tail(self, offset: int, max_bytes: int) -> Tuple[str, int]:
+        """Returns the output from `offset` on, and the offset to go on from."""
+        running = self.is_running()
+        with open(self.spool_path, "rb") as spool:
+            spool.seek(offset)
+            data = spool.read(max_bytes or -1)
+            ended = not running and spool.read(1) == b""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # a character cut at the end comes whole with the next tail, unless
+        # the output is over
+        text = decoder.decode(data, final=ended)
+        self.collected = self.collected or ended
+        held, _ = decoder.getstate()
+        return text, offset + len(data) - len(held)
+
+    def kill(self, grace: float = 1) -> None:
+        if not self.is_running():
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        except ProcessLookupError:
+            pass
+        self.is_running()
+
+
+class JobManager:
+    """Commands running in the background, with their output spooled to a
+    file so that it can be read whenever, in pieces.
+
+    Finished jobs are forgotten once their output has been read to the end,
+    or `finished_ttl` seconds after they finished otherwise.
+    """
+
+    def __init__(self, spool_path: Path, max_jobs: int = 4, finished_ttl: float = 600):
+        self.spool_path: Path = spool_path
+        self.max_jobs: int = max_jobs
+        self.finished_ttl: float = finished_ttl
+        self.jobs: Dict[str, Job] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "JobManager":
+        return JobManager(
+            spool_path=Path(".terminal") / "jobs",
+            max_jobs=settings["TERMINAL_MAX_JOBS"],
+        )
+
+    def prune(self) -> None:
+        now = time.monotonic()
+        for job in list(self.jobs.values()):
+            if not job.is_running() and (
+                job.collected or now - job.finished > self.finished_ttl
+            ):
+                del self.jobs[job.id]
+
+    def get_running(self, session: str) -> List[Job]:
+        return [
+            job
+            for job in self.jobs.values()
+            if job.session == session and job.is_running()
+        ]
+
+    def start(
+        self,
+        session: str,
+        commands: str,
+        cwd: Optional[str] = None,
+        spawn: Callable[..., subprocess.Popen] = subprocess.Popen,
+        env: Dict[str, str] = {},
+    ) -> Job:
+        with self.lock:
+            self.prune()
+            if len(self.get_running(session)) >= self.max_jobs:
+                raise TooManyJobsException(self.max_jobs)
+            job = Job(
+                session,
+                commands,
+                get_root() / self.spool_path,
+                cwd=cwd or get_root(),
+                spawn=spawn,
+                env=env,
+            )
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, session: str, job_id: str) -> Job:
+        with self.lock:
+            self.prune()
+            job = self.jobs.get(job_id.strip())
+        if job is None or job.session != session:
+            raise JobNotFoundException(job_id.strip())
+        return job
+
+    def kill_all(self, session: str) -> None:
+        """Kills the jobs of the session and forgets them, once it has ended."""
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if job.session == session]
+            for job in jobs:
+                del self.jobs[job.id]
+        for job in jobs:
+            job.kill()
@@ -0,0 +1,206 @@
+import os
+import re
+import resource
+import signal
+import subprocess
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, TypedDict
+
+from env import DotEnv
+from logger import logger
+
+
+class ResourceUsage(TypedDict):
+    cpu_seconds: float
+    max_rss_bytes: Optional[int]  # None where it can't be measured
+    wall_seconds: float
+
+
+def format_usage(exitcode: Optional[int], usage: ResourceUsage) -> str:
+    parts = [
+        f"exit code {exitcode}" if exitcode is not None else "stopped",
+        f"cpu {usage['cpu_seconds']:.2f}s",
+    ]
+    if usage["max_rss_bytes"] is not None:
+        parts.append(f"max rss {usage['max_rss_bytes'] / 2**20:.1f}MB")
+    parts.append(f"wall {usage['wall_seconds']:.2f}s")
+    return "[" + " | ".join(parts) + "]"
+
+
+class ResourceLimits:
+    """Limits on the commands of a session. 0 means no limit.
+
+    They are enforced by a cgroup v2 per session where the cgroup hierarchy
+    is writable, and by prlimit on every process otherwise. Process counts
+    can only be limited with cgroups, as RLIMIT_NPROC counts every process of
+    the user. The cgroup of a session is removed when the session ends.
+    """
+
+    def __init__(
+        self,
+        cpu_seconds: int = 0,
+        memory_bytes: int = 0,
+        max_processes: int = 0,
+        wall_seconds: int = 0,
+        cgroup_root: Optional[Path] = None,
+    ):
+        self.cpu_seconds: int = cpu_seconds
+        self.memory_bytes: int = memory_bytes
+        self.max_processes: int = max_processes
+        self.wall_seconds: int = wall_seconds
+        self.cgroup_root: Optional[Path] = cgroup_root
+        self.cgroups: Dict[str, Path] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+        if cgroup_root and not self.setup_cgroup_root():
+            self.cgroup_root = None
+
+    @staticmethod
+    def from_settings(settings: DotEnv) -> "ResourceLimits":
+        return ResourceLimits(
+            cpu_seconds=settings["TERMINAL_CPU_LIMIT"],
+            memory_bytes=settings["TERMINAL_MEMORY_LIMIT_MB"] * 2**20,
+            max_processes=settings["TERMINAL_MAX_PROCESSES"],
+            wall_seconds=settings["TERMINAL_WALL_LIMIT"],
+            cgroup_root=Path(settings["TERMINAL_CGROUP_ROOT"]),
+        )
+
+    def setup_cgroup_root(self) -> bool:
+        try:
+            if not (self.cgroup_root.parent / "cgroup.controllers").exists():
+                return False
+            self.cgroup_root.mkdir(exist_ok=True)
+            (self.cgroup_root / "cgroup.subtree_control").write_text("+memory +pids")
+            return True
+        except OSError as e:
+            logger.info(f"cgroups unavailable, limiting with setrlimit: {e}")
+            return False
+
+    def get_cgroup(self, session: str) -> Optional[Path]:
+        if self.cgroup_root is None:
+            return None
+        with self.lock:
+            if session in self.cgroups:
+                return self.cgroups[session]
+            cgroup = self.cgroup_root / (re.sub(r"[^\w-]", "_", session) or "_")
+            try:
+                cgroup.mkdir(exist_ok=True)
+                if self.memory_bytes:
+                    (cgroup / "memory.max").write_text(str(self.memory_bytes))
+                if self.max_processes:
+                    (cgroup / "pids.max").write_text(str(self.max_processes))
+            except OSError as e:
+                logger.info(f"failed to create cgroup for {session}: {e}")
+                cgroup = None
+            self.cgroups[session] = cgroup
+            return cgroup
+
+    def apply(self, cgroup: Optional[Path], pid: int) -> None:
+        if self.cpu_seconds:
+            limit = (self.cpu_seconds, self.cpu_seconds)
+            resource.prlimit(pid, resource.RLIMIT_CPU, limit)
+        if cgroup:
+            (cgroup / "cgroup.procs").write_text(str(pid))
+        elif self.memory_bytes:
+            limit = (self.memory_bytes, self.memory_bytes)
+            resource.prlimit(pid, resource.RLIMIT_DATA, limit)
+
+    def spawn(self, session: str, args: List[str], **kwargs) -> subprocess.Popen:
+        """Starts a process within the limits of the session.
+
+        The limits are set from here once it is started, as running Python
+        between fork and exec can deadlock a threaded server. Until then it
+        waits stopped in a shell that then execs `args`, so that nothing it
+        starts escapes them.
+        """
+        cgroup = self.get_cgroup(session)
+        if not (cgroup or self.cpu_seconds or self.memory_bytes):
+            return subprocess.Popen(args, **kwargs)
+        process = subprocess.Popen(
+            ["/bin/sh", "-c", 'kill -STOP $$; exec "$@"', "sh", *args], **kwargs
+        )
+        try:
+            # leaves the exit, if it comes first, to be reaped by Popen
+            os.waitid(os.P_PID, process.pid, os.WSTOPPED | os.WEXITED | os.WNOWAIT)
+            self.apply(cgroup, process.pid)
+        except OSError as e:
+            logger.info(f"failed to limit the commands of {session}: {e}")
+        finally:
+            os.kill(process.pid, signal.SIGCONT)
+        return process
+
+    def remove(self, session: str) -> None:
+        """Removes the cgroup of the session, with whatever still runs in it."""
+        with self.lock:
+            cgroup = self.cgroups.pop(session, None)
+        if cgroup is None:
+            return
+        try:
+            if (cgroup / "cgroup.kill").exists():  # since linux 5.14
+                (cgroup / "cgroup.kill").write_text("1")
+            else:
+                for pid in (cgroup / "cgroup.procs").read_text().split():
+                    os.kill(int(pid), signal.SIGKILL)
+        except OSError:
+            pass
+        for _ in range(100):
+            try:
+                cgroup.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError:  # busy until the killed processes are gone
+                time.sleep(0.01)
+        logger.info(f"failed to remove the cgroup of {session}")
+
+    def get_peak_memory(self, session: str) -> Optional[int]:
+        """Peak memory of the cgroup of the session, if it has one."""
+        cgroup = self.cgroups.get(session)
+        try:
+            return int((cgroup / "memory.peak").read_text())
+        except (OSError, TypeError, ValueError):
+            return None
+
+
+class FairScheduler:
+    """Lets at most `max_concurrent` commands run at once.
+
+    Waiting commands are admitted one session at a time in turn, so that a
+    session queueing many commands can't hold off the others.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent: int = max_concurrent
+        self.running: int = 0
+        self.condition: threading.Condition = threading.Condition()
+        # sessions in the order they get a turn, with their waiting commands
+        self.waiting: OrderedDict[str, Deque[object]] = OrderedDict()
+        self.admitted: set = set()
+
+    def admit_next(self) -> None:
+        while self.waiting and self.running < self.max_concurrent:
+            session, tickets = next(iter(self.waiting.items()))
+            self.admitted.add(tickets.popleft())
+            self.running += 1
+            if tickets:
+                self.waiting.move_to_end(session)
+            else:
+                del self.waiting[session]
+        self.condition.notify_all()
+
+    def acquire(self, session: str) -> None:
+        ticket = object()
+        with self.condition:
+            self.waiting.setdefault(session, deque()).append(ticket)
+            self.admit_next()
+            while ticket not in self.admitted:
+                self.condition.wait()
+            self.admitted.remove(ticket)
+
+    def release(self) -> None:
+        with self.condition:
+            self.running -= 1
+            self.admit_next()
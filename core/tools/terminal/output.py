@@ -0,0 +1,85 @@
+from collections import deque
+from pathlib import Path
+from typing import Deque, List, Optional, TextIO
+
+from env import DotEnv
+
+# rough size of a token in the output of commands, to turn a token budget into
+# a byte budget without a tokenizer.
+BYTES_PER_TOKEN = 4
+
+
+class OutputBuffer:
+    """Output of a command, with at most `max_bytes` of it kept in memory.
+
+    Once the output is larger than that, only its first and last halves are
+    kept, and all of it is written to `spill_path` if there is one. 0 keeps
+    everything.
+    """
+
+    def __init__(self, max_bytes: int = 0, spill_path: Optional[Path] = None):
+        self.max_bytes: int = max_bytes
+        self.spill_path: Optional[Path] = spill_path
+        self.spill: Optional[TextIO] = None
+        self.size: int = 0
+
+        self.head: List[str] = []
+        self.head_size: int = 0
+        self.tail: Deque[str] = deque()
+        self.tail_size: int = 0
+
+    @staticmethod
+    def from_settings(settings: DotEnv, spill_path: Path) -> "OutputBuffer":
+        budgets = [
+            settings["TERMINAL_OUTPUT_MAX_BYTES"],
+            settings["TERMINAL_OUTPUT_MAX_TOKENS"] * BYTES_PER_TOKEN,
+        ]
+        return OutputBuffer(
+            max_bytes=min([budget for budget in budgets if budget > 0], default=0),
+            spill_path=spill_path,
+        )
+
+    @property
+    def truncated(self) -> bool:
+        return self.max_bytes > 0 and self.size > self.max_bytes
+
+    def write(self, text: str) -> None:
+        size = len(text.encode())
+        self.size += size
+        if self.spill:
+            self.spill.write(text)
+        elif self.max_bytes and self.size > self.max_bytes and self.spill_path:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self.spill = open(self.spill_path, "w")
+            self.spill.writelines([*self.head, *self.tail, text])
+
+        if self.head_size < self.max_bytes // 2 or not self.max_bytes:
+            self.head.append(text)
+            self.head_size += size
+            return
+
+        self.tail.append(text)
+        self.tail_size += size
+        while self.tail and self.tail_size - len(self.tail[0].encode()) >= (
+            self.max_bytes - self.max_bytes // 2
+        ):
+            self.tail_size -= len(self.tail.popleft().encode())
+
+    def close(self) -> None:
+        if self.spill:
+            self.spill.close()
+
+    def getvalue(self) -> str:
+        if not self.truncated:
+            return "".join([*self.head, *self.tail])
+
+        half = self.max_bytes // 2
+        head = "".join(self.head).encode()[:half].decode(errors="ignore")
+        tail = "".join(self.tail).encode()
+        tail = tail[max(0, len(tail) - (self.max_bytes - half)) :]
+        tail = tail.decode(errors="ignore")
+        skipped = self.size - len(head.encode()) - len(tail.encode())
+        marker = f"... {skipped} bytes truncated"
+        if self.spill:
+            marker += f", the whole output is in {self.spill_path}"
+        return f"{head}\n\n{marker} ...\n\n{tail}"
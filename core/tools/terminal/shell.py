@@ -0,0 +1,344 @@
+import codecs
+import functools
+import os
+import pty
+import re
+import selectors
+import shutil
+import signal
+import subprocess
+import termios
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from core.sandbox import get_env, get_root
+from env import DotEnv
+
+from .limits import ResourceLimits, ResourceUsage
+from .output import OutputBuffer
+from .stdout import PipeType
+from .syscall import get_descendants, is_any_blocked_on_input
+
+
+class ShellPoolFullException(Exception):
+    def __init__(self, capacity: int, *args) -> None:
+        super().__init__(f"all {capacity} shells are busy", *args)
+
+
+class ShellClosedException(Exception):
+    def __init__(self, *args) -> None:
+        super().__init__("the shell was closed, run the commands again", *args)
+
+
+class PersistentShell:
+    """A shell that outlives the commands run in it, so that the working
+    directory, variables and activated environments carry over.
+
+    The shell runs on a pty with echo off. After every command it prints a
+    sentinel line with the exit code, which marks where the output ends. The
+    commands are sent in a quoted heredoc run with eval, so the shell reads
+    them and the sentinel whole before running anything: commands reading
+    from the terminal don't get the sentinel as input, and a syntax error in
+    them doesn't keep it from being printed.
+    """
+
+    def __init__(
+        self,
+        cwd: Optional[str] = None,
+        spawn: Callable[..., subprocess.Popen] = subprocess.Popen,
+        env: Dict[str, str] = {},
+    ):
+        master, slave = pty.openpty()
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.ONLCR  # keep \n as is
+        # no echo, and no line length limit on the commands
+        attrs[3] &= ~(termios.ECHO | termios.ICANON)
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        shell = shutil.which("bash")
+        args = ["/bin/sh"]
+        if shell:
+            # interactive since it is on a tty, without history expansion or
+            # job control notices
+            args = [shell, "--noprofile", "--norc", "--noediting", "+H", "+m"]
+        self.process: subprocess.Popen = spawn(
+            args,
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            cwd=cwd,
+            env={
+                **os.environ,
+                "PS1": "",
+                "PS2": "",
+                "TERM": "dumb",
+                "PAGER": "cat",
+                "GIT_PAGER": "cat",
+                **env,
+            },
+            start_new_session=True,
+        )
+        # what the commands read their input from, unless redirected
+        self.tty: str = os.ttyname(slave)
+        os.close(slave)
+        self.fd: int = master
+        self.lock: threading.Lock = threading.Lock()
+        self.last_used: float = time.monotonic()
+        self.closed: bool = False
+        self.users: int = 0  # callers holding or waiting for the shell
+        self.usage: Optional[ResourceUsage] = None
+
+    def is_alive(self) -> bool:
+        return not self.closed and self.process.poll() is None
+
+    def kill(self) -> None:
+        """Kills the shell, along with whatever the commands left running. A
+        run in progress sees it exit, and closes it."""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def close(self) -> None:
+        """Kills the shell and closes its terminal. Only for the holder of
+        `lock`, as a run of someone else would go on with the closed fd."""
+        if self.closed:
+            return
+        self.closed = True
+        self.kill()
+        self.process.wait()
+        os.close(self.fd)
+
+    def get_cpu_seconds(self) -> float:
+        """CPU time of the shell and of the commands it waited for."""
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                # utime, stime, cutime and cstime come after the parenthesized name
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return 0
+        return sum(int(tick) for tick in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+
+    def is_blocked_on_input(self) -> bool:
+        # the shell itself counts too, as it reads what follows a `read` or an
+        # unterminated quote from the terminal
+        pids = [self.process.pid, *get_descendants(self.process.pid)]
+        return is_any_blocked_on_input(pids, timeout=0.2, tty=self.tty)
+
+    def run(
+        self,
+        commands: str,
+        timeout: int = 30,
+        on_output: Callable[[PipeType, str], None] = lambda p, o: None,
+        output: Optional[OutputBuffer] = None,
+        input_wait: float = 0,
+        wall_timeout: float = 0,
+    ) -> Tuple[Optional[int], str]:
+        """Runs the commands and returns their exit code and output.
+
+        If there is no output for `timeout` seconds, the shell is killed and
+        the exit code is None, as the commands are likely waiting for input.
+        With `input_wait`, the commands are checked for that after being
+        quiet for as long, so that they can be stopped right away.
+        """
+        if self.closed:  # its fd may be another file by now
+            raise ShellClosedException()
+        output = output or OutputBuffer()
+        sentinel = f"__EVAL_{uuid.uuid4().hex}__"
+        done = re.compile(f"\n{sentinel}(\\d+)\n")
+        os.write(
+            self.fd,
+            f"eval \"$(cat <<'{sentinel}'\n{commands}\n{sentinel}\n)\"; "
+            f"printf '\\n{sentinel}%d\\n' $?\n".encode(),
+        )
+
+        exitcode = None
+        pending = ""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        started = last_output = time.monotonic()
+        cpu_seconds = self.get_cpu_seconds()
+        probed = not input_wait
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.fd, selectors.EVENT_READ)
+            while True:
+                now = time.monotonic()
+                quiet = now - last_output
+                if quiet >= timeout:
+                    self.close()
+                    break
+                if wall_timeout and now - started >= wall_timeout:
+                    pending += f"\n[stopped after {wall_timeout} seconds]\n"
+                    self.close()
+                    break
+                if not probed and quiet >= input_wait:
+                    probed = True
+                    if self.is_blocked_on_input():
+                        pending += "\n[stopped, as it was waiting for input]\n"
+                        self.close()
+                        break
+                wait = timeout - quiet
+                if wall_timeout:
+                    wait = min(wait, wall_timeout - (now - started))
+                if not probed:
+                    wait = min(wait, input_wait - quiet)
+                if not selector.select(wait):
+                    continue
+
+                try:
+                    data = os.read(self.fd, 65536)
+                except OSError:  # the shell exited
+                    data = b""
+                if not data:
+                    pending += decoder.decode(b"", final=True)
+                    self.close()
+                    exitcode = self.process.returncode
+                    break
+
+                last_output = time.monotonic()
+                probed = not input_wait
+                pending += decoder.decode(data)
+                match = done.search(pending)
+                # hold back what could be the start of the sentinel
+                end = (
+                    match.start()
+                    if match
+                    else max(0, len(pending) - len(sentinel) - 16)
+                )
+                if end:
+                    on_output("stdout", pending[:end])
+                    output.write(pending[:end])
+                    pending = pending[end:]
+                if match:
+                    exitcode = int(match.group(1))
+                    pending = ""
+                    break
+
+        if pending:
+            on_output("stdout", pending)
+            output.write(pending)
+        output.close()
+        self.last_used = time.monotonic()
+        self.usage = {
+            "cpu_seconds": max(0, self.get_cpu_seconds() - cpu_seconds),
+            "max_rss_bytes": None,
+            "wall_seconds": self.last_used - started,
+        }
+        return (exitcode, output.getvalue())
+
+
+class ShellPool:
+    """Keeps a shell per session, up to `max_shells` of them.
+
+    Shells idle for longer than `idle_ttl` seconds are closed, and when the
+    pool is full the least recently used idle shell makes room.
+    """
+
+    def __init__(
+        self,
+        max_shells: int = 16,
+        idle_ttl: float = 600,
+        limits: Optional[ResourceLimits] = None,
+    ):
+        self.max_shells: int = max_shells
+        self.idle_ttl: float = idle_ttl
+        self.limits: Optional[ResourceLimits] = limits
+        self.shells: OrderedDict[str, PersistentShell] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def from_settings(
+        settings: DotEnv, limits: Optional[ResourceLimits] = None
+    ) -> "ShellPool":
+        return ShellPool(
+            max_shells=settings["TERMINAL_MAX_SHELLS"],
+            idle_ttl=settings["TERMINAL_SHELL_IDLE_TTL"],
+            limits=limits,
+        )
+
+    def reap(self) -> None:
+        now = time.monotonic()
+        for session, shell in list(self.shells.items()):
+            idle = shell.users == 0
+            # one in use, even dead, is the holder's to close
+            if idle and (not shell.is_alive() or now - shell.last_used > self.idle_ttl):
+                del self.shells[session]
+                shell.close()
+
+    def acquire(self, session: str) -> PersistentShell:
+        """Returns the shell of the session, locked for the caller."""
+        while True:
+            shell = self.reserve(session)
+            shell.lock.acquire()
+            if shell.is_alive():
+                return shell
+            # closed by the run holding it meanwhile, start a new one
+            self.release(session, shell)
+
+    def reserve(self, session: str) -> PersistentShell:
+        with self.lock:
+            self.reap()
+            shell = self.shells.get(session)
+            if shell is None:
+                if len(self.shells) >= self.max_shells:
+                    idle = [s for s, sh in self.shells.items() if sh.users == 0]
+                    if not idle:
+                        raise ShellPoolFullException(self.max_shells)
+                    self.shells.pop(idle[0]).close()
+                spawn = subprocess.Popen
+                if self.limits:
+                    spawn = functools.partial(self.limits.spawn, session)
+                shell = PersistentShell(
+                    cwd=str(get_root().resolve()), spawn=spawn, env=get_env()
+                )
+                self.shells[session] = shell
+            self.shells.move_to_end(session)
+            # keeps it from being reaped or evicted while waiting for its lock
+            shell.users += 1
+            return shell
+
+    def release(self, session: str, shell: PersistentShell) -> None:
+        shell.lock.release()
+        with self.lock:
+            shell.users -= 1
+            shell.last_used = time.monotonic()
+            if not shell.is_alive() and self.shells.get(session) is shell:
+                del self.shells[session]
+
+    def get_cwd(self, session: str) -> Optional[str]:
+        """Working directory of the shell of the session, if it has one."""
+        shell = self.shells.get(session)
+        if shell is None or not shell.is_alive():
+            return None
+        try:
+            return os.readlink(f"/proc/{shell.process.pid}/cwd")
+        except OSError:
+            return None
+
+    def run(self, session: str, commands: str, **kwargs) -> Tuple[Optional[int], str]:
+        shell = self.acquire(session)
+        try:
+            return shell.run(commands, **kwargs)
+        finally:
+            self.release(session, shell)
+
+    def close_shell(self, shell: PersistentShell) -> None:
+        # ends a run in progress, then closes it once that run lets it go
+        shell.kill()
+        with shell.lock:
+            shell.close()
+
+    def close_session(self, session: str) -> None:
+        with self.lock:
+            shell = self.shells.pop(session, None)
+        if shell is not None:
+            self.close_shell(shell)
+
+    def close(self) -> None:
+        with self.lock:
+            shells = list(self.shells.values())
+            self.shells.clear()
+        for shell in shells:
+            self.close_shell(shell)
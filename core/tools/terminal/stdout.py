@@ -1,69 +1,145 @@
+import codecs
 import os
-import time
+import resource
+import selectors
 import subprocess
-from datetime import datetime
-from typing import Callable, Literal, Optional, Union, Tuple
+import time
+from typing import Callable, Dict, Literal, Optional, Union, Tuple
+
+from core.tools.terminal.limits import ResourceUsage
+from core.tools.terminal.output import OutputBuffer
 
 PipeType = Union[Literal["stdout"], Literal["stderr"]]
 
 
 class StdoutTracer:
+    """Collects the output of a process until it exits, or until it has been
+    quiet for `timeout` seconds, in which case it is killed.
+
+    Waits on the pipes and on the process itself, so it wakes up as soon as
+    there is output or the process is gone. Where pidfds are not available,
+    the exit is checked every `interval` seconds instead.
+    """
+
     def __init__(
         self,
         process: subprocess.Popen,
         timeout: int = 30,
-        interval: int = 0.1,
+        interval: float = 0.1,
         on_output: Callable[[PipeType, str], None] = lambda: None,
+        output: Optional[OutputBuffer] = None,
+        wall_timeout: float = 0,
     ):
         self.process: subprocess.Popen = process
         self.timeout: int = timeout
-        self.interval: int = interval
-        self.last_output: datetime = None
+        self.interval: float = interval
+        self.last_output: float = None
         self.on_output: Callable[[PipeType, str], None] = on_output
+        self.decoders: Dict[PipeType, codecs.IncrementalDecoder] = {
+            pipe: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for pipe in ["stdout", "stderr"]
+        }
+        self.output: OutputBuffer = output or OutputBuffer()
+        self.wall_timeout: float = wall_timeout
+        self.started: float = None
+        self.usage: Optional[ResourceUsage] = None
 
     def nonblock(self):
         os.set_blocking(self.process.stdout.fileno(), False)
         os.set_blocking(self.process.stderr.fileno(), False)
 
-    def get_output(self, pipe: PipeType) -> str:
-        output = None
-        if pipe == "stdout":
-            output = self.process.stdout.read()
-        elif pipe == "stderr":
-            output = self.process.stderr.read()
+    def get_output(self, pipe: PipeType) -> Optional[str]:
+        """Reads what is available on the pipe. None once it is closed."""
+        stream = self.process.stdout if pipe == "stdout" else self.process.stderr
+        try:
+            output = os.read(stream.fileno(), 65536)
+        except BlockingIOError:
+            return ""
 
-        if output:
-            decoded = output.decode()
+        decoded = self.decoders[pipe].decode(output, final=not output)
+        if decoded:
             self.on_output(pipe, decoded)
-            self.last_output = datetime.now()
-            return decoded
-        return ""
+            self.last_output = time.monotonic()
+            self.output.write(decoded)
+        return decoded if output else None
 
-    def last_output_passed(self, seconds: int) -> bool:
-        return (datetime.now() - self.last_output).seconds > seconds
+    def open_pidfd(self) -> Optional[int]:
+        try:
+            return os.pidfd_open(self.process.pid)
+        except (AttributeError, OSError):
+            return None
+
+    def reap(self, blocking: bool = False) -> bool:
+        """Collects the exit status and resource usage if the process exited."""
+        try:
+            pid, status, rusage = os.wait4(
+                self.process.pid, 0 if blocking else os.WNOHANG
+            )
+        except ChildProcessError:  # reaped elsewhere, no usage then
+            return self.process.poll() is not None
+        if pid == 0:
+            return False
+
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        # a forked child starts with the peak rss of this process, so only a
+        # higher one tells something about the command
+        max_rss = rusage.ru_maxrss
+        if max_rss <= resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+            max_rss = None
+        self.usage = {
+            "cpu_seconds": rusage.ru_utime + rusage.ru_stime,
+            "max_rss_bytes": max_rss and max_rss * 1024,
+            "wall_seconds": time.monotonic() - self.started,
+        }
+        return True
+
+    def drain(self, selector: selectors.BaseSelector) -> None:
+        # the process is gone, but children may still hold the pipes open.
+        # take what is already there instead of waiting for them.
+        while True:
+            events = [key for key, _ in selector.select(0) if key.data in self.decoders]
+            if not events:
+                return
+            for key in events:
+                if self.get_output(key.data) is None:
+                    selector.unregister(key.fileobj)
 
     def wait_until_stop_or_exit(self) -> Tuple[Optional[int], str]:
         self.nonblock()
-        self.last_output = datetime.now()
-        output = ""
+        self.started = self.last_output = time.monotonic()
         exitcode = None
-        while True:
-            new_stdout = self.get_output("stdout")
-            if new_stdout:
-                output += new_stdout
+        pidfd = self.open_pidfd()
 
-            new_stderr = self.get_output("stderr")
-            if new_stderr:
-                output += new_stderr
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.process.stdout, selectors.EVENT_READ, "stdout")
+            selector.register(self.process.stderr, selectors.EVENT_READ, "stderr")
+            if pidfd is not None:
+                selector.register(pidfd, selectors.EVENT_READ, "exit")
 
-            if self.process.poll() is not None:
-                exitcode = self.process.poll()
-                break
+            while True:
+                now = time.monotonic()
+                remaining = self.timeout - (now - self.last_output)
+                if self.wall_timeout:
+                    remaining = min(remaining, self.wall_timeout - (now - self.started))
+                if remaining <= 0:
+                    self.process.kill()
+                    self.reap(blocking=True)
+                    break
 
-            if self.last_output_passed(self.timeout):
-                self.process.kill()
-                break
+                if pidfd is None:
+                    remaining = min(remaining, self.interval)
+                for key, _ in selector.select(remaining):
+                    if key.data == "exit":
+                        selector.unregister(key.fileobj)
+                    elif self.get_output(key.data) is None:
+                        selector.unregister(key.fileobj)
 
-            time.sleep(self.interval)
+                if self.reap():
+                    exitcode = self.process.returncode
+                    self.drain(selector)
+                    break
 
-        return (exitcode, output)
+        if pidfd is not None:
+            os.close(pidfd)
+        self.output.close()
+        return (exitcode, self.output.getvalue())
@@ -1,6 +1,12 @@
+import logging
+import os
 import signal
-from typing import Optional, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
 
+import ptrace
 from ptrace.debugger import (
     NewProcessEvent,
     ProcessExecution,
@@ -11,7 +17,43 @@ from ptrace.debugger import (
 )
 from ptrace.func_call import FunctionCallOptions
 from ptrace.syscall import PtraceSyscall
-from ptrace.tools import signal_to_exitcode
+
+RUNNING = "running"
+BLOCKED_ON_INPUT = "blocked waiting for input"
+IDLE_WAIT = "idle wait"
+
+IDLE_SYSCALLS = [
+    "wait4",
+    "waitid",
+    "waitpid",
+    "poll",
+    "ppoll",
+    "select",
+    "pselect6",
+    "epoll_wait",
+    "epoll_pwait",
+    "nanosleep",
+    "clock_nanosleep",
+    # a sleep or wait interrupted by attaching, picking up where it left off
+    "restart_syscall",
+]
+
+
+class PtraceFilter(logging.Filter):
+    """python-ptrace logs every attach and detach to the root logger, which
+    is ours too. Only its errors are kept."""
+
+    def __init__(self):
+        super().__init__()
+        self.path: str = os.path.dirname(ptrace.__file__)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.ERROR or not record.pathname.startswith(
+            self.path
+        )
+
+
+logging.getLogger().addFilter(PtraceFilter())
 
 
 class SyscallTimeoutException(Exception):
@@ -19,17 +61,72 @@ class SyscallTimeoutException(Exception):
         super().__init__(f"deadline exceeded while waiting syscall for {pid}", *args)
 
 
+def get_descendants(pid: int) -> List[int]:
+    descendants = []
+    parents = [pid]
+    while parents:
+        parent = parents.pop()
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except OSError:
+            continue
+        descendants.extend(children)
+        parents.extend(children)
+    return descendants
+
+
 class SyscallTracer:
-    def __init__(self, pid: int):
+    """Follows the syscalls of a process to tell what it is waiting for.
+
+    All the ptrace calls happen on a thread of its own, as ptrace requires, so
+    the tracer can be used from any thread. To stop, that thread is woken up
+    with a SIGSTOP to the process, which is dropped when detaching.
+
+    With `tty`, only reads of that terminal count as waiting for input, not
+    those of a pipe, like the end of a pipeline waiting for the rest of it.
+    """
+
+    def __init__(self, pid: int, tty: Optional[str] = None):
         self.debugger: PtraceDebugger = PtraceDebugger()
         self.pid: int = pid
+        self.tty: Optional[str] = tty
         self.process: PtraceProcess = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping: bool = False
+        self.changed: threading.Condition = threading.Condition()
+        self.state: str = RUNNING
+        self.state_since: float = time.monotonic()
+        self.exitcode: Optional[int] = None
+        self.reason: str = ""
 
     def is_waiting(self, syscall: PtraceSyscall) -> bool:
         if syscall.name.startswith("wait"):
             return True
         return False
 
+    def reads_tty(self) -> bool:
+        if self.tty is None:
+            return True
+        try:
+            return os.readlink(f"/proc/{self.pid}/fd/0") == self.tty
+        except OSError:
+            return False
+
+    def classify(self, syscall: PtraceSyscall) -> str:
+        if syscall.name == "read" and syscall.arguments[0].value == 0:
+            return BLOCKED_ON_INPUT if self.reads_tty() else IDLE_WAIT
+        if self.is_waiting(syscall) or syscall.name in IDLE_SYSCALLS:
+            return IDLE_WAIT
+        return RUNNING
+
+    def set_state(self, state: str) -> None:
+        with self.changed:
+            if state != self.state:
+                self.state = state
+                self.state_since = time.monotonic()
+            self.changed.notify_all()
+
     def attach(self):
         self.process = self.debugger.addProcess(self.pid, False)
 
@@ -37,67 +134,108 @@ class SyscallTracer:
         self.process.detach()
         self.debugger.quit()
 
-    def set_timer(self, timeout: int):
-        def handler(signum, frame):
-            raise SyscallTimeoutException(self.process.pid)
-
-        signal.signal(signal.SIGALRM, handler)
-        signal.alarm(timeout)
-
-    def reset_timer(self):
-        signal.alarm(0)
-
-    def wait_syscall_with_timeout(self, timeout: int):
-        self.set_timer(timeout)
-        self.process.waitSyscall()
-        self.reset_timer()
-
-    def wait_until_stop_or_exit(self) -> Tuple[Optional[int], str]:
-        self.process.syscall()
-        exitcode = None
-        reason = ""
-        while True:
-            if not self.debugger:
-                break
-
-            try:
-                self.wait_syscall_with_timeout(30)
-            except ProcessExit as event:
-                if event.exitcode is not None:
-                    exitcode = event.exitcode
-                continue
-            except ProcessSignal as event:
-                event.process.syscall(event.signum)
-                exitcode = signal_to_exitcode(event.signum)
-                reason = event.reason
-                continue
-            except NewProcessEvent as event:
-                continue
-            except ProcessExecution as event:
-                continue
-            except Exception as e:
-                reason = str(e)
-                break
-
-            syscall = self.process.syscall_state.event(
-                FunctionCallOptions(
-                    write_types=False,
-                    write_argname=False,
-                    string_max_length=300,
-                    replace_socketcall=True,
-                    write_address=False,
-                    max_array_count=20,
-                )
-            )
-
+    def trace(self) -> None:
+        options = FunctionCallOptions(
+            write_types=False,
+            write_argname=False,
+            string_max_length=300,
+            replace_socketcall=True,
+            write_address=False,
+            max_array_count=20,
+        )
+        try:
+            self.attach()
             self.process.syscall()
-
-            if syscall is None:
-                continue
-
-            if syscall.result:
-                continue
-
-        self.reset_timer()
-
-        return exitcode, reason
+            while True:
+                try:
+                    self.process.waitSyscall()
+                except ProcessExit as event:
+                    self.exitcode = event.exitcode
+                    self.process = None
+                    return
+                except ProcessSignal as event:
+                    if self.stopping and event.signum == signal.SIGSTOP:
+                        return  # our own wake-up, dropped by detaching
+                    event.process.syscall(event.signum)
+                    continue
+                except (NewProcessEvent, ProcessExecution):
+                    self.process.syscall()
+                    continue
+
+                syscall = self.process.syscall_state.event(options)
+                if syscall is not None:
+                    entering = syscall.result is None
+                    self.set_state(self.classify(syscall) if entering else RUNNING)
+                self.process.syscall()
+        except Exception as e:
+            self.reason = str(e)
+        finally:
+            if self.process is not None:
+                self.detach()
+            with self.changed:
+                self.changed.notify_all()
+
+    def stop(self) -> None:
+        self.stopping = True
+        try:
+            os.kill(self.pid, signal.SIGSTOP)
+        except ProcessLookupError:
+            pass
+        self.thread.join()
+
+    def wait_until_stop_or_exit(
+        self, timeout: float = 30, grace: Optional[float] = None
+    ) -> Tuple[Optional[int], str]:
+        """Traces the process until it exits, `timeout` seconds pass, or it
+        has been blocked waiting for input for `grace` seconds.
+
+        Returns the exit code, if it exited, and the reason it stopped.
+        """
+        deadline = time.monotonic() + timeout
+        self.thread = threading.Thread(target=self.trace, daemon=True)
+        self.thread.start()
+
+        with self.changed:
+            while self.thread.is_alive():
+                now = time.monotonic()
+                if now >= deadline:
+                    self.reason = str(SyscallTimeoutException(self.pid))
+                    break
+                wake = deadline
+                if grace is not None and self.state == BLOCKED_ON_INPUT:
+                    if now - self.state_since >= grace:
+                        self.reason = BLOCKED_ON_INPUT
+                        break
+                    wake = min(wake, self.state_since + grace)
+                self.changed.wait(wake - now)
+
+        if self.thread.is_alive():
+            self.stop()
+        return self.exitcode, self.reason
+
+    def probe(self, timeout: float = 0.5) -> str:
+        """Returns what the process is doing, as far as can be told within
+        `timeout` seconds."""
+        self.wait_until_stop_or_exit(timeout=timeout, grace=0)
+        if self.reason == BLOCKED_ON_INPUT:
+            return BLOCKED_ON_INPUT
+        return self.state if self.exitcode is None else RUNNING
+
+
+def is_any_blocked_on_input(
+    pids: List[int], timeout: float = 0.5, tty: Optional[str] = None
+) -> bool:
+    """Probes the processes in parallel, so that it takes about `timeout`
+    seconds however many there are, and returns as soon as one of them is
+    found blocked waiting for input, from `tty` if given."""
+    if not pids:
+        return False
+    executor = ThreadPoolExecutor(max_workers=len(pids))
+    try:
+        probes = [
+            executor.submit(SyscallTracer(pid, tty).probe, timeout) for pid in pids
+        ]
+        return any(probe.result() == BLOCKED_ON_INPUT for probe in as_completed(probes))
+    finally:
+        # the other probes end by themselves within the timeout
+        executor.shutdown(wait=False)
@@ -1,5 +1,5 @@
 import os
-from typing import TypedDict
+from typing import List, TypedDict
 
 from dotenv import load_dotenv
 
@@ -26,6 +26,45 @@ class DotEnv(TypedDict):
     BING_SEARCH_URL: str  # optional
     BING_SUBSCRIPTION_KEY: str  # optional
     SERPAPI_API_KEY: str  # optional
+    EXECUTION_POOL_SIZE: int  # optional
+    EXECUTION_QUEUE_SIZE: int  # optional
+    MODEL_ACCESS_CHECK_TTL: int  # optional
+    MODEL_ACCESS_CHECK_NEGATIVE_TTL: int  # optional
+    WARMUP: bool  # optional
+    SESSION_STORE: str  # optional
+    SESSION_STORE_MAX_SIZE: int  # optional
+    SESSION_STORE_MAX_BYTES: int  # optional
+    SESSION_STORE_TTL: int  # optional
+    MEMORY_MAX_TOKENS: int  # optional
+    SESSION_AFFINITY: bool  # optional
+    SESSION_AFFINITY_REFRESH: int  # optional
+    WORKER_QUEUE: str  # optional
+    WORKER_QUEUES: List[str]  # optional
+    TERMINAL_OUTPUT_MAX_BYTES: int  # optional
+    TERMINAL_OUTPUT_MAX_TOKENS: int  # optional
+    TERMINAL_PERSISTENT_SHELL: bool  # optional
+    TERMINAL_MAX_SHELLS: int  # optional
+    TERMINAL_SHELL_IDLE_TTL: int  # optional
+    TERMINAL_INPUT_WAIT: float  # optional
+    TERMINAL_MAX_CONCURRENT: int  # optional
+    TERMINAL_CPU_LIMIT: int  # optional
+    TERMINAL_MEMORY_LIMIT_MB: int  # optional
+    TERMINAL_MAX_PROCESSES: int  # optional
+    TERMINAL_WALL_LIMIT: int  # optional
+    TERMINAL_CGROUP_ROOT: str  # optional
+    TERMINAL_MAX_JOBS: int  # optional
+    SANDBOX_ENABLED: bool  # optional
+    SANDBOX_DIR: str  # optional
+    SANDBOX_TEMPLATE: str  # optional
+    SANDBOX_VENV: bool  # optional
+    SANDBOX_POOL_SIZE: int  # optional
+    SANDBOX_IDLE_TTL: int  # optional
+    SANDBOX_MAX: int  # optional
+    EDITOR_READ_MAX_BYTES: int  # optional
+    EDITOR_READ_MAX_TOKENS: int  # optional
+    EDITOR_LARGE_FILE_MB: int  # optional
+    GPU_MODELS_MAX_MB: int  # optional
+    GPU_MODELS_OFFLOAD_MB: int  # optional
 
 
 EVAL_PORT = int(os.getenv("EVAL_PORT", 8000))
@@ -44,4 +83,47 @@ settings: DotEnv = {
     "BING_SEARCH_URL": os.getenv("BING_SEARCH_URL"),
     "BING_SUBSCRIPTION_KEY": os.getenv("BING_SUBSCRIPTION_KEY"),
     "SERPAPI_API_KEY": os.getenv("SERPAPI_API_KEY"),
+    "EXECUTION_POOL_SIZE": int(os.getenv("EXECUTION_POOL_SIZE", 4)),
+    "EXECUTION_QUEUE_SIZE": int(os.getenv("EXECUTION_QUEUE_SIZE", 16)),
+    "MODEL_ACCESS_CHECK_TTL": int(os.getenv("MODEL_ACCESS_CHECK_TTL", 3600)),
+    "MODEL_ACCESS_CHECK_NEGATIVE_TTL": int(
+        os.getenv("MODEL_ACCESS_CHECK_NEGATIVE_TTL", 60)
+    ),
+    "WARMUP": os.getenv("WARMUP", "False").lower() == "true",
+    "SESSION_STORE": os.getenv("SESSION_STORE", "memory"),
+    "SESSION_STORE_MAX_SIZE": int(os.getenv("SESSION_STORE_MAX_SIZE", 1000)),
+    "SESSION_STORE_MAX_BYTES": int(os.getenv("SESSION_STORE_MAX_BYTES", 0)),
+    "SESSION_STORE_TTL": int(os.getenv("SESSION_STORE_TTL", 60 * 60 * 24)),
+    "MEMORY_MAX_TOKENS": int(os.getenv("MEMORY_MAX_TOKENS", 2000)),
+    "SESSION_AFFINITY": os.getenv("SESSION_AFFINITY", "False").lower() == "true",
+    "SESSION_AFFINITY_REFRESH": int(os.getenv("SESSION_AFFINITY_REFRESH", 30)),
+    "WORKER_QUEUE": os.getenv("WORKER_QUEUE", "eval"),
+    "WORKER_QUEUES": os.getenv("WORKER_QUEUES", "eval").split(","),
+    "TERMINAL_OUTPUT_MAX_BYTES": int(os.getenv("TERMINAL_OUTPUT_MAX_BYTES", 32768)),
+    "TERMINAL_OUTPUT_MAX_TOKENS": int(os.getenv("TERMINAL_OUTPUT_MAX_TOKENS", 4000)),
+    "TERMINAL_PERSISTENT_SHELL": (
+        os.getenv("TERMINAL_PERSISTENT_SHELL", "True").lower() == "true"
+    ),
+    "TERMINAL_MAX_SHELLS": int(os.getenv("TERMINAL_MAX_SHELLS", 16)),
+    "TERMINAL_SHELL_IDLE_TTL": int(os.getenv("TERMINAL_SHELL_IDLE_TTL", 600)),
+    "TERMINAL_INPUT_WAIT": float(os.getenv("TERMINAL_INPUT_WAIT", 2)),
+    "TERMINAL_MAX_CONCURRENT": int(os.getenv("TERMINAL_MAX_CONCURRENT", 8)),
+    "TERMINAL_CPU_LIMIT": int(os.getenv("TERMINAL_CPU_LIMIT", 600)),
+    "TERMINAL_MEMORY_LIMIT_MB": int(os.getenv("TERMINAL_MEMORY_LIMIT_MB", 4096)),
+    "TERMINAL_MAX_PROCESSES": int(os.getenv("TERMINAL_MAX_PROCESSES", 512)),
+    "TERMINAL_WALL_LIMIT": int(os.getenv("TERMINAL_WALL_LIMIT", 1800)),
+    "TERMINAL_CGROUP_ROOT": os.getenv("TERMINAL_CGROUP_ROOT", "/sys/fs/cgroup/eval"),
+    "TERMINAL_MAX_JOBS": int(os.getenv("TERMINAL_MAX_JOBS", 4)),
+    "SANDBOX_ENABLED": os.getenv("SANDBOX_ENABLED", "False").lower() == "true",
+    "SANDBOX_DIR": os.getenv("SANDBOX_DIR", "/tmp/eval-sandbox"),
+    "SANDBOX_TEMPLATE": os.getenv("SANDBOX_TEMPLATE", ""),
+    "SANDBOX_VENV": os.getenv("SANDBOX_VENV", "False").lower() == "true",
+    "SANDBOX_POOL_SIZE": int(os.getenv("SANDBOX_POOL_SIZE", 4)),
+    "SANDBOX_IDLE_TTL": int(os.getenv("SANDBOX_IDLE_TTL", 3600)),
+    "SANDBOX_MAX": int(os.getenv("SANDBOX_MAX", 64)),
+    "EDITOR_READ_MAX_BYTES": int(os.getenv("EDITOR_READ_MAX_BYTES", 32768)),
+    "EDITOR_READ_MAX_TOKENS": int(os.getenv("EDITOR_READ_MAX_TOKENS", 8000)),
+    "EDITOR_LARGE_FILE_MB": int(os.getenv("EDITOR_LARGE_FILE_MB", 64)),
+    "GPU_MODELS_MAX_MB": int(os.getenv("GPU_MODELS_MAX_MB", -1)),
+    "GPU_MODELS_OFFLOAD_MB": int(os.getenv("GPU_MODELS_OFFLOAD_MB", 8192)),
 }
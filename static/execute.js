@@ -43,6 +43,7 @@ class EvalApi {
   constructor({ onComplete, onError, onSettle, onLLMEnd, onToolEnd }) {
     this.executionId = null;
     this.pollInterval = null;
+    this.lastEventIndex = 0;
     this.onComplete = (answer, files, info) => {
       onComplete(answer, files, info);
       onSettle();
@@ -95,37 +96,72 @@ class EvalApi {
       }
       const { id: executionId } = await response.json();
       this.executionId = executionId;
-      this.pollInterval = setInterval(this.poll.bind(this), 1000);
+      if (window.EventSource) {
+        this.stream();
+      } else {
+        this.pollInterval = setInterval(this.poll.bind(this), 1000);
+      }
     } catch (e) {
       clearInterval(this.pollInterval);
       this.onError(e);
     }
   }
 
+  stream() {
+    const source = new EventSource(
+      `/api/execute/async/${this.executionId}/stream`
+    );
+    source.addEventListener("LLM_END", (e) => {
+      this.lastEventIndex = Number(e.lastEventId);
+      this.onLLMEnd(JSON.parse(e.data));
+    });
+    source.addEventListener("TOOL_END", (e) => {
+      this.lastEventIndex = Number(e.lastEventId);
+      this.onToolEnd(JSON.parse(e.data));
+    });
+    source.addEventListener("SUCCESS", (e) => {
+      source.close();
+      const { result, info } = JSON.parse(e.data);
+      this.onComplete(result.answer, result.files, info);
+    });
+    source.addEventListener("FAILURE", () => {
+      source.close();
+      this.onError(new Error("Execution failed"));
+    });
+    source.onerror = () => {
+      // connection dropped before the execution settled, poll from where
+      // the stream left off
+      source.close();
+      this.pollInterval = setInterval(this.poll.bind(this), 1000);
+    };
+  }
+
   async poll() {
     try {
-      const response = await fetch(`/api/execute/async/${this.executionId}`, {
-        method: "GET",
-      });
+      const response = await fetch(
+        `/api/execute/async/${this.executionId}/events?after=${this.lastEventIndex}`,
+        { method: "GET" }
+      );
       if (response.status !== 200) {
         throw new Error(await response.text());
       }
-      const { status, result, info } = await response.json();
-      switch (status) {
-        case "PENDING":
-          break;
-        case "FAILURE":
-          throw new Error("Execution failed");
-        case "LLM_END":
-          this.onLLMEnd(info);
-          break;
-        case "TOOL_END":
-          this.onToolEnd(info);
-          break;
-        case "SUCCESS":
-          clearInterval(this.pollInterval);
-          this.onComplete(result.answer, result.files, info);
-          break;
+      const { events } = await response.json();
+      for (const { index, type, data } of events) {
+        this.lastEventIndex = index;
+        switch (type) {
+          case "FAILURE":
+            throw new Error("Execution failed");
+          case "LLM_END":
+            this.onLLMEnd(data);
+            break;
+          case "TOOL_END":
+            this.onToolEnd(data);
+            break;
+          case "SUCCESS":
+            clearInterval(this.pollInterval);
+            this.onComplete(data.result.answer, data.result.files, data.info);
+            break;
+        }
       }
     } catch (e) {
       clearInterval(this.pollInterval);
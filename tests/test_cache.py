@@ -0,0 +1,130 @@
+import os
+import timeit
+
+import pytest
+
+from core.tools.editor.cache import CachedFile, FileCache, LargeFile
+
+
+def write(path, content: str, still: bool = True) -> str:
+    path.write_text(content)
+    if still:
+        os.utime(path, ns=(0, 0))  # not racy, as if written a while ago
+    return str(path)
+
+
+def test_reads_lines_as_readlines(tmp_path):
+    content = "".join(f"    line_{i} = {i}\n" for i in range(1000)) + "last"
+    path = write(tmp_path / "code.py", content)
+    lines = content.splitlines(keepends=True)
+
+    cached = FileCache().get(path)
+    assert len(cached) == len(lines)
+    assert cached.read(700, 710) == ("".join(lines[700:710]), 10)
+    assert cached.read_line(-1) == ("last", 1)
+    assert cached.readlines() == lines
+    with pytest.raises(IndexError):
+        cached.read_line(len(lines))
+
+
+def test_reads_up_to_max_bytes_in_whole_lines(tmp_path):
+    path = write(tmp_path / "code.py", "aaaa\nbbbb\ncccc\n")
+    cached = FileCache().get(path)
+    assert cached.read(0, 3, max_bytes=12) == ("aaaa\nbbbb\n", 2)
+    # a line longer than the budget comes cut
+    assert cached.read(0, 3, max_bytes=2) == ("aa", 0)
+
+
+def test_keeps_the_index_until_the_file_changes(tmp_path):
+    path = write(tmp_path / "code.py", "a\nb\n")
+    cache = FileCache()
+    cached = cache.get(path)
+    assert cache.get(path) is cached
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    write(tmp_path / "code.py", "a\nb\nc\n")
+    assert len(cache.get(path)) == 3
+    cache.invalidate(path)
+    assert cache.get(path) is not cached
+
+
+def test_does_not_trust_files_just_written(tmp_path):
+    path = write(tmp_path / "code.py", "a\n", still=False)
+    cache = FileCache()
+    assert cache.get(path) is not cache.get(path)
+
+
+def test_keeps_the_most_recently_used_files(tmp_path):
+    cache = FileCache(max_files=2)
+    paths = [write(tmp_path / f"{i}.py", f"{i}\n") for i in range(3)]
+    for path in [paths[0], paths[1], paths[0], paths[2]]:
+        cache.get(path)
+    assert list(cache.files) == [paths[0], paths[2]]
+    assert isinstance(cache.files[paths[0]], CachedFile)
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "large.csv"
+    with open(path, "w") as f:
+        f.writelines(f"{j},{j * 2},row {j}\n" for j in range(100000))
+        f.write("unterminated")
+    os.utime(path, ns=(0, 0))
+    return str(path)
+
+
+def read_csv(path: str, start: int, stop: int) -> str:
+    with open(path) as f:
+        return "".join(f.readlines()[start:stop])
+
+
+def test_reads_ranges_of_large_files(csv):
+    cached = FileCache(large_file_bytes=2**20).get(csv)
+    assert isinstance(cached, LargeFile)
+    assert len(cached) == 100001
+    for start in [0, 35000, 99990]:
+        assert cached.read(start, start + 50)[0] == read_csv(csv, start, start + 50)
+    assert cached.read_line(-1) == ("unterminated", 1)
+
+
+def test_saves_the_index_of_large_files(csv):
+    FileCache(large_file_bytes=2**20).get(csv).read(0, 1)
+    index_path = LargeFile(csv, (0, 0, 0)).index_path
+    assert os.path.exists(index_path)
+    # nothing is left behind
+    assert sorted(os.listdir(os.path.dirname(csv))) == sorted(
+        [os.path.basename(csv), os.path.basename(index_path)]
+    )
+
+    cached = FileCache(large_file_bytes=2**20).get(csv)
+    assert cached.load_index()
+    assert cached.read(35000, 35010)[0] == read_csv(csv, 35000, 35010)
+
+
+def test_reads_faster_than_readlines(tmp_path):
+    content = "".join(f"    line_{i} = {i}\n" for i in range(200000))
+    path = write(tmp_path / "code.py", content)
+    cache = FileCache()
+    cache.get(path)
+
+    old = min(timeit.repeat(lambda: read_csv(path, 700, 710), number=10, repeat=3))
+    new = min(
+        timeit.repeat(lambda: cache.get(path).read(700, 710), number=10, repeat=3)
+    )
+    # loose, the whole file is split into lines on every read without the index
+    assert new * 10 < old
+
+
+# not a whole count, a count short, and within the header
+@pytest.mark.parametrize("cut", [5, 8, 50])
+def test_counts_again_over_a_corrupt_index(csv, cut):
+    cached = FileCache(large_file_bytes=2**20).get(csv)
+    len(cached)
+    with open(cached.index_path, "r+b") as f:
+        f.truncate(f.seek(0, os.SEEK_END) - cut)
+
+    cached = FileCache(large_file_bytes=2**20).get(csv)
+    assert not cached.load_index()
+    assert len(cached) == 100001
+    # and saves it whole again
+    assert FileCache(large_file_bytes=2**20).get(csv).load_index()
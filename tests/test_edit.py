@@ -0,0 +1,74 @@
+import pytest
+
+from core.tools.editor.edit import CodeModifier
+
+
+@pytest.fixture
+def code(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "test.py"
+    path.write_text(
+        "".join(f"def f_{i}(x):\n    return x + {i}\n\n" for i in range(100))
+    )
+    return path
+
+
+def get_function(code, i: int) -> str:
+    lines = code.read_text().splitlines(keepends=True)
+    return "".join(lines[i * 3 : i * 3 + 2])
+
+
+def test_applies_a_unified_diff(code):
+    diff = "--- a/test.py\n+++ b/test.py\n@@ -151,2 +151,2 @@\n"
+    diff += " def f_50(x):\n-    return x + 50\n+    return x - 50\n"
+    output = CodeModifier.edit(diff)
+    assert get_function(code, 50) == "def f_50(x):\n    return x - 50\n"
+    assert "1 change(s) applied" in output
+    assert "152:     return x - 50" in output
+
+
+def test_applies_search_replace_blocks_loosely(code):
+    blocks = "test.py\n<<<<<<< SEARCH\ndef f_70(x):\n    return x+70\n"
+    blocks += "=======\ndef f_70(x):\n    return x * 70\n>>>>>>> REPLACE\n"
+    output = CodeModifier.edit(blocks)
+    assert get_function(code, 70) == "def f_70(x):\n    return x * 70\n"
+    assert "similar lines at line 211" in output
+
+
+def test_uses_the_line_numbers_to_tell_repeated_lines_apart(code):
+    code.write_text("a\nb\na\nb\n")
+    CodeModifier.edit("--- a/test.py\n+++ b/test.py\n@@ -3,1 +3,1 @@\n-a\n+c\n")
+    assert code.read_text() == "a\nb\nc\nb\n"
+
+
+def test_edits_no_file_if_one_edit_fails(code, tmp_path):
+    before = code.read_text()
+    diff = "--- a/test.py\n+++ b/test.py\n@@ -1,1 +1,1 @@\n-def f_0(x):\n+def g(x):\n"
+    diff += "--- a/other.py\n+++ b/other.py\n@@ -1,1 +1,1 @@\n-missing\n+line\n"
+    with pytest.raises(Exception, match="doesn't exist"):
+        CodeModifier.edit(diff)
+    assert code.read_text() == before
+    assert not (tmp_path / "other.py").exists()
+
+
+def test_inserts_after_the_line_of_a_zero_line_hunk(code):
+    code.write_text("a\nb\nc\n")
+    CodeModifier.edit("--- a/test.py\n+++ b/test.py\n@@ -2,0 +3 @@\n+x\n")
+    assert code.read_text() == "a\nb\nx\nc\n"
+
+
+def test_ignores_the_fences_around_a_diff(code):
+    code.write_text("def f(x):\n\n    return x\n")
+    diff = "```diff\n--- a/test.py\n+++ b/test.py\n@@ -1,3 +1,3 @@\n"
+    diff += " def f(x):\n \n-    return x\n+    return x + 1\n```\n"
+    CodeModifier.edit(diff)
+    assert code.read_text() == "def f(x):\n\n    return x + 1\n"
+
+
+def test_keeps_the_context_of_the_file_when_matched_loosely(code):
+    code.write_text("def f(x):\n    # add one to x\n    return x\n")
+    diff = "--- a/test.py\n+++ b/test.py\n@@ -1,3 +1,3 @@\n"
+    diff += " def f(x):\n     # adds one to x\n-    return x\n+    return x + 1\n"
+    output = CodeModifier.edit(diff)
+    assert "similar lines" in output
+    assert code.read_text() == "def f(x):\n    # add one to x\n    return x + 1\n"
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from core.events.redis import RedisEventChannel
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # for fakeredis to run lua scripts
+
+
+@pytest.fixture
+def channel():
+    channel = RedisEventChannel("redis://localhost:6379", ttl=60)
+    channel.client = fakeredis.FakeRedis()
+    return channel
+
+
+def test_publish_logs_and_notifies_at_once(channel):
+    pubsub = channel.client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel.get_channel("execution"))
+
+    assert channel.publish("execution", "TOOL_END", {"index": 1}) == 1
+    assert channel.publish("execution", "LLM_END", {}) == 2
+    assert channel.publish("execution", "LLM_NEW_TOKEN", {"token": "a"}, False) == 0
+
+    messages = []
+    for _ in range(10):  # the subscription comes first, as None
+        message = pubsub.get_message(timeout=0.01)
+        if message is not None:
+            messages.append(json.loads(message["data"]))
+    assert messages == [
+        {"index": 1, "type": "TOOL_END", "data": {"index": 1}},
+        {"index": 2, "type": "LLM_END", "data": {}},
+        {"index": 0, "type": "LLM_NEW_TOKEN", "data": {"token": "a"}},
+    ]
+    assert 0 < channel.client.ttl(channel.get_log("execution")) <= 60
+
+
+def test_read_after_an_index(channel):
+    for i in range(5):
+        channel.publish("execution", "TOOL_END", {"i": i})
+    events = channel.read("execution", after=3)
+    assert [event["index"] for event in events] == [4, 5]
+    assert [event["data"]["i"] for event in events] == [3, 4]
+
+
+def test_publish_takes_one_round_trip(channel, monkeypatch):
+    channel.publish("execution", "TOOL_END", {})  # loads the script
+    pool = channel.client.connection_pool
+    get_connection = pool.get_connection
+    connections = []
+    monkeypatch.setattr(
+        pool,
+        "get_connection",
+        lambda *args, **kwargs: connections.append(args)
+        or get_connection(*args, **kwargs),
+    )
+
+    channel.publish("execution", "TOOL_END", {})
+    assert len(connections) == 1
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from core.tools.terminal.jobs import JobManager, JobNotFoundException
+
+
+def wait(job) -> None:
+    while job.is_running():
+        time.sleep(0.01)
+
+
+def tail_all(job, max_bytes: int) -> str:
+    text, offset = "", 0
+    while True:
+        chunk, next_offset = job.tail(offset, max_bytes)
+        text += chunk
+        if next_offset == offset:
+            return text
+        offset = next_offset
+
+
+def test_tails_multibyte_output_in_pieces(tmp_path):
+    manager = JobManager(tmp_path)
+    job = manager.start("test", "printf '가나다라마바사'", cwd=str(tmp_path))
+    wait(job)
+    # pieces of 4 bytes split every character but the first
+    assert tail_all(job, 4) == "가나다라마바사"
+
+
+def test_does_not_stall_on_invalid_bytes(tmp_path):
+    manager = JobManager(tmp_path)
+    job = manager.start("test", r"printf 'a\377\376b\342\202'", cwd=str(tmp_path))
+    wait(job)
+    assert job.tail(0, 4) == ("a��b", 4)
+    # the truncated character at the end is replaced once the job is over
+    assert tail_all(job, 4) == "a��b�"
+
+
+def test_holds_back_a_character_being_written(tmp_path):
+    manager = JobManager(tmp_path)
+    job = manager.start(
+        "test", r"printf 'a\352\260'; sleep 10; printf '\200'", cwd=str(tmp_path)
+    )
+    try:
+        time.sleep(0.5)
+        assert job.tail(0, 0) == ("a", 1)
+    finally:
+        job.kill()
+
+
+def test_forgets_the_jobs_of_an_ended_session(tmp_path):
+    manager = JobManager(tmp_path)
+    running = manager.start("a", "sleep 10", cwd=str(tmp_path))
+    done = manager.start("a", "true", cwd=str(tmp_path))
+    other = manager.start("b", "sleep 10", cwd=str(tmp_path))
+    wait(done)
+    manager.kill_all("a")
+    assert not running.is_running()
+    assert list(manager.jobs) == [other.id]
+    manager.kill_all("b")
+
+
+def test_forgets_finished_jobs_once_their_output_is_read(tmp_path):
+    manager = JobManager(tmp_path)
+    job = manager.start("a", "echo done", cwd=str(tmp_path))
+    wait(job)
+    assert manager.get("a", job.id) is job
+    assert job.tail(0, 0) == ("done\n", 5)
+    with pytest.raises(JobNotFoundException):
+        manager.get("a", job.id)
+
+
+def test_forgets_finished_jobs_after_a_while(tmp_path):
+    manager = JobManager(tmp_path, finished_ttl=0.1)
+    running = manager.start("a", "sleep 10", cwd=str(tmp_path))
+    done = manager.start("a", "true", cwd=str(tmp_path))
+    wait(done)
+    time.sleep(0.2)
+    manager.start("b", "true", cwd=str(tmp_path))
+    assert done.id not in manager.jobs
+    assert manager.get("a", running.id) is running
+    manager.kill_all("a")
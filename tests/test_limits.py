@@ -0,0 +1,58 @@
+import subprocess
+import time
+
+from core.tools.terminal.limits import ResourceLimits
+
+
+def get_limit(pid: int, name: str) -> str:
+    with open(f"/proc/{pid}/limits") as f:
+        line = next(line for line in f if line.startswith(name))
+    return line[len(name) :].split()[0]
+
+
+def test_sets_the_limits_before_the_command_runs():
+    limits = ResourceLimits(cpu_seconds=5, memory_bytes=2**30)
+    process = limits.spawn(
+        "test", ["/bin/sh", "-c", "exec cat /proc/self/limits"], stdout=subprocess.PIPE
+    )
+    output, _ = process.communicate()
+    assert process.returncode == 0
+    lines = output.decode().splitlines()
+    assert next(l for l in lines if l.startswith("Max cpu time")).split()[3] == "5"
+    data = next(l for l in lines if l.startswith("Max data size")).split()[3]
+    assert data == str(2**30)
+
+
+def test_children_inherit_the_limits():
+    limits = ResourceLimits(cpu_seconds=5)
+    process = limits.spawn("test", ["/bin/sh", "-c", "sleep 10 & wait"])
+    try:
+        time.sleep(0.2)
+        with open(f"/proc/{process.pid}/task/{process.pid}/children") as f:
+            child = int(f.read().split()[0])
+        assert get_limit(child, "Max cpu time") == "5"
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_keeps_the_exit_code():
+    limits = ResourceLimits(cpu_seconds=5)
+    process = limits.spawn("test", ["/bin/sh", "-c", "exit 3"])
+    assert process.wait(timeout=5) == 3
+
+
+def test_starts_right_away_without_limits():
+    process = ResourceLimits().spawn("test", ["true"])
+    assert process.args == ["true"]
+    assert process.wait(timeout=5) == 0
+
+
+def test_removes_the_cgroup_of_the_session(tmp_path):
+    limits = ResourceLimits()
+    limits.cgroups["test"] = tmp_path / "test"
+    limits.cgroups["test"].mkdir()
+    limits.remove("test")
+    assert not (tmp_path / "test").exists()
+    assert "test" not in limits.cgroups
+    limits.remove("test")  # sessions without a cgroup are fine too
@@ -0,0 +1,100 @@
+import gc
+import timeit
+
+import pytest
+from langchain.agents.agent import AgentExecutor
+
+from core.agents.builder import AgentBuilder
+from core.agents.llm import ChatOpenAI, access_check_cache
+from core.agents.manager import AgentManager
+from core.tools.cpu import ExitConversation
+from core.tools.editor import CodeEditor
+
+
+@pytest.fixture
+def retrieved(monkeypatch):
+    """Model access checks made, without asking OpenAI."""
+    retrieved = []
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(
+        ChatOpenAI, "retrieve_model", lambda self: retrieved.append(self.model_name)
+    )
+    access_check_cache.clear()
+    yield retrieved
+    access_check_cache.clear()
+
+
+def test_builds_the_agent_once(monkeypatch, retrieved):
+    builds = []
+    build_agent = AgentBuilder.build_agent
+    monkeypatch.setattr(
+        AgentBuilder, "build_agent", lambda self: builds.append(build_agent(self))
+    )
+    manager = AgentManager.create([CodeEditor(), ExitConversation()])
+
+    first = manager.create_executor("first")
+    second = manager.create_executor("second")
+
+    assert len(builds) == 1
+    assert len(retrieved) == 1  # the access check is cached too
+    # but the llm, and so the callbacks, are per request
+    assert first.agent.llm_chain.llm is not second.agent.llm_chain.llm
+
+
+def test_executors_have_the_tools_of_their_session(retrieved):
+    manager = AgentManager.create([CodeEditor(), ExitConversation()])
+    executor = manager.create_executor("session")
+
+    names = [tool.name for tool in executor.tools]
+    assert "Exit Conversation" in names
+    assert len(names) == len(set(names))
+
+
+def test_creates_executors_faster_than_rebuilding_the_agent(retrieved):
+    toolsets = [CodeEditor(), ExitConversation()]
+    rebuilt = min(
+        timeit.repeat(
+            lambda: AgentManager.create(toolsets).create_executor("session"),
+            number=5,
+            repeat=3,
+        )
+    )
+    manager = AgentManager.create(toolsets)
+    manager.create_executor("session")
+    reused = min(
+        timeit.repeat(lambda: manager.create_executor("session"), number=5, repeat=3)
+    )
+    # loose, only a rebuild on every request would fail it
+    assert reused * 1.5 < rebuilt
+
+
+def exit_conversation(self, inputs):
+    tool = next(tool for tool in self.tools if tool.name == "Exit Conversation")
+    return {"output": tool.run("bye")}
+
+
+def test_exiting_deletes_the_memory_of_the_session(monkeypatch, retrieved):
+    # without the tokenizer download
+    monkeypatch.setattr(ChatOpenAI, "get_num_tokens", lambda self, text: len(text))
+    manager = AgentManager.create([CodeEditor(), ExitConversation()])
+    monkeypatch.setattr(AgentExecutor, "_call", lambda self, inputs: {"output": "hi"})
+    manager.execute("session", "hello")
+    assert manager.memories.get("session") is not None
+
+    monkeypatch.setattr(AgentExecutor, "_call", exit_conversation)
+    assert manager.execute("session", "goodbye")["output"] == "bye"
+    assert manager.memories.get("session") is None
+
+
+def count_executors() -> int:
+    gc.collect()
+    return sum(type(o) is AgentExecutor for o in gc.get_objects())
+
+
+def test_executors_are_not_kept(retrieved):
+    # they hold the memory of their session, which only its store may keep
+    manager = AgentManager.create([CodeEditor(), ExitConversation()])
+    before = count_executors()
+    for session in range(10):
+        manager.create_executor(str(session))
+    assert count_executors() == before
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from core.models import ModelRegistry
+from core.models.registry import get_device_budget
+
+MB = 2**20
+
+
+class TinyModel:
+    """Stands in for a model, taking time to load."""
+
+    def __init__(self, size: int = MB, load_seconds: float = 0):
+        time.sleep(load_seconds)  # reading the weights from disk
+        self.weights = np.zeros(size, dtype=np.uint8)
+        self.nbytes = self.weights.nbytes
+        self.device = "cpu"
+
+    def to(self, device: str) -> "TinyModel":
+        self.device = device
+        return self
+
+
+@pytest.fixture
+def registry():
+    # models of 1MB, room for two on the device and one on the cpu
+    registry = ModelRegistry("cuda", max_bytes=2 * MB, max_offloaded_bytes=MB)
+    for name in ["text2image", "inpaint", "vqa", "captioning"]:
+        registry.register(name, TinyModel)
+    return registry
+
+
+def use(registry: ModelRegistry, name: str) -> TinyModel:
+    with registry.use(name) as model:
+        assert model.device == "cuda"
+        return model
+
+
+def get_device(registry: ModelRegistry, name: str):
+    model = registry.models[name].model
+    return model and model.device
+
+
+def test_loads_models_once(registry):
+    model = use(registry, "text2image")
+    assert use(registry, "text2image") is model
+    metrics = registry.get_metrics()
+    assert (metrics["hits"], metrics["misses"]) == (1, 1)
+    assert metrics["models"]["text2image"]["loads"] == 1
+
+
+def test_offloads_the_least_recently_used(registry):
+    use(registry, "text2image")
+    use(registry, "inpaint")
+    use(registry, "vqa")
+    assert get_device(registry, "text2image") == "cpu"
+    model = registry.models["text2image"].model
+    assert use(registry, "text2image") is model  # restored, not loaded again
+
+    # restoring text2image offloaded inpaint, now vqa leaves no room for it
+    use(registry, "captioning")
+    assert get_device(registry, "vqa") == "cpu"
+    assert get_device(registry, "inpaint") is None
+    metrics = registry.get_metrics()["models"]
+    assert metrics["inpaint"]["state"] == "unloaded"
+    assert metrics["inpaint"]["evictions"] == 1
+    assert metrics["text2image"]["restores"] == 1
+
+
+def test_keeps_the_models_in_use(registry):
+    with registry.use("vqa"), registry.use("inpaint"):
+        use(registry, "text2image")  # over the budget rather than evict them
+        assert get_device(registry, "vqa") == "cuda"
+        assert get_device(registry, "inpaint") == "cuda"
+    use(registry, "captioning")
+    assert get_device(registry, "captioning") == "cuda"
+    assert registry.get_metrics()["resident_bytes"] <= 2 * MB
+
+
+def test_restores_while_another_model_loads():
+    registry = ModelRegistry("cuda", max_bytes=MB, max_offloaded_bytes=MB)
+    registry.register("fast", TinyModel)
+    registry.register("slow", lambda: TinyModel(load_seconds=1))
+    registry.register("other", TinyModel)
+    use(registry, "fast")
+    use(registry, "other")  # offloads fast
+
+    loading = threading.Thread(target=use, args=[registry, "slow"])
+    loading.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    use(registry, "fast")
+    assert time.monotonic() - started < 0.5
+    loading.join()
+    assert get_device(registry, "slow") == "cuda"
+
+
+def test_loads_a_model_once_for_concurrent_users(registry):
+    threads = [
+        threading.Thread(target=use, args=[registry, "text2image"]) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.get_metrics()["models"]["text2image"]["loads"] == 1
+
+
+def test_takes_a_share_of_the_gpu_by_default(monkeypatch):
+    cuda = SimpleNamespace(
+        is_available=lambda: True,
+        get_device_properties=lambda index: SimpleNamespace(total_memory=16 * 2**30),
+    )
+    monkeypatch.setitem(sys.modules, "torch", SimpleNamespace(cuda=cuda))
+    assert get_device_budget("cuda") == 12 * 2**30
+    assert get_device_budget("cpu") == 0
+
+    settings = {"GPU_MODELS_MAX_MB": -1, "GPU_MODELS_OFFLOAD_MB": 0}
+    assert ModelRegistry.from_settings(settings, "cuda").max_bytes == 12 * 2**30
+    settings["GPU_MODELS_MAX_MB"] = 0
+    assert ModelRegistry.from_settings(settings, "cuda").max_bytes == 0
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from core.tools.editor import patch
+from core.tools.editor.patch import CodePatcher
+
+
+@pytest.fixture(autouse=True)
+def code(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ["a.py", "b.py"]:
+        (tmp_path / name).write_text("x = 1\ny = 2\n")
+    return tmp_path
+
+
+def bulk(*commands: str) -> str:
+    return CodePatcher.separator.join(commands)
+
+
+def test_patches_every_file(code):
+    CodePatcher.patch(bulk("a.py|1,5|1,6|3", "b.py|2,5|2,6|4"))
+    assert (code / "a.py").read_text() == "x = 3\ny = 2\n"
+    assert (code / "b.py").read_text() == "x = 1\ny = 4\n"
+
+
+def test_patches_no_file_if_a_hunk_fails(code):
+    with pytest.raises(Exception, match="it has 2 lines"):
+        CodePatcher.patch(bulk("a.py|1,5|1,6|3", "b.py|9,1|9,1|z = 3"))
+    assert (code / "a.py").read_text() == "x = 1\ny = 2\n"
+
+
+def test_patches_no_file_if_one_cannot_be_written(code, monkeypatch):
+    stage_file = patch.stage_file
+
+    def fail_on_b(filepath, lines):
+        if filepath.endswith("b.py"):
+            raise OSError("No space left on device")
+        return stage_file(filepath, lines)
+
+    monkeypatch.setattr(patch, "stage_file", fail_on_b)
+    with pytest.raises(OSError):
+        CodePatcher.patch(bulk("a.py|1,5|1,6|3", "b.py|2,5|2,6|4"))
+    assert (code / "a.py").read_text() == "x = 1\ny = 2\n"
+    # and the staged file of a.py is gone
+    assert sorted(os.listdir(code)) == ["a.py", "b.py"]
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.pool import ExecutionPool, PoolFullException
+
+
+def test_rejects_beyond_capacity():
+    async def main():
+        pool = ExecutionPool(max_workers=2, max_queue=2)
+        release = threading.Event()
+        runs = [
+            asyncio.create_task(pool.run(release.wait)) for _ in range(pool.capacity)
+        ]
+        await asyncio.sleep(0)
+        assert pool.in_flight == pool.capacity
+
+        with pytest.raises(PoolFullException):
+            await pool.run(release.wait)
+
+        release.set()
+        await asyncio.gather(*runs)
+        assert pool.in_flight == 0
+        # the slots are back once the runs are done
+        assert await pool.run(lambda: 42) == 42
+        pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_does_not_block_the_event_loop():
+    async def heartbeat(stop: asyncio.Event) -> float:
+        worst = 0.0
+        while not stop.is_set():
+            started = time.monotonic()
+            await asyncio.sleep(0.01)
+            worst = max(worst, time.monotonic() - started - 0.01)
+        return worst
+
+    async def main():
+        pool = ExecutionPool(max_workers=4, max_queue=4)
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        started = time.monotonic()
+        await asyncio.gather(*[pool.run(time.sleep, 0.2) for _ in range(pool.capacity)])
+        elapsed = time.monotonic() - started
+        stop.set()
+        worst = await beat
+        pool.shutdown()
+
+        # two rounds of 4 workers, with the loop free to run meanwhile
+        assert elapsed < 0.2 * pool.capacity
+        assert worst < 0.1
+
+    asyncio.run(main())
+
+
+def test_execute_responds_429_when_full(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import api.main
+
+    release = threading.Event()
+
+    def execute_sync(request):
+        release.wait()
+        return {"answer": "done", "files": []}
+
+    pool = ExecutionPool(max_workers=1, max_queue=0)
+    monkeypatch.setattr(api.main, "execution_pool", pool)
+    monkeypatch.setattr(api.main, "execute_sync", execute_sync)
+    body = {"session": "test", "prompt": "hi", "files": []}
+
+    with TestClient(api.main.app) as client:
+        first = threading.Thread(
+            target=client.post, args=["/api/execute"], kwargs={"json": body}
+        )
+        first.start()
+        while pool.in_flight == 0:
+            time.sleep(0.01)
+
+        response = client.post("/api/execute", json=body)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+        release.set()
+        first.join()
+        assert client.post("/api/execute", json=body).json()["answer"] == "done"
+    pool.shutdown()
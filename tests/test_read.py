@@ -0,0 +1,103 @@
+import random
+import timeit
+from typing import List
+
+from core.tools.editor.read import CodeTree
+
+
+class Node:
+    def __init__(self, content: str, line_number: int, depth: int):
+        self.content = content
+        self.line_number = line_number
+        self.depth = depth
+        self.children: List[Node] = []
+
+    def __repr__(self):
+        return f"{self.line_number}: {self.content}"
+
+
+def indent(content: str) -> int:
+    return len(content) - len(content.lstrip())
+
+
+class ReferenceTree:
+    """The tree as it was built before, walking the path to the last line
+    for every line appended."""
+
+    def __init__(self):
+        self.root = Node("\n", -1, -1)
+
+    def append(self, content: str, line_number: int) -> None:
+        path, node = [self.root], self.root
+        while node.children:
+            node = node.children[-1]
+            path.append(node)
+        parent, parent_indent = self.root, -1
+        for line in path:
+            if parent_indent < indent(content) <= indent(line.content):
+                break
+            parent, parent_indent = line, indent(line.content)
+        parent.children.append(Node(content, line_number, parent.depth + 1))
+
+    def find(self, node: Node, depth: int) -> List[Node]:
+        if node.depth > depth:
+            return []
+        return [node] + [line for c in node.children for line in self.find(c, depth)]
+
+    def find_by_content(self, node: Node, content: str) -> List[Node]:
+        if content in node.content:
+            return [node]
+        return [
+            line for c in node.children for line in self.find_by_content(c, content)
+        ]
+
+
+def build(code: List[str]):
+    tree, reference = CodeTree(), ReferenceTree()
+    for i, line in enumerate(code):
+        tree.append(line, i + 1)
+        reference.append(line, i + 1)
+    return tree, reference
+
+
+def test_builds_the_same_tree_as_before():
+    random.seed(0)
+    for _ in range(20):
+        code = [
+            " " * random.choice([0, 1, 2, 4, 8, 12]) + f"line_{i}\n" for i in range(200)
+        ]
+        tree, reference = build(code)
+        for depth in range(6):
+            expected = reference.find(reference.root, depth)
+            assert str(tree.find_from_root(depth)) == str(expected)
+
+        parent = reference.find_by_content(reference.root, "line_50\n")[0]
+        expected = reference.find(parent, 2 + parent.depth)
+        assert str(tree.find_from_parent(2, "line_50\n")) == str(expected)
+
+
+def test_summarizes_deeply_nested_code():
+    # deeper than the recursion limit
+    code = [" " * i + f"line_{i}\n" for i in range(5000)]
+    tree = CodeTree()
+    for i, line in enumerate(code):
+        tree.append(line, i + 1)
+    lines = tree.find_from_root(len(code))
+    assert [str(line) for line in lines[1:]] == [
+        f"{i + 1}: {line}" for i, line in enumerate(code)
+    ]
+    # the root takes the lines indented by one too, so line_1 is not nested
+    assert tree.find_from_parent(1, "line_4998")[-1].get_depth() == 4998
+
+
+def test_builds_deeply_nested_code_faster_than_before():
+    code = [" " * (i % 1000) + f"line_{i} = {i}\n" for i in range(3000)]
+
+    def append_all(tree):
+        for i, line in enumerate(code):
+            tree.append(line, i + 1)
+
+    old = timeit.timeit(lambda: append_all(ReferenceTree()), number=1)
+    new = min(timeit.repeat(lambda: append_all(CodeTree()), number=1, repeat=3))
+    # loose, the tree was walked to its last line for every line
+    assert new * 5 < old
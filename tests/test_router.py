@@ -0,0 +1,62 @@
+import time
+import uuid
+
+from api.router import HashRing, SessionRouter
+
+sessions = [uuid.uuid4().hex for _ in range(10000)]
+queues = [f"eval-{i}" for i in range(8)]
+
+
+def test_spreads_sessions_evenly():
+    ring = HashRing(queues)
+    counts = {queue: 0 for queue in queues}
+    for session in sessions:
+        counts[ring.get(session)] += 1
+    fair = len(sessions) / len(queues)
+    assert min(counts.values()) > fair / 2
+    assert max(counts.values()) < fair * 2
+
+
+def test_moves_only_the_sessions_of_a_queue_that_leaves():
+    ring = HashRing(queues)
+    before = {session: ring.get(session) for session in sessions}
+
+    ring.remove("eval-3")
+    for session in sessions:
+        if before[session] != "eval-3":
+            assert ring.get(session) == before[session]
+        else:
+            assert ring.get(session) != "eval-3"
+
+    ring.add("eval-3")
+    assert all(ring.get(session) == before[session] for session in sessions)
+
+
+def test_routes_to_live_queues_only():
+    active = {"eval-0", "eval-1"}
+    router = SessionRouter(queues, inspect=lambda: active, refresh_interval=0)
+    router.refresh()
+    assert router.get_metrics() == {"queues": ["eval-0", "eval-1"]}
+    assert {router.ring.get(session) for session in sessions} == active
+
+
+def test_keeps_all_queues_while_no_worker_is_up():
+    router = SessionRouter(queues, inspect=lambda: set(), refresh_interval=0)
+    router.refresh()
+    assert router.get_metrics() == {"queues": sorted(queues)}
+
+    # and when the workers can't be asked, routes as before
+    router.inspect = lambda: None
+    router.refresh()
+    assert router.get_metrics() == {"queues": sorted(queues)}
+
+
+def test_route_does_not_wait_for_the_workers():
+    def inspect():
+        time.sleep(1)
+        return {"eval-0"}
+
+    router = SessionRouter(queues, inspect=inspect, refresh_interval=0)
+    started = time.monotonic()
+    assert router.route("session") in queues
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from core.agents.manager import get_output_files
+from core.sandbox import SandboxPool, get_root
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pools = []
+
+    def create(**kwargs) -> SandboxPool:
+        pools.append(SandboxPool(tmp_path, **kwargs))
+        return pools[-1]
+
+    yield create
+    for pool in pools:
+        pool.close()
+
+
+def wait_until(condition) -> None:
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_hands_out_prepared_sandboxes(pool):
+    # the sources of the agent stand in for a project to start from
+    template = Path(__file__).resolve().parent.parent / "core"
+    sandboxes = pool(size=2, template=template)
+    wait_until(lambda: len(sandboxes.ready) == sandboxes.size)
+
+    sandbox = sandboxes.acquire("a")
+    assert (sandbox.root / "sandbox" / "pool.py").exists()
+    assert sandboxes.acquire("a") is sandbox
+    assert sandboxes.get_metrics()["hits"] == 1
+
+    sandboxes.size = 0
+    sandboxes.ready.clear()
+    # the pool ran dry, one is made right away
+    assert sandboxes.acquire("b") is not sandbox
+    assert sandboxes.get_metrics()["misses"] == 1
+
+
+def test_ends_the_session_before_deleting_its_sandbox(pool):
+    ended = []
+    sandboxes = pool(size=0, idle_ttl=0.1)
+    sandboxes.on_reclaim = lambda session: ended.append(
+        (session, sandbox.root.exists())
+    )
+    sandbox = sandboxes.acquire("a")
+    sandboxes.release(sandbox)
+    time.sleep(0.2)
+    sandboxes.wakeup.set()
+    wait_until(lambda: not sandbox.root.exists())
+    assert ended == [("a", True)]
+
+
+def test_keeps_sandboxes_in_use(pool):
+    sandboxes = pool(size=0, idle_ttl=0, max_sandboxes=0)
+    sandbox = sandboxes.acquire("a")
+    with sandboxes.lock:
+        sandboxes.reclaim()
+    assert sandboxes.assigned == {"a": sandbox}
+
+
+def test_output_files_are_resolved_in_the_sandbox(pool):
+    sandboxes = pool(size=0)
+    with sandboxes.enter("a") as sandbox:
+        files = get_output_files("here it is [file://image/cat.png]")
+        assert get_root() == sandbox.root
+    # still there once the session has left the sandbox
+    assert files == [str(sandbox.root / "image" / "cat.png")]
+    assert Path(files[0]).is_absolute()
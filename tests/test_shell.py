@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pytest
+
+from core.tools.terminal.limits import ResourceLimits
+from core.tools.terminal.shell import (
+    PersistentShell,
+    ShellPool,
+    ShellClosedException,
+    ShellPoolFullException,
+)
+
+
+def test_carries_state_over():
+    shell = PersistentShell(cwd="/")
+    try:
+        assert shell.run("cd /tmp; export NAME=value") == (0, "")
+        assert shell.run("pwd; echo $NAME") == (0, "/tmp\nvalue\n")
+        assert shell.run("false")[0] == 1
+    finally:
+        shell.close()
+
+
+def test_keeps_multibyte_characters_whole():
+    shell = PersistentShell()
+    try:
+        # 3 bytes each, more than a read, so some are split between reads
+        text = "가나다" * 30000
+        exitcode, output = shell.run(f"printf '%s' '{text}'")
+        assert exitcode == 0
+        assert output == text
+    finally:
+        shell.close()
+
+
+def test_returns_after_a_syntax_error():
+    shell = PersistentShell()
+    try:
+        exitcode, _ = shell.run("if then", timeout=5)
+        assert exitcode not in (None, 0)
+        assert shell.run("echo still here") == (0, "still here\n")
+    finally:
+        shell.close()
+
+
+def test_commands_reading_input_do_not_get_the_sentinel():
+    shell = PersistentShell()
+    try:
+        started = time.monotonic()
+        exitcode, output = shell.run("read line; echo got $line", input_wait=0.5)
+        assert exitcode is None
+        assert "waiting for input" in output
+        assert "got" not in output
+        assert time.monotonic() - started < 10
+    finally:
+        shell.close()
+
+
+def test_shells_in_use_are_not_evicted():
+    pool = ShellPool(max_shells=1)
+    try:
+        shell = pool.acquire("a")
+        waiting = threading.Thread(target=lambda: pool.release("a", pool.acquire("a")))
+        waiting.start()
+        pool.release("a", shell)
+        waiting.join()
+        assert pool.shells["a"] is shell
+
+        # while "a" is held, there is no idle shell to make room
+        shell = pool.acquire("a")
+        with pytest.raises(ShellPoolFullException):
+            pool.acquire("b")
+        assert shell.is_alive()
+        pool.release("a", shell)
+        assert shell.users == 0
+    finally:
+        pool.close()
+
+
+def test_shells_waited_for_are_not_reaped():
+    pool = ShellPool(idle_ttl=0)
+    try:
+        shell = pool.acquire("a")
+        pool.reap()
+        assert shell.is_alive()
+        pool.release("a", shell)
+        pool.reap()
+        assert not shell.is_alive()
+    finally:
+        pool.close()
+
+
+def test_shells_run_within_the_limits():
+    pool = ShellPool(limits=ResourceLimits(cpu_seconds=5))
+    try:
+        exitcode, output = pool.run("a", "ulimit -t")
+        assert (exitcode, output) == (0, "5\n")
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("consumer", ["cat", "sort", "tail -n 1"])
+def test_pipelines_waiting_for_their_input_are_not_stopped(consumer):
+    shell = PersistentShell()
+    try:
+        exitcode, output = shell.run(
+            f"(echo start; sleep 2; echo done) | {consumer}", input_wait=0.5
+        )
+        assert exitcode == 0
+        assert "done" in output
+        assert shell.is_alive()
+    finally:
+        shell.close()
+
+
+def test_closed_shells_refuse_to_run():
+    shell = PersistentShell()
+    shell.close()
+    with pytest.raises(ShellClosedException):
+        shell.run("echo hi")
+
+
+def test_waiters_get_a_new_shell_if_the_holder_closes_it():
+    pool = ShellPool()
+    try:
+        shell = pool.acquire("a")
+        result = []
+        waiting = threading.Thread(
+            target=lambda: result.append(pool.run("a", "echo hi"))
+        )
+        waiting.start()
+        while shell.users < 2:
+            time.sleep(0.01)
+        shell.run("sleep 10", timeout=0.2)  # closes it, as it is quiet
+        assert not shell.is_alive()
+        pool.release("a", shell)
+        waiting.join()
+        assert result == [(0, "hi\n")]
+        assert pool.shells["a"] is not shell
+    finally:
+        pool.close()
+
+
+def test_closing_a_session_stops_its_run():
+    pool = ShellPool()
+    try:
+        result = []
+        running = threading.Thread(
+            target=lambda: result.append(pool.run("a", "sleep 10"))
+        )
+        running.start()
+        while "a" not in pool.shells or not pool.shells["a"].lock.locked():
+            time.sleep(0.01)
+        started = time.monotonic()
+        pool.close_session("a")
+        running.join()
+        assert time.monotonic() - started < 5
+        assert result[0][0] != 0
+    finally:
+        pool.close()
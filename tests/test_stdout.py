@@ -0,0 +1,49 @@
+import subprocess
+import time
+from typing import Optional, Tuple
+
+from core.tools.terminal.stdout import StdoutTracer
+
+
+def run(commands: str, **kwargs) -> Tuple[Optional[int], str]:
+    process = subprocess.Popen(
+        commands, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    tracer = StdoutTracer(process, on_output=lambda p, o: None, **kwargs)
+    return tracer.wait_until_stop_or_exit()
+
+
+def test_collects_both_pipes_and_the_exit_code():
+    exitcode, output = run("echo out; echo err >&2; exit 3")
+    assert exitcode == 3
+    assert sorted(output.split()) == ["err", "out"]
+
+
+def test_returns_as_soon_as_the_process_exits():
+    started = time.monotonic()
+    for _ in range(10):
+        assert run("true", interval=1) == (0, "")
+    # waits on the exit itself, not for the next poll
+    assert time.monotonic() - started < 5
+
+
+def test_does_not_wait_for_children_holding_the_pipes():
+    started = time.monotonic()
+    exitcode, output = run("sleep 10 & echo started")
+    assert exitcode == 0
+    assert output.strip() == "started"
+    assert time.monotonic() - started < 5
+
+
+def test_kills_quiet_processes():
+    started = time.monotonic()
+    exitcode, _ = run("sleep 10", timeout=1)
+    assert exitcode is None
+    assert time.monotonic() - started < 5
+
+
+def test_decodes_characters_split_across_reads():
+    # a 3 byte character every 3 bytes, cut by reads of 64KB at some point
+    exitcode, output = run("python3 -c \"print('한' * 100000)\"")
+    assert exitcode == 0
+    assert output.strip() == "한" * 100000
@@ -0,0 +1,57 @@
+import logging
+import subprocess
+import time
+
+from core.tools.terminal.syscall import is_any_blocked_on_input
+
+
+def spawn(commands: str) -> subprocess.Popen:
+    return subprocess.Popen(commands, shell=True, stdin=subprocess.PIPE)
+
+
+def test_probes_processes_in_parallel():
+    sleeping = [spawn("exec sleep 10") for _ in range(5)]
+    try:
+        time.sleep(0.1)
+        started = time.monotonic()
+        assert not is_any_blocked_on_input([p.pid for p in sleeping], timeout=0.2)
+        # one timeout for all of them, not one each
+        assert time.monotonic() - started < 0.2 * len(sleeping)
+    finally:
+        for process in sleeping:
+            process.kill()
+            process.wait()
+
+
+def test_finds_a_process_blocked_on_input():
+    processes = [spawn("exec sleep 10"), spawn("exec cat")]
+    try:
+        time.sleep(0.1)
+        assert is_any_blocked_on_input([p.pid for p in processes], timeout=0.5)
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+def test_ptrace_does_not_log(caplog):
+    process = spawn("exec sleep 10")
+    try:
+        time.sleep(0.1)
+        with caplog.at_level(logging.DEBUG):
+            is_any_blocked_on_input([process.pid], timeout=0.1)
+        assert not [r for r in caplog.records if "ptrace" in r.pathname]
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_reads_of_a_pipe_are_not_waiting_for_input():
+    process = spawn("exec cat")
+    try:
+        time.sleep(0.1)
+        tty = "/dev/pts/not-this-one"
+        assert not is_any_blocked_on_input([process.pid], timeout=0.5, tty=tty)
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,25 @@
+import pytest
+
+from core.tools.editor.write import CodeWriter, WriteCommand
+
+
+@pytest.fixture(autouse=True)
+def playground(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_splits_the_path_from_the_content():
+    command = WriteCommand.from_str("\n  test.py\nline 1\n\nline 2\n")
+    assert command.filepath == "test.py"
+    assert command.content == "line 1\n\nline 2\n"
+    assert WriteCommand.from_str("empty.py").content == ""
+
+
+def test_writes_and_appends(playground):
+    assert CodeWriter.write("test.py\na\nb\n") == (4, "a\nb\n")
+    written, tail = CodeWriter.append(
+        "test.py\n" + "".join(f"{i}\n" for i in range(10**5))
+    )
+    assert tail == "99998\n99999\n"
+    assert (playground / "test.py").stat().st_size == 4 + written
@@ -18,6 +18,25 @@ def seed_everything(seed):
     return seed
 
 
+def dilate_square(mask: np.ndarray, padding: int) -> np.ndarray:
+    """Sets every element within `padding` of a true one along all axes, as
+    the max filter of a square of side 2 * padding + 1 would.
+
+    The square is separable, so each axis is filtered on its own, with a
+    running count of the true elements over the window.
+    """
+    dilated = mask.astype(bool)
+    for axis in range(dilated.ndim):
+        size = dilated.shape[axis]
+        counts = np.cumsum(dilated, axis=axis, dtype=np.int32)
+        counts = np.insert(counts, 0, 0, axis=axis)
+        index = np.arange(size)
+        upper = np.take(counts, np.minimum(index + padding + 1, size), axis=axis)
+        lower = np.take(counts, np.maximum(index - padding, 0), axis=axis)
+        dilated = upper > lower
+    return dilated
+
+
 def cut_dialogue_history(history_memory, keep_last_n_words=500):
     tokens = history_memory.split()
     n_tokens = len(tokens)
@@ -27,10 +46,11 @@ def cut_dialogue_history(history_memory, keep_last_n_words=500):
     else:
         paragraphs = history_memory.split("\n")
         last_n_tokens = n_tokens
+        start = 0
         while last_n_tokens >= keep_last_n_words:
-            last_n_tokens = last_n_tokens - len(paragraphs[0].split(" "))
-            paragraphs = paragraphs[1:]
-        return "\n" + "\n".join(paragraphs)
+            last_n_tokens = last_n_tokens - len(paragraphs[start].split(" "))
+            start += 1
+        return "\n" + "\n".join(paragraphs[start:])
 
 
 def get_new_image_name(org_img_name, func_name="update"):